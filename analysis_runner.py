@@ -0,0 +1,354 @@
+import os
+import json
+import time
+import asyncio
+
+from contextlib import suppress
+from typing import AsyncIterator, Callable, Optional
+
+from dotenv import load_dotenv
+
+import utils.color_print as cp
+from conversion_pipeline import conversionWorkflow, ConversionWorkflowState, engineer_batch, BATCH_PROMPT_TYPE
+from llm_provider import api_keys_from, without_api_key
+from incremental import find_reusable_step, reuse_step, resolve_base_manifest, load_base_steps, find_duplicate_step, load_duplicate_step, record_source, run_generator
+from repo_source import iter_repo_documents, resolve_local_path
+from utils.run_manifest import save_run_manifest
+from utils.dependency_graph import build_dependency_graph, dependency_levels, dependency_context
+from utils.token_budget import DocumentPacker, is_packable
+
+load_dotenv()
+
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "4"))
+ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", "4"))
+PACK_SMALL_FILES = os.getenv("PACK_SMALL_FILES", "false").lower() == "true"
+DEPENDENCY_ORDER = os.getenv("DEPENDENCY_ORDER", "false").lower() == "true"
+
+def _flag(value) -> bool:
+    # parsed like the env vars, so a JSON "false" string stays false
+    return str(value).lower() == "true"
+
+async def invoke_checkpointed(workflow, state, thread_id: str, done_key: str) -> dict:
+    """Run a compiled graph, resuming its checkpointed thread when there is one.
+
+    A thread that stopped mid-graph continues from its last completed step, and one that already finished with
+    `done_key` set is returned as is. Without a checkpointer this is a plain ainvoke.
+    The api key of model1_config is never checkpointed: the graph reads them from this call's state,
+    also when it resumes a thread started with other credentials.
+    """
+    if workflow.checkpointer is None:
+        return await workflow.ainvoke(state)
+
+    with api_keys_from(state.model1_config):
+        state = state.model_copy(update={"model1_config": without_api_key(state.model1_config)})
+        config = {"configurable": {"thread_id": thread_id}}
+        snapshot = await workflow.aget_state(config)
+        if snapshot.next:
+            cp.log_info(f"⏯️ Resuming {thread_id} at {', '.join(snapshot.next)}")
+            return await workflow.ainvoke(None, config)
+        if snapshot.values and snapshot.values.get(done_key):
+            cp.log_info(f"⏭️ {thread_id} already completed")
+            return snapshot.values
+        return await workflow.ainvoke(state, config)
+
+def _from_primary(result: dict) -> bool:
+    # the content index keys outputs by model1_config and the engineer prompt, a cheap tier or hedged variant
+    # answer recorded under them would later be reused as the primary model's
+    return result.get("model_tier") != "cheap" and result.get("engineer_variant") in (None, "engineer")
+
+async def analyze_document(doc: dict, run_id: str, model1_config: dict, model2_config: Optional[dict] = None, project_id: str = "echo", task: str = "code_to_json", workflow=None, dependency_context: Optional[dict] = None) -> dict:
+    filename = doc["name"]
+
+    cp.log_info(f"⚙️ Running engineer pipeline for: {filename}")
+    conversion_state = ConversionWorkflowState(
+        project_id=project_id,
+        run_id=run_id,
+        code=doc["content"],
+        file_path=filename,
+        model1_config=dict(model1_config or {}),
+        model2_config=model2_config,
+        task=task,
+        dependency_context=dependency_context
+    )
+
+    try:
+        result = await invoke_checkpointed(workflow or conversionWorkflow, conversion_state, f"{run_id}:{filename}", "validated_output")
+        if result.get("validated_output") is not None and _from_primary(result):
+            record_source(doc, run_id, model1_config, task)
+        raw_output = result.get("json_spec", "")
+        parsed = json.loads(raw_output) if isinstance(raw_output, str) else raw_output
+        cp.log_debug(f"Parsed output keys for {filename}: {list(parsed.keys())}")
+
+        return {"filename": filename, "result": parsed.get("output", parsed), "compaction": result.get("compaction")}
+    except Exception as e:
+        cp.log_error(f"❌ Error analyzing {filename}: {e}")
+        return {"filename": filename, "error": str(e)}
+
+async def analyze_packed_documents(docs: list[dict], run_id: str, model1_config: dict, model2_config: Optional[dict] = None, project_id: str = "echo", workflow=None) -> list[dict]:
+    """Analyze small files with one packed engineer prompt, falling back to conversionWorkflow for any file the batch missed."""
+    try:
+        outputs = await engineer_batch(docs, run_id, dict(model1_config or {}), project_id)
+    except Exception as e:
+        cp.log_error(f"❌ Error analyzing batch of {len(docs)} files: {e}")
+        outputs = {}
+
+    results = []
+    for doc in docs:
+        if doc["name"] in outputs:
+            record_source(doc, run_id, model1_config, BATCH_PROMPT_TYPE)
+            parsed = outputs[doc["name"]]
+            results.append({"filename": doc["name"], "result": parsed.get("output", parsed)})
+        else:
+            results.append(await analyze_document(doc, run_id, model1_config, model2_config, project_id, workflow=workflow))
+    return results
+
+async def iter_analysis_results(
+        documents: AsyncIterator[dict],
+        run_id: str,
+        model1_config: dict,
+        model2_config: Optional[dict] = None,
+        project_id: str = "echo",
+        base_manifest: Optional[dict] = None,
+        base_steps: Optional[dict] = None,
+        source: Optional[dict] = None,
+        workers: int = ANALYSIS_WORKERS,
+        queue_size: int = ANALYSIS_QUEUE_SIZE,
+        pack_small_files: bool = PACK_SMALL_FILES,
+        task: str = "code_to_json",
+        on_event: Optional[Callable[[dict], None]] = None,
+        workflow=None,
+        completed: Optional[dict] = None,
+        dependencies: Optional[dict] = None,
+    ) -> AsyncIterator[dict]:
+    """Feed streamed documents through a bounded queue of analysis workers and yield each result in document order.
+
+    Unchanged, checkpointed or duplicate files are reused instead of analyzed, small files may be packed into one
+    request, and files listed in `dependencies` wait for the files they import. An ingestion error ends the stream
+    with a result carrying no filename; otherwise the run manifest is written once every document is consumed.
+    """
+    # the packed prompt only knows the code_to_json format
+    packer = DocumentPacker() if pack_small_files and task == "code_to_json" else None
+    documents_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    results_queue: asyncio.Queue = asyncio.Queue()
+    window = asyncio.Semaphore((queue_size + workers) * (packer.max_files if packer else 1))
+    file_shas = {}
+    queued_at, started_at = {}, {}
+    # filled in place by order_by_dependencies once the stream starts
+    dependencies = {} if dependencies is None else dependencies
+    finished_files: dict[str, asyncio.Event] = {}
+    specs = {}
+    ingestion_errors = []
+    generator = run_generator(model1_config, task)
+
+    def emit(index: int, filename: str, status: str, **extra):
+        if on_event is None:
+            return
+        now = time.monotonic()
+        if status == "queued":
+            queued_at[index] = now
+        elif status == "generating":
+            started_at[index] = now
+            extra["waited"] = round(now - queued_at.get(index, now), 3)
+        else:
+            extra["elapsed"] = round(now - started_at.get(index, now), 3)
+        on_event({"type": "progress", "index": index, "filename": filename, "status": status, **extra})
+
+    def finish(index: int, result: dict):
+        status = "failed" if "error" in result else "reused" if result.get("reused") else "resumed" if result.get("resumed") else "validated"
+        extra = {"error": result["error"]} if status == "failed" else {}
+        if result.get("compaction"):
+            extra["tokens_saved"] = result["compaction"]["tokens_saved"]
+        emit(index, result["filename"], status, **extra)
+        if "result" in result:
+            specs[result["filename"]] = result["result"]
+        if result["filename"] in finished_files:
+            finished_files[result["filename"]].set()
+
+    async def wait_for_dependencies(filename: str) -> Optional[dict]:
+        # dependencies are always queued first, so some worker already holds each of them
+        for dependency in dependencies.get(filename, []):
+            if dependency in finished_files:
+                await finished_files[dependency].wait()
+        return dependency_context(dependencies.get(filename, []), specs)
+
+    async def produce():
+        try:
+            index = 0
+            async for doc in documents:
+                file_shas[doc["name"]] = doc.get("sha")
+                checkpoint = (completed or {}).get(doc["name"])
+                if checkpoint and doc.get("sha") and checkpoint.get("sha") == doc["sha"]:
+                    reusable = {"checkpoint": checkpoint}
+                else:
+                    reusable = find_reusable_step(doc, base_manifest, base_steps, generator) if base_manifest else None
+                # only an output of the prompt that would answer this file now is a duplicate of it
+                packed = packer is not None and is_packable(doc) and not dependencies.get(doc["name"])
+                if not reusable and (duplicate := find_duplicate_step(doc, model1_config, BATCH_PROMPT_TYPE if packed else task)):
+                    reusable = {"duplicate": duplicate}
+                packable = packed and not reusable
+                finished_files[doc["name"]] = asyncio.Event()
+
+                # never hold a partial batch while waiting for window space it occupies itself,
+                # nor while a file that may import one of its files is queued behind it
+                if packer and packer.items and (window.locked() or (packable and not packer.fits(doc)) or dependencies.get(doc["name"])):
+                    await documents_queue.put(packer.flush())
+
+                await window.acquire()
+                item = (index, doc, reusable)
+                emit(index, doc["name"], "queued", sha=doc.get("sha"))
+                index += 1
+                if packable:
+                    packer.add(item, doc)
+                else:
+                    await documents_queue.put([item])
+
+            if packer and packer.items:
+                await documents_queue.put(packer.flush())
+        except asyncio.CancelledError:
+            # the workers are cancelled with the producer, nobody would drain a full queue
+            for _ in range(workers):
+                with suppress(asyncio.QueueFull):
+                    documents_queue.put_nowait(None)
+            raise
+        except Exception as e:
+            # the files queued so far are still analyzed, the error is reported once they are
+            cp.log_error(f"❌ Repository ingestion failed: {e}")
+            ingestion_errors.append(e)
+        for _ in range(workers):
+            await documents_queue.put(None)
+
+    async def process(doc: dict, reusable: Optional[dict], context: Optional[dict] = None) -> dict:
+        if reusable and "checkpoint" in reusable:
+            return {"filename": doc["name"], "result": reusable["checkpoint"]["result"], "resumed": True}
+        if reusable and "duplicate" in reusable:
+            try:
+                row = await load_duplicate_step(reusable["duplicate"])
+                if row:
+                    cp.log_info(f"♻️ Reusing output of identical {row['file_path']} for: {doc['name']}")
+                    return await reuse_step({**row, "file_path": doc["name"]}, project_id, run_id)
+            except Exception as e:
+                cp.log_warn(f"Failed to reuse duplicate output for {doc['name']}: {e}")
+            return await analyze_document(doc, run_id, model1_config, model2_config, project_id, task, workflow, await wait_for_dependencies(doc["name"]))
+        if reusable:
+            cp.log_info(f"♻️ Reusing unchanged output for: {doc['name']}")
+            try:
+                return await reuse_step(reusable, project_id, run_id)
+            except Exception as e:
+                cp.log_error(f"❌ Error reusing output for {doc['name']}: {e}")
+                return {"filename": doc["name"], "error": str(e)}
+        return await analyze_document(doc, run_id, model1_config, model2_config, project_id, task, workflow, context)
+
+    async def work():
+        while (batch := await documents_queue.get()) is not None:
+            contexts = {}
+            for index, doc, reusable in batch:
+                if not reusable:
+                    contexts[index] = await wait_for_dependencies(doc["name"])
+                    emit(index, doc["name"], "generating")
+            if len(batch) == 1:
+                index, doc, reusable = batch[0]
+                result = await process(doc, reusable, contexts.get(index))
+                finish(index, result)
+                await results_queue.put((index, result))
+                continue
+            results = await analyze_packed_documents([doc for _, doc, _ in batch], run_id, model1_config, model2_config, project_id, workflow)
+            for (index, _, _), result in zip(batch, results):
+                finish(index, result)
+                await results_queue.put((index, result))
+        await results_queue.put(None)
+
+    producer = asyncio.create_task(produce())
+    consumers = [asyncio.create_task(work()) for _ in range(workers)]
+    try:
+        finished = 0
+        next_index = 0
+        pending = {}
+        while finished < workers:
+            item = await results_queue.get()
+            if item is None:
+                finished += 1
+                continue
+            pending[item[0]] = item[1]
+            while next_index in pending:
+                yield pending.pop(next_index)
+                next_index += 1
+                window.release()
+
+        await producer
+        if ingestion_errors:
+            # a partial manifest would make the missing files look deleted to an incremental run
+            yield {"filename": None, "error": f"Repository ingestion failed: {ingestion_errors[0]}"}
+            return
+        save_run_manifest(run_id, file_shas, source, generator)
+    finally:
+        for task in (producer, *consumers):
+            task.cancel()
+
+def order_by_dependencies(documents: AsyncIterator[dict]) -> tuple[AsyncIterator[dict], dict]:
+    """Re-order a document stream leaves first by its import graph.
+
+    Returns the re-ordered stream and a dict it fills, before yielding the first document, with the files
+    each file imports that come before it. Ingestion no longer overlaps with analysis since the whole graph
+    is needed up front.
+    """
+    dependencies = {}
+
+    async def ordered():
+        docs = [doc async for doc in documents]
+        graph = build_dependency_graph(docs)
+        levels = dependency_levels(graph)
+        position = {name: i for i, name in enumerate(name for level in levels for name in level)}
+        cp.log_info(f"🕸️ Scheduling {len(docs)} files in {len(levels)} dependency levels, {sum(map(len, graph.values()))} imports")
+
+        dependencies.update({name: [dep for dep in deps if position[dep] < position[name]] for name, deps in graph.items()})
+        for doc in sorted(docs, key=lambda doc: position[doc["name"]]):
+            yield doc
+
+    return ordered(), dependencies
+
+async def open_analysis(data: dict, run_id: str, **runner_options) -> AsyncIterator[dict]:
+    """Build the result stream for an /analyze-all style request body.
+
+    Raises ValueError, FileNotFoundError or PermissionError for an invalid source and LookupError for an unknown base run.
+    """
+    github_config = data.get("github_config")
+    local_path = data.get("local_path")
+
+    if not github_config and not local_path:
+        raise ValueError("Missing GitHub config or local path")
+    if local_path:
+        resolve_local_path(local_path)
+
+    workers = data.get("workers")
+    try:
+        workers = ANALYSIS_WORKERS if workers is None else int(workers)
+    except (TypeError, ValueError):
+        raise ValueError(f"workers must be an integer, got {workers!r}")
+    if workers < 1:
+        # with no consumer the producer would block on the full queue forever
+        raise ValueError(f"workers must be at least 1, got {workers}")
+
+    task = data.get("task") or "code_to_json"
+    base_manifest, base_steps = None, None
+    if data.get("base_run_id") or data.get("base_commit"):
+        base_manifest = await resolve_base_manifest(data.get("base_run_id"), data.get("base_commit"), github_config, local_path)
+        base_steps = await load_base_steps(base_manifest, run_generator(data.get("model1_config"), task)) if base_manifest else None
+
+    documents, dependencies = iter_repo_documents(github_config, local_path), None
+    if _flag(data.get("dependency_order", DEPENDENCY_ORDER)):
+        documents, dependencies = order_by_dependencies(documents)
+
+    return iter_analysis_results(
+        documents,
+        run_id=run_id,
+        model1_config=data.get("model1_config"),
+        model2_config=data.get("model2_config"),
+        base_manifest=base_manifest,
+        base_steps=base_steps,
+        source={"github_config": {k: v for k, v in (github_config or {}).items() if k != "token"}, "local_path": local_path},
+        workers=workers,
+        pack_small_files=_flag(data.get("pack_small_files", PACK_SMALL_FILES)),
+        task=task,
+        dependencies=dependencies,
+        **runner_options,
+    )
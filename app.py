@@ -1,4 +1,5 @@
 import os, json
+from collections import Counter
 
 import httpx
 import streamlit as st
@@ -19,6 +20,19 @@ try:
 except json.JSONDecodeError:
     OLLAMA_MODELS = []
 
+def iter_sse_events(response):
+    """Yield (event, payload) pairs from a text/event-stream response."""
+    event, data = "message", []
+    for line in response.iter_lines():
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
 # ^ --- App Configs ---
 st.set_page_config(layout="wide", page_title="OrionAI", page_icon="🚀")
     
@@ -43,6 +57,9 @@ with tab1:
 
     st.sidebar.subheader(":blue[Repo Configs]")
     gh_repo = st.sidebar.text_input("Repo name", "react-node-test")
+    local_path = st.sidebar.text_input("Local checkout path (optional)", "")
+    workers = st.sidebar.slider("Parallel workers", 1, 16, 4)
+    dependency_order = st.sidebar.checkbox("Process imported files first", False)
 
     st.session_state["github_config"] = {
         "username": gh_user,
@@ -140,7 +157,7 @@ with tab1:
         try:
             response = httpx.post(
                 f"{LOCAL_MCP_SERVER_URL}/analyze",
-                json={"filename": single_file, "github_config": github_config, "model1_config": model1_config},
+                json={"filename": single_file, "github_config": github_config, "local_path": local_path or None, "model1_config": model1_config},
                 timeout=500
             )
             response.raise_for_status()
@@ -164,35 +181,52 @@ with tab1:
         model2_config = st.session_state.get("model2_config", {})
 
         is_repo_analysis = True
-        with st.spinner("Analyzing all files..."):
-            try:
-                response = httpx.post(
-                    f"{LOCAL_MCP_SERVER_URL}/analyze-all",
-                    json={"github_config": github_config, "model1_config": model1_config, "model2_config": model2_config},
-                    timeout=2000
-                )
+        status_line = st.empty()
+        progress_table = st.empty()
+        files = {}
+        try:
+            with httpx.stream(
+                "POST",
+                f"{LOCAL_MCP_SERVER_URL}/analyze-all/events",
+                json={"github_config": github_config, "local_path": local_path or None, "workers": workers, "dependency_order": dependency_order, "model1_config": model1_config, "model2_config": model2_config},
+                timeout=httpx.Timeout(30.0, read=2000)
+            ) as response:
                 response.raise_for_status()
-                raw = response.text
-                # cp.log_debug("📤 Raw LangGraph HTTP response (all files):", raw)
-
-                data = json.loads(raw)
-                results = data.get("results", [])
-                summary = data.get("summary", None)
-
-                for res in results:
-                    st.markdown(f"📁 `{res.get('filename')}`")
-                    if "result" in res:
-                        st.code(json.dumps(res["result"], indent=2), language="json")
-                    else:
-                        st.error(f"❌ Error: {res.get('error')}")
-                
-                if summary:
-                    st.markdown("---")
-                    st.subheader("📄 Summary of User Stories")
-                    st.code(summary.strip(), language="markdown")
+                # results are rendered as each file finishes instead of after the whole repo
+                for event, payload in iter_sse_events(response):
+                    if event == "start":
+                        st.caption(f"run_id: `{payload['run_id']}`")
+
+                    elif event == "progress":
+                        files[payload["filename"]] = {**files.get(payload["filename"], {}), **payload}
+                        counts = Counter(f["status"] for f in files.values())
+                        status_line.markdown(
+                            f"⏳ {counts['queued']} queued · ⚙️ {counts['generating']} generating · "
+                            f"✅ {counts['validated']} validated · ♻️ {counts['reused']} reused · ❌ {counts['failed']} failed"
+                        )
+                        progress_table.dataframe(
+                            [{"file": f["filename"], "status": f["status"], "waited (s)": f.get("waited"), "elapsed (s)": f.get("elapsed"), "tokens saved": f.get("tokens_saved")} for f in files.values()],
+                            use_container_width=True
+                        )
+
+                    elif event == "result":
+                        st.markdown(f"📁 `{payload.get('filename')}`")
+                        if "result" in payload:
+                            st.code(json.dumps(payload["result"], indent=2), language="json")
+                        else:
+                            st.error(f"❌ Error: {payload.get('error')}")
+
+                    elif event == "summary" and payload.get("summary"):
+                        st.markdown("---")
+                        st.subheader("📄 Summary of User Stories")
+                        summary = payload["summary"]
+                        st.code(summary.strip() if isinstance(summary, str) else json.dumps(summary, indent=2), language="markdown")
+
+                    elif event == "error":
+                        st.error(f"❌ Error during analysis: {payload.get('error')}")
 
-            except Exception as e:
-                st.error(f"❌ Error triggering analysis: {e}")
+        except Exception as e:
+            st.error(f"❌ Error triggering analysis: {e}")
 
 
     if st.button(f"Get top language for :blue[{gh_user}/{gh_repo}]"):
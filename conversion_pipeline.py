@@ -1,5 +1,6 @@
 import os
 import json
+import asyncio
 
 from typing import Any, Optional, Union
 
@@ -10,15 +11,25 @@ from pydantic import BaseModel
 
 import utils.color_print as cp
 import utils.json_validator as jv
-from llm_provider import build_llm
-from schemas.llm_output_schemas import EngineerOutputSchema
+from llm_provider import invoke_llm, invalidate_llm_response
+from model_router import cascade_router
+from schemas.llm_output_schemas import EngineerOutputSchema, FunctionSchema, VariableSchema, FunctionDescriptionSchema, VariableDescriptionSchema, SignatureDescriptionSchema
 from prompts.prompt_library import PromptLibrary
 from database import log_agent_step
 from utils.llm_output_parser import parse_llm_response
+from utils.code_chunker import split_code
+from utils.output_merger import merge_engineer_outputs
+from utils.static_signatures import extract_signatures
+from utils.source_compactor import compact_source, SOURCE_COMPACTION
 
 prompt_lib = PromptLibrary()
 DB_URL = os.getenv("SUPABASE_DB_URL")
 
+# hedged mode starts the first prompt set and launches the next one after HEDGE_DELAY seconds or on a failure
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", "20"))
+HEDGE_VARIANTS = [v.strip() for v in os.getenv("HEDGE_VARIANTS", "engineer,engineer_beta,engineer_charlie").split(",") if v.strip()]
+
 # llm = OllamaLLM(model="llama3.2")
 
 # custom port
@@ -31,6 +42,11 @@ class ConversionWorkflowState(BaseModel):
     cycle_id: int = 1
     file_path: Optional[str] = None
     model1_config: Optional[dict] = None 
+    task: str = "code_to_json"
+    # cheap or primary, chosen by the cascade router on the first engineer call
+    model_tier: Optional[str] = None
+    # prompt set of the engineer answer: engineer, or the hedged variant that won
+    engineer_variant: Optional[str] = None
     
     step_number: int = 0
     retry_count: int = 0
@@ -40,29 +56,77 @@ class ConversionWorkflowState(BaseModel):
     model: Optional[dict] = None
 
     code: str
+    # tokens_before, tokens_after and tokens_saved of the source compaction
+    compaction: Optional[dict] = None
+    # compact specs of already validated files this one imports
+    dependency_context: Optional[dict] = None
+    signatures: Optional[dict] = None
     prompt: Optional[dict] = None
     json_spec: Any = None
     validated_output: Optional[EngineerOutputSchema] = None
+    validation_error: Optional[str] = None
     reviewer_feedback: Optional[str] = None
+    # summarizer only: retrieve the specs relevant to each topic instead of summarizing every module
+    summary_topics: Optional[list[str]] = None
+    # summarizer only: modules and batches whose partial summary failed and is missing from the result
+    summary_dropped: Optional[list[str]] = None
+
+async def compact_task(state: ConversionWorkflowState) -> ConversionWorkflowState:
+    """Strip boilerplate headers, banners and embedded assets from the source before any prompt is built."""
+    if not SOURCE_COMPACTION or state.compaction is not None:
+        return state
+
+    code, compaction = compact_source(state.code, state.file_path)
+    cp.log_info(f"🗜️ Compacted {state.file_path}: {compaction['tokens_before']} → {compaction['tokens_after']} tokens ({compaction['tokens_saved']} saved)")
+    return state.model_copy(update={"code": code, "compaction": compaction})
+
+async def static_analysis_task(state: ConversionWorkflowState) -> ConversionWorkflowState:
+    """Pre-fill names, parameters, types and access levels with a parser so the LLM only has to describe them."""
+    if state.task != "code_extraction":
+        return state
+
+    signatures = extract_signatures(state.code, state.file_path)
+    if signatures is None:
+        cp.log_info(f"No static parser for {state.file_path}, falling back to full LLM extraction")
+    else:
+        cp.log_info(f"🔎 Extracted {len(signatures['functions'])} functions and {len(signatures['variables'])} variables from {state.file_path}")
+    return state.model_copy(update={"signatures": signatures})
 
 async def engineer_task(state: ConversionWorkflowState) -> ConversionWorkflowState:
     cp.log_info('engineer_task() called')
     cp.log_info(f"▶️ Run: {state.run_id} | Cycle: {state.cycle_id} | Step: {state.step_number}")
-    
-    prompt_type = "code_to_json_after_feedback" if state.reviewer_feedback else "code_to_json"
 
-    prompt, prompt_id = prompt_lib.build_prompt("engineer", prompt_type, code=state.code, feedback=state.reviewer_feedback)
+    if state.model_tier is None:
+        state = state.model_copy(update={"model_tier": cascade_router.route(state.code, state.model1_config)})
+
+    if state.signatures is not None:
+        return await describe_signatures_task(state)
+
+    if state.task == "code_extraction":
+        prompt_type = "code_extraction"
+    else:
+        prompt_type = "code_to_json_after_feedback" if state.reviewer_feedback else "code_to_json"
+
     role, role_id = prompt_lib.get_role_details("engineer", prompt_type)
 
-    model1_config = state.model1_config
+    model1_config = cascade_router.model_config(state.model_tier, state.model1_config)
 
     # override temperature and top_p for reviewer
     model1_config["temperature"] = 0.2
     model1_config["top_p"] = 1.0
 
-    llm = build_llm(model1_config["provider"], model1_config["model_name"], model1_config["api_key"], model1_config["temperature"], model1_config["top_p"])
-    response = await llm.ainvoke(prompt)
-    response_parsed = parse_llm_response(response)
+    chunks = split_code(state.code, state.file_path) if not state.reviewer_feedback else [state.code]
+    variant = "engineer"
+    if len(chunks) > 1:
+        response_parsed, prompt, prompt_id = await engineer_chunks(chunks, prompt_type, model1_config, state.file_path, state.dependency_context)
+    elif HEDGE_ENABLED and len(HEDGE_VARIANTS) > 1:
+        response_parsed, variant, prompt, prompt_id = await engineer_hedged(HEDGE_VARIANTS, prompt_type, state.code, state.reviewer_feedback, model1_config, state.step_number == 0, state.dependency_context)
+        role, role_id = prompt_lib.get_role_details(variant, prompt_type)
+    else:
+        prompt, prompt_id = prompt_lib.build_prompt("engineer", prompt_type, code=state.code, feedback=state.reviewer_feedback, dependencies=state.dependency_context)
+        # a retry means the previous answer was invalid, so skip the cached copy of it
+        response = await invoke_llm(model1_config, prompt, use_cache=state.step_number == 0, expect_json=True)
+        response_parsed = parse_llm_response(response)
 
     cp.log_debug('response from LLM:', response_parsed)
 
@@ -71,14 +135,159 @@ async def engineer_task(state: ConversionWorkflowState) -> ConversionWorkflowSta
         "model": {"id": "1", "name": model1_config["model_name"], "temperature": model1_config["temperature"], "top_p": model1_config["top_p"]},
         "agent": {"id": role_id, "role": role},
         "json_spec": response_parsed,
-        "step_number": 0,
-        "reviewer_feedback": None
+        "reviewer_feedback": None,
+        "model_tier": state.model_tier,
+        "engineer_variant": variant
+    })
+
+async def describe_signatures_task(state: ConversionWorkflowState) -> ConversionWorkflowState:
+    """Ask the LLM only for descriptions of statically extracted signatures and merge them into full schemas."""
+    prompt_type = "describe_signatures"
+    role, role_id = prompt_lib.get_role_details("engineer", prompt_type)
+
+    model1_config = cascade_router.model_config(state.model_tier, state.model1_config)
+    model1_config["temperature"] = 0.2
+    model1_config["top_p"] = 1.0
+
+    signatures = state.signatures
+    if signatures["functions"] or signatures["variables"]:
+        prompt, prompt_id = prompt_lib.build_prompt("engineer", prompt_type, code=state.code, signatures=signatures, dependencies=state.dependency_context)
+        response = await invoke_llm(model1_config, prompt, use_cache=state.step_number == 0, expect_json=True)
+        response_parsed = parse_llm_response(response)
+        descriptions, error = jv.validate_llm_output(response_parsed, SignatureDescriptionSchema)
+        # every field has a default, so a parse failure would otherwise validate as an empty description set
+        if not isinstance(response_parsed, dict) or not ({"functions", "variables"} & response_parsed.keys()):
+            descriptions = None
+            error = response_parsed.get("error", "Missing functions and variables") if isinstance(response_parsed, dict) else error
+    else:
+        # nothing to describe, so skip the LLM call entirely
+        prompt, prompt_id = "", prompt_lib.get_prompt_template("engineer", prompt_type).get("id", "unknown")
+        descriptions, error = SignatureDescriptionSchema(), None
+
+    if descriptions is None:
+        json_spec = {"error": error, "raw": response_parsed}
+        invalidate_llm_response(model1_config, prompt)
+    else:
+        # anything the LLM left out keeps its static signature with an empty description
+        functions = [
+            FunctionSchema(**function, **descriptions.functions.get(function["name"], FunctionDescriptionSchema()).model_dump()).model_dump()
+            for function in signatures["functions"]
+        ]
+        variables = [
+            VariableSchema(**variable, **descriptions.variables.get(variable["name"], VariableDescriptionSchema()).model_dump()).model_dump()
+            for variable in signatures["variables"]
+        ]
+        json_spec = {"filename": state.file_path, "output": {"functions": functions, "variables": variables}}
+
+    return state.model_copy(update={
+        "prompt": {"id": prompt_id, "type": prompt_type, "input": prompt},
+        "model": {"id": "1", "name": model1_config["model_name"], "temperature": model1_config["temperature"], "top_p": model1_config["top_p"]},
+        "agent": {"id": role_id, "role": role},
+        "json_spec": json_spec,
+        "reviewer_feedback": None,
+        "model_tier": state.model_tier,
+        "engineer_variant": "engineer"
     })
 
+def has_variant(variant: str, prompt_type: str) -> bool:
+    try:
+        prompt_lib.get_prompt_template(variant, prompt_type)
+        return True
+    except (FileNotFoundError, ValueError):
+        return False
+
+async def engineer_hedged(variants: list[str], prompt_type: str, code: str, feedback: Optional[str], model1_config: dict, use_cache: bool, dependencies: Optional[dict] = None) -> tuple[Any, str, str, str]:
+    """Race the engineer prompt sets: the next variant starts after HEDGE_DELAY seconds or as soon as one fails,
+    and the first answer that validates wins while the others are cancelled.
+
+    Returns (response_parsed, variant, prompt, prompt_id); the last failure when no variant validates.
+    """
+    remaining = [variant for variant in variants if has_variant(variant, prompt_type)]
+    attempts: dict[asyncio.Task, tuple[str, str, str]] = {}
+
+    def launch():
+        variant = remaining.pop(0)
+        prompt, prompt_id = prompt_lib.build_prompt(variant, prompt_type, code=code, feedback=feedback, dependencies=dependencies)
+        task = asyncio.create_task(invoke_llm(model1_config, prompt, use_cache=use_cache, expect_json=True))
+        attempts[task] = (variant, prompt, prompt_id)
+        if len(attempts) > 1:
+            cp.log_info(f"🏁 Hedging with {variant} ({len(attempts)} in flight)")
+
+    launch()
+    pending = set(attempts)
+    last_failure = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=HEDGE_DELAY if remaining else None, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                launch()
+                pending = {task for task in attempts if not task.done()}
+                continue
+
+            for task in done:
+                variant, prompt, prompt_id = attempts[task]
+                try:
+                    response_parsed = parse_llm_response(task.result())
+                except Exception as e:
+                    cp.log_warn(f"{variant} failed: {e}")
+                    response_parsed = {"error": str(e)}
+                validated, _ = jv.validate_llm_output(response_parsed, EngineerOutputSchema)
+                if validated and validated.output is not None:
+                    cp.log_info(f"🏆 {variant} won after {len(attempts)} attempts")
+                    return response_parsed, variant, prompt, prompt_id
+                invalidate_llm_response(model1_config, prompt)
+                last_failure = (response_parsed, variant, prompt, prompt_id)
+
+            if remaining:
+                launch()
+                pending = {task for task in attempts if not task.done()}
+        return last_failure
+    finally:
+        for task in attempts:
+            task.cancel()
+
+async def engineer_chunks(chunks: list[str], prompt_type: str, model1_config: dict, file_path: Optional[str], dependencies: Optional[dict] = None) -> tuple[dict, str, str]:
+    """Run every chunk of an oversized file through the engineer prompt concurrently and merge the partial outputs."""
+    cp.log_info(f"✂️ Splitting {file_path} into {len(chunks)} chunks")
+    prompts = []
+    for i, chunk in enumerate(chunks, start=1):
+        prompt, prompt_id = prompt_lib.build_prompt("engineer", prompt_type, code=f"(part {i} of {len(chunks)} of {file_path})\n{chunk}", dependencies=dependencies)
+        prompts.append(prompt)
+
+    # chunks that came back valid stay cached, so a retry only regenerates the broken ones
+    responses = await asyncio.gather(*(invoke_llm(model1_config, prompt, expect_json=True) for prompt in prompts))
+    parsed = [parse_llm_response(response) for response in responses]
+    checks = [jv.validate_llm_output(response_parsed, EngineerOutputSchema) for response_parsed in parsed]
+    # a broken chunk gets the repair prompt first, a regeneration would redo every chunk
+    broken = [i for i, (validated, _) in enumerate(checks) if not (validated and validated.output is not None)]
+    repaired = await asyncio.gather(*(repair_output(parsed[i], checks[i][1], model1_config) for i in broken))
+    for i, response_parsed in zip(broken, repaired):
+        invalidate_llm_response(model1_config, prompts[i])
+        if response_parsed is not None:
+            parsed[i] = response_parsed
+            checks[i] = jv.validate_llm_output(response_parsed, EngineerOutputSchema)
+
+    outputs, failed = [], 0
+    for response_parsed, (validated, _) in zip(parsed, checks):
+        if validated and validated.output is not None:
+            outputs.append(response_parsed)
+        else:
+            failed += 1
+
+    combined_prompt = "\n\n".join(prompts)
+    if failed:
+        return {"error": f"{failed}/{len(chunks)} chunks returned invalid JSON"}, combined_prompt, prompt_id
+    return merge_engineer_outputs(outputs), combined_prompt, prompt_id
+
 async def validate_engineer_json(state: ConversionWorkflowState) -> ConversionWorkflowState:
     validated, error = jv.validate_llm_output(state.json_spec, EngineerOutputSchema)
+    # parse failures come back as {"error": ..., "raw": ...}, which has no output to keep
+    if validated and validated.output is None:
+        validated, error = None, state.json_spec.get("error", "Missing output") if isinstance(state.json_spec, dict) else "Missing output"
+    model_config = cascade_router.model_config(state.model_tier, state.model1_config)
     if validated:
         cp.log_info('✅ output is valid JSON')
+        cascade_router.record(model_config, "accepted")
         cp.log_debug('Validated JSON:', type(validated))
         await log_agent_step({
             "project_id": state.project_id,
@@ -106,9 +315,130 @@ async def validate_engineer_json(state: ConversionWorkflowState) -> ConversionWo
             "status": "generated"
         })
         return state.model_copy(update={"validated_output": validated, "step_number": 0})
+    elif state.model_tier == "cheap":
+        cp.log_warn(f"⏫ invalid JSON from {model_config['model_name']}, escalating to {state.model1_config['model_name']}")
+        cascade_router.record(model_config, "escalated")
+        # the primary model regenerates from the source with its own retries instead of repairing the cheap answer
+        return state.model_copy(update={"model_tier": "primary", "step_number": 0, "json_spec": None, "validation_error": str(error)})
     else:
         cp.log_warn(f"❌ invalid JSON detected. Retry step {state.step_number + 1}/{state.max_retries}")
-        return state.model_copy(update={"step_number": state.step_number + 1})
+        cascade_router.record(model_config, "rejected")
+        return state.model_copy(update={"step_number": state.step_number + 1, "validation_error": str(error)})
+
+# a repair that fails again falls back to regenerating from the source
+REPAIRABLE_PROMPT_TYPES = ("code_to_json", "code_to_json_after_feedback", "code_extraction")
+
+def repairable(json_spec: Any) -> Optional[Union[str, dict]]:
+    """The part of an invalid answer worth repairing, or None when only a full regeneration can help."""
+    if isinstance(json_spec, dict) and "error" in json_spec:
+        # parse failures keep the raw text, merged chunk failures and plain prose have nothing to repair
+        raw = json_spec.get("raw") or ""
+        return raw if "{" in raw else None
+    if not json_spec:
+        return None
+    return json_spec if isinstance(json_spec, (str, dict)) else json.dumps(json_spec)
+
+def broken_output(state: ConversionWorkflowState) -> Optional[Union[str, dict]]:
+    if not state.prompt or state.prompt["type"] not in REPAIRABLE_PROMPT_TYPES:
+        return None
+    return repairable(state.json_spec)
+
+async def repair_output(json_spec: Any, error: Any, model_config: dict) -> Optional[Any]:
+    """Parsed answer of the repair prompt for an invalid engineer answer, None when there is nothing to repair."""
+    broken = repairable(json_spec)
+    if broken is None:
+        return None
+    prompt, _ = prompt_lib.build_prompt("engineer", "repair_json", json_output=broken, feedback=str(error))
+    model_config = {**model_config, "temperature": 0.0, "top_p": 1.0}
+    response_parsed = parse_llm_response(await invoke_llm(model_config, prompt, expect_json=True))
+    if isinstance(response_parsed, dict) and "error" in response_parsed:
+        invalidate_llm_response(model_config, prompt)
+    return response_parsed
+
+async def repair_task(state: ConversionWorkflowState) -> ConversionWorkflowState:
+    """Send only the broken output and its validation error back to the LLM instead of regenerating from the source."""
+    cp.log_info(f"🩹 repair_task() called for {state.file_path}: {state.validation_error}")
+    prompt_type = "repair_json"
+
+    prompt, prompt_id = prompt_lib.build_prompt("engineer", prompt_type, json_output=broken_output(state), feedback=state.validation_error)
+    role, role_id = prompt_lib.get_role_details("engineer", prompt_type)
+
+    model1_config = cascade_router.model_config(state.model_tier, state.model1_config)
+    model1_config["temperature"] = 0.0
+    model1_config["top_p"] = 1.0
+
+    response = await invoke_llm(model1_config, prompt, expect_json=True)
+    response_parsed = parse_llm_response(response)
+    if isinstance(response_parsed, dict) and "error" in response_parsed:
+        invalidate_llm_response(model1_config, prompt)
+
+    return state.model_copy(update={
+        "prompt": {"id": prompt_id, "type": prompt_type, "input": prompt},
+        "model": {"id": "1", "name": model1_config["model_name"], "temperature": model1_config["temperature"], "top_p": model1_config["top_p"]},
+        "agent": {"id": role_id, "role": role},
+        "json_spec": response_parsed
+    })
+
+# the packed prompt; its outputs are keyed under it in the content index
+BATCH_PROMPT_TYPE = "code_to_json_batch"
+
+async def engineer_batch(documents: list[dict], run_id: str, model1_config: dict, project_id: str = "") -> dict:
+    """Analyze several small files with a single engineer prompt and log one validated record per file.
+
+    Returns {filename: validated output dict}; files missing or invalid in the response are left out
+    so the caller can send them through conversionWorkflow on their own.
+    """
+    cp.log_info(f"📦 engineer_batch() called for {len(documents)} files")
+    prompt_type = BATCH_PROMPT_TYPE
+
+    if SOURCE_COMPACTION:
+        documents = [{**doc, "content": compact_source(doc["content"], doc["name"])[0]} for doc in documents]
+    prompt, prompt_id = prompt_lib.build_prompt("engineer", prompt_type, files=documents)
+    role, role_id = prompt_lib.get_role_details("engineer", prompt_type)
+
+    model1_config = {**model1_config, "temperature": 0.2, "top_p": 1.0}
+
+    response = await invoke_llm(model1_config, prompt, expect_json=True)
+    response_parsed = parse_llm_response(response)
+
+    entries = response_parsed.get("files") if isinstance(response_parsed, dict) else None
+    if not isinstance(entries, list):
+        cp.log_warn("❌ batch response has no files array")
+        invalidate_llm_response(model1_config, prompt)
+        return {}
+
+    expected = {doc["name"] for doc in documents}
+    results = {}
+    for entry in entries:
+        validated, _ = jv.validate_llm_output(entry, EngineerOutputSchema) if isinstance(entry, dict) else (None, None)
+        filename = entry.get("filename") if isinstance(entry, dict) else None
+        if not validated or validated.output is None or filename not in expected or filename in results:
+            continue
+
+        await log_agent_step({
+            "project_id": project_id,
+            "run_id": run_id,
+            "cycle_id": "1",
+            "step_number": 0,
+            "agent_id": role_id,
+            "agent_role": role,
+            "llm_model_id": "1",
+            "llm_model_name": model1_config["model_name"],
+            "llm_model_temperature": model1_config["temperature"],
+            "llm_model_top_p": model1_config["top_p"],
+            "prompt_id": prompt_id,
+            "prompt_type": prompt_type,
+            "raw_input": prompt,
+            "raw_output": json.dumps(entry),
+            "validated_json": json.dumps(validated.model_dump()),
+            "confidence": None,
+            "file_path": filename,
+            "status": "generated"
+        })
+        results[filename] = entry
+
+    cp.log_info(f"✅ batch validated {len(results)}/{len(documents)} files")
+    return results
 
 async def product_manager_task(state: ConversionWorkflowState) -> ConversionWorkflowState:
     cp.log_info("🔍 product_manager_task() called")
@@ -123,8 +453,7 @@ async def product_manager_task(state: ConversionWorkflowState) -> ConversionWork
     model1_config["temperature"] = 0.5
     model1_config["top_p"] = 1.0
 
-    llm = build_llm(model1_config["provider"], model1_config["model_name"], model1_config["api_key"], model1_config["temperature"], model1_config["top_p"])
-    feedback = await llm.ainvoke(prompt)
+    feedback = await invoke_llm(model1_config, prompt)
     feedback_parsed = parse_llm_response(feedback)
 
     cp.log_debug("📝 Reviewer feedback:", feedback_parsed)
@@ -206,6 +535,9 @@ def route_validation_result(state: ConversionWorkflowState) -> str:
         cp.log_info('Proceeding to review.')
         # return "review"
         return END
+    elif state.step_number < state.max_retries and broken_output(state) is not None:
+        cp.log_info('Repairing output.')
+        return "repair"
     elif state.step_number < state.max_retries:
         cp.log_info('Returning to engineer.')
         return "engineer"
@@ -225,14 +557,21 @@ def route_reviewer_result(state: ConversionWorkflowState) -> str:
 # LangGraph Compiler
 builder = StateGraph(ConversionWorkflowState)
 
+builder.add_node("compact", compact_task)
+builder.add_node("static_analysis", static_analysis_task)
 builder.add_node("engineer", engineer_task)
 builder.add_node("validate", validate_engineer_json)
+builder.add_node("repair", repair_task)
 # builder.add_node("review", product_manager_task)
 
-builder.set_entry_point("engineer")
+builder.set_entry_point("compact")
+
+builder.add_edge("compact", "static_analysis")
+builder.add_edge("static_analysis", "engineer")
 
 # Branch to validation
 builder.add_edge("engineer", "validate")
+builder.add_edge("repair", "validate")
 
 builder.add_conditional_edges(
     "validate",
@@ -240,6 +579,7 @@ builder.add_conditional_edges(
     path_map={
         # "review": "review",
         "engineer": "engineer",
+        "repair": "repair",
         END: END
     }
 )
@@ -253,4 +593,8 @@ builder.add_conditional_edges(
 #     }
 # )
 
-conversionWorkflow = builder.compile()
+def build_conversion_workflow(checkpointer=None):
+    """Compile the graph, optionally with a LangGraph checkpointer so an interrupted run resumes at its last step."""
+    return builder.compile(checkpointer=checkpointer)
+
+conversionWorkflow = build_conversion_workflow()
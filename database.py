@@ -1,6 +1,12 @@
 import os
-
+import time
 import uuid
+import asyncio
+import threading
+import concurrent.futures
+
+from typing import Any, Awaitable, Optional
+
 import asyncpg
 from dotenv import load_dotenv
 
@@ -10,13 +16,111 @@ load_dotenv()
 
 DB_URL = os.getenv("SUPABASE_DB_URL")
 
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# prepared statements reused per connection; set to 0 behind a transaction-mode pgbouncer (Supabase pooler on 6543)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+# idle connections are closed before the server or a proxy drops them silently
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "60"))
+DB_HEALTH_TIMEOUT = float(os.getenv("DB_HEALTH_TIMEOUT", "5"))
+# how long a synchronous caller (the Streamlit logs view) waits for a query
+DB_SYNC_TIMEOUT = float(os.getenv("DB_SYNC_TIMEOUT", "30"))
+
+# a pool belongs to the event loop that created it, so each loop (the API server, the Streamlit worker) gets its own
+_pools: dict[asyncio.AbstractEventLoop, asyncpg.Pool] = {}
+_pool_locks: dict[asyncio.AbstractEventLoop, asyncio.Lock] = {}
+
+async def get_pool() -> asyncpg.Pool:
+    """The connection pool of the running event loop, created on first use."""
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is not None:
+        return pool
+
+    for stale in [other for other in _pools if other.is_closed()]:
+        # asyncio.run() closed that loop, its connections cannot be closed gracefully anymore
+        _pools.pop(stale).terminate()
+        _pool_locks.pop(stale, None)
+
+    async with _pool_locks.setdefault(loop, asyncio.Lock()):
+        if loop not in _pools:
+            _pools[loop] = await asyncpg.create_pool(
+                DB_URL,
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+                max_inactive_connection_lifetime=DB_POOL_MAX_IDLE,
+                command_timeout=DB_COMMAND_TIMEOUT,
+            )
+            cp.log_info(f"Opened database pool (min {DB_POOL_MIN_SIZE}, max {DB_POOL_MAX_SIZE})")
+    return _pools[loop]
+
+async def close_pool():
+    """Close the pool of the running event loop. Called on server shutdown."""
+    loop = asyncio.get_running_loop()
+    pool = _pools.pop(loop, None)
+    _pool_locks.pop(loop, None)
+    if pool is not None:
+        await pool.close()
+        cp.log_info("Closed database pool")
+
 async def get_db_conn():
-    return await asyncpg.connect(DB_URL)
+    """A dedicated connection outside the pool; the caller closes it."""
+    return await asyncpg.connect(DB_URL, statement_cache_size=DB_STATEMENT_CACHE_SIZE)
+
+async def _run(method: str, query: str, *args):
+    pool = await get_pool()
+    try:
+        async with pool.acquire() as conn:
+            return await getattr(conn, method)(query, *args)
+    except (asyncpg.exceptions.ConnectionDoesNotExistError, ConnectionResetError) as e:
+        # a write may have committed before the connection dropped, only a read is safe to send again
+        if method != "fetch":
+            raise
+        # the server dropped an idle connection; the pool discards it and the retry gets a fresh one
+        cp.log_warn(f"Database connection lost ({e}), retrying once")
+        async with pool.acquire() as conn:
+            return await getattr(conn, method)(query, *args)
+
+async def check_db_health() -> dict:
+    """Round-trip a trivial query through the pool and report its latency and pool usage."""
+    started = time.perf_counter()
+    try:
+        pool = await asyncio.wait_for(get_pool(), DB_HEALTH_TIMEOUT)
+        async with pool.acquire(timeout=DB_HEALTH_TIMEOUT) as conn:
+            await conn.fetchval("SELECT 1", timeout=DB_HEALTH_TIMEOUT)
+    except Exception as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    return {
+        "ok": True,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        "pool": {"size": pool.get_size(), "idle": pool.get_idle_size(), "min": pool.get_min_size(), "max": pool.get_max_size()},
+    }
+
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_lock = threading.Lock()
+
+def run_sync(coro: Awaitable, timeout: Optional[float] = DB_SYNC_TIMEOUT) -> Any:
+    """Run a coroutine on a long-lived background event loop and wait for its result.
+
+    For synchronous callers like Streamlit: asyncio.run() would start a new loop per call, and with it a new pool.
+    A coroutine still running after `timeout` seconds is cancelled and TimeoutError raised.
+    """
+    global _background_loop
+    with _background_lock:
+        if _background_loop is None or _background_loop.is_closed():
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="db-loop", daemon=True).start()
+    future = asyncio.run_coroutine_threadsafe(coro, _background_loop)
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise TimeoutError(f"Database query did not finish within {timeout}s")
 
 async def log_agent_step(data: dict):
-    
-    conn = await get_db_conn()
-    await conn.execute("""
+    await _run("execute", """
         INSERT INTO temp_agent_step (
             project_id, run_id, cycle_id, step_number,
             agent_id, agent_role, agent_desc,
@@ -39,15 +143,28 @@ async def log_agent_step(data: dict):
             data['raw_input'], data['raw_output'], data['validated_json'],
             data['confidence'], data['status'], 0, data['file_path'])
     cp.log_info("Agent step logged successfully.")
-    await conn.close()
 
-async def fetch_data(query: str):
-    conn = await get_db_conn()
-    try:
-        results = await conn.fetch(query)
-        return [
-            {k: str(v) if isinstance(v, (uuid.UUID, asyncpg.pgproto.pgproto.UUID)) else v for k, v in dict(row).items()}
-            for row in results
-        ]
-    finally:
-        await conn.close()
\ No newline at end of file
+async def fetch_data(query: str, *args):
+    results = await _run("fetch", query, *args)
+    return [
+        {k: str(v) if isinstance(v, (uuid.UUID, asyncpg.pgproto.pgproto.UUID)) else v for k, v in dict(row).items()}
+        for row in results
+    ]
+
+async def fetch_validated_steps(run_id: str, file_paths: list) -> list:
+    """Latest validated engineer output per file for a run."""
+    return await fetch_data("""
+        SELECT DISTINCT ON (file_path)
+            project_id, cycle_id, step_number,
+            agent_id, agent_role,
+            llm_model_id, llm_model_name, llm_model_temperature, llm_model_top_p,
+            prompt_id, prompt_type,
+            raw_input, raw_output, validated_json,
+            confidence, file_path
+        FROM temp_agent_step
+        WHERE run_id = $1
+          AND status IN ('generated', 'reused')
+          AND validated_json IS NOT NULL
+          AND file_path = ANY($2::text[])
+        ORDER BY file_path, created_at DESC
+    """, run_id, list(file_paths))
\ No newline at end of file
@@ -0,0 +1,96 @@
+import json
+
+from typing import Optional
+
+import utils.color_print as cp
+from conversion_pipeline import prompt_lib
+from database import log_agent_step, fetch_validated_steps
+from repo_source import list_repo_file_shas
+from utils.content_index import content_index, content_key, CONTENT_INDEX_ENABLED
+from utils.run_manifest import load_run_manifest, find_run_manifest
+
+async def resolve_base_manifest(
+        base_run_id: Optional[str] = None,
+        base_commit: Optional[str] = None,
+        github_config: Optional[dict] = None,
+        local_path: Optional[str] = None,
+    ) -> Optional[dict]:
+    """Manifest of the run to reuse outputs from, or None when the base commit cannot be listed."""
+    if base_run_id:
+        manifest = load_run_manifest(base_run_id)
+        if not manifest:
+            raise LookupError(f"No manifest recorded for base run {base_run_id}")
+        return manifest
+
+    file_shas = await list_repo_file_shas(base_commit, github_config, local_path)
+    if file_shas is None:
+        return None
+    manifest = find_run_manifest(file_shas)
+    if not manifest:
+        raise LookupError(f"No previous run found for commit {base_commit}")
+    return manifest
+
+def run_generator(model1_config: Optional[dict], task: str = "code_to_json") -> dict:
+    """Model and engineer prompt version of a run, recorded in its manifest: outputs are only reused by a run with the same."""
+    model1_config = model1_config or {}
+    try:
+        compiled = prompt_lib.compile("engineer", task)
+        prompt = f"{compiled.id}:{compiled.version}"
+    except FileNotFoundError:
+        prompt = None
+    return {"model": f"{model1_config.get('provider')}/{model1_config.get('model_name')}", "prompt": prompt}
+
+def same_generator(base_manifest: dict, generator: dict) -> bool:
+    # manifests written before the generator was recorded never match
+    return base_manifest.get("generator") == generator
+
+async def load_base_steps(base_manifest: dict, generator: dict) -> dict:
+    """Stored engineer steps of the base run, keyed by file path."""
+    if not same_generator(base_manifest, generator):
+        cp.log_warn(f"Base run {base_manifest['run_id']} used {base_manifest.get('generator')}, not {generator}: running a full analysis")
+        return {}
+    rows = await fetch_validated_steps(base_manifest["run_id"], sorted(base_manifest["files"]))
+    cp.log_info(f"Incremental run against {base_manifest['run_id']}: {len(rows)} stored outputs available")
+    return {row["file_path"]: row for row in rows}
+
+def find_reusable_step(doc: dict, base_manifest: dict, base_steps: dict, generator: dict) -> Optional[dict]:
+    """Return the base run's step for a document whose blob sha is unchanged, when the base run used the same
+    model and engineer prompt."""
+    sha = doc.get("sha")
+    if sha and base_manifest["files"].get(doc["name"]) == sha and same_generator(base_manifest, generator):
+        return base_steps.get(doc["name"])
+    return None
+
+def source_key(doc: dict, model1_config: dict, task: str = "code_to_json") -> Optional[str]:
+    """Content index key of a document: normalized source, engineer prompt id and version, and model.
+    `task` is the engineer prompt type that produces (or produced) the output, e.g. code_to_json_batch when packed."""
+    if not CONTENT_INDEX_ENABLED or not model1_config:
+        return None
+    compiled = prompt_lib.compile("engineer", task)
+    return content_key(doc["content"], f"{compiled.id}:{compiled.version}", model1_config)
+
+def find_duplicate_step(doc: dict, model1_config: dict, task: str = "code_to_json") -> Optional[dict]:
+    """Where an identical source was validated before, in any run or repository."""
+    key = source_key(doc, model1_config, task)
+    entry = content_index.get(key) if key else None
+    return {**entry, "key": key} if entry else None
+
+async def load_duplicate_step(duplicate: dict) -> Optional[dict]:
+    rows = await fetch_validated_steps(duplicate["run_id"], [duplicate["file_path"]])
+    content_index.count(hit=bool(rows))
+    if not rows:
+        # the referenced output is gone, the next validated copy takes its place
+        content_index.invalidate(duplicate["key"])
+        return None
+    return rows[0]
+
+def record_source(doc: dict, run_id: str, model1_config: dict, task: str = "code_to_json"):
+    key = source_key(doc, model1_config, task)
+    if key:
+        content_index.put(key, run_id, doc["name"])
+
+async def reuse_step(row: dict, project_id: str, run_id: str) -> dict:
+    """Record a stored engineer output under the new run and return it in /analyze-all result form."""
+    await log_agent_step({**row, "project_id": project_id, "run_id": run_id, "status": "reused"})
+    parsed = json.loads(row["validated_json"])
+    return {"filename": row["file_path"], "result": parsed.get("output", parsed), "reused": True}
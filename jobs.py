@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import asyncio
+
+from collections import Counter
+from contextlib import aclosing
+from typing import Optional
+from uuid import uuid4
+from pathlib import Path
+
+import aiosqlite
+from dotenv import load_dotenv
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+import utils.color_print as cp
+from analysis_runner import open_analysis, invoke_checkpointed
+from conversion_pipeline import ConversionWorkflowState, build_conversion_workflow
+from summarizer_pipeline import build_summarizer_workflow
+from utils.repo_cache import CACHE_DIR
+
+load_dotenv()
+
+JOBS_DIR = CACHE_DIR / "jobs"
+CHECKPOINT_DB = CACHE_DIR / "checkpoints.sqlite3"
+MAX_RUNNING_JOBS = int(os.getenv("MAX_RUNNING_JOBS", "2"))
+
+# pydantic types stored in ConversionWorkflowState checkpoints
+CHECKPOINT_TYPES = [("schemas.llm_output_schemas", "EngineerOutputSchema")]
+
+# credentials are never written to disk (job records here, graph checkpoints in invoke_checkpointed),
+# a resumed job must be given them again
+SECRET_KEYS = ("token", "api_key")
+
+_checkpointer: Optional[AsyncSqliteSaver] = None
+_checkpointer_lock = asyncio.Lock()
+
+async def get_checkpointer() -> AsyncSqliteSaver:
+    """Shared SQLite-backed LangGraph checkpointer for job runs."""
+    global _checkpointer
+    async with _checkpointer_lock:
+        if _checkpointer is None:
+            CHECKPOINT_DB.parent.mkdir(parents=True, exist_ok=True)
+            serde = JsonPlusSerializer(allowed_msgpack_modules=CHECKPOINT_TYPES)
+            _checkpointer = AsyncSqliteSaver(await aiosqlite.connect(CHECKPOINT_DB), serde=serde)
+            await _checkpointer.setup()
+    return _checkpointer
+
+async def close_checkpointer():
+    global _checkpointer
+    if _checkpointer is not None:
+        await _checkpointer.conn.close()
+        _checkpointer = None
+
+def strip_secrets(data: dict) -> dict:
+    return {
+        key: {k: v for k, v in value.items() if k not in SECRET_KEYS} if isinstance(value, dict) else value
+        for key, value in data.items()
+    }
+
+def merge_secrets(stored: dict, supplied: dict) -> dict:
+    merged = dict(stored)
+    for key, value in (supplied or {}).items():
+        merged[key] = {**stored[key], **value} if isinstance(value, dict) and isinstance(stored.get(key), dict) else value
+    return merged
+
+def _job_path(job_id: str) -> Path:
+    return JOBS_DIR / f"{Path(job_id).name}.json"
+
+def _files_path(job_id: str) -> Path:
+    return JOBS_DIR / f"{Path(job_id).name}.files.jsonl"
+
+def save_job(job: dict):
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    job["updated_at"] = time.time()
+    tmp = _job_path(job["job_id"]).with_suffix(".tmp")
+    tmp.write_text(json.dumps(job, default=str), encoding="utf-8")
+    tmp.replace(_job_path(job["job_id"]))
+
+def load_job(job_id: str) -> Optional[dict]:
+    try:
+        return json.loads(_job_path(job_id).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+def save_file_checkpoint(job_id: str, entry: dict):
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    with open(_files_path(job_id), "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, default=str) + "\n")
+
+def load_file_checkpoints(job_id: str) -> dict:
+    """Completed files of a job, keyed by filename. A line cut short by a crash is ignored."""
+    checkpoints = {}
+    try:
+        with open(_files_path(job_id), encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                checkpoints[entry["filename"]] = entry
+    except FileNotFoundError:
+        pass
+    return checkpoints
+
+class JobManager:
+    """Runs repository analyses as background jobs with a persisted record and a checkpoint per completed file."""
+
+    def __init__(self, max_running: int = MAX_RUNNING_JOBS):
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._jobs: dict[str, dict] = {}
+        self._slots = asyncio.Semaphore(max_running)
+
+    def mark_interrupted(self):
+        """Jobs left queued or running by a previous process can only be resumed by hand (credentials are not stored)."""
+        for path in JOBS_DIR.glob("*.json"):
+            job = load_job(path.stem)
+            if job and job["status"] in ("queued", "running"):
+                job["status"] = "interrupted"
+                save_job(job)
+
+    def submit(self, data: dict) -> dict:
+        job = {
+            "job_id": str(uuid4()),
+            "run_id": str(uuid4()),
+            "status": "queued",
+            "created_at": time.time(),
+            "request": strip_secrets(data),
+            "progress": {},
+            "completed_files": 0,
+            "failed_files": 0,
+            "error": None,
+            "summary": None,
+        }
+        save_job(job)
+        self._start(job, data)
+        return job
+
+    def resume(self, job_id: str, credentials: Optional[dict] = None) -> dict:
+        job = self.get(job_id)
+        if job is None:
+            raise LookupError(f"Unknown job {job_id}")
+        if job_id in self._tasks:
+            raise ValueError(f"Job {job_id} is already {job['status']}")
+        if job["status"] == "completed" and not job.get("failed_files"):
+            raise ValueError(f"Job {job_id} is already completed")
+        job.update({"status": "queued", "error": None})
+        save_job(job)
+        self._start(job, merge_secrets(job["request"], credentials))
+        return job
+
+    def cancel(self, job_id: str) -> dict:
+        job = self.get(job_id)
+        if job is None:
+            raise LookupError(f"Unknown job {job_id}")
+        task = self._tasks.get(job_id)
+        if task is None:
+            raise ValueError(f"Job {job_id} is not running")
+        task.cancel()
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self._jobs.get(job_id) or load_job(job_id)
+
+    def list_jobs(self) -> list[dict]:
+        jobs = {path.stem: load_job(path.stem) for path in JOBS_DIR.glob("*.json")}
+        jobs.update(self._jobs)
+        return sorted((job for job in jobs.values() if job), key=lambda job: job["created_at"], reverse=True)
+
+    def results(self, job_id: str) -> list[dict]:
+        return [{"filename": entry["filename"], "result": entry["result"]} for entry in load_file_checkpoints(job_id).values()]
+
+    def _start(self, job: dict, data: dict):
+        self._jobs[job["job_id"]] = job
+        task = asyncio.create_task(self._run(job, data))
+        self._tasks[job["job_id"]] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job["job_id"], None))
+
+    async def _run(self, job: dict, data: dict):
+        job_id = job["job_id"]
+        try:
+            async with self._slots:
+                job.update({"status": "running", "completed_files": 0, "failed_files": 0})
+                save_job(job)
+                await self._analyze(job, data)
+                summary = await self._summarize(job, data)
+                job.update({"status": "completed", "summary": summary})
+                cp.log_info(f"✅ Job {job_id} completed")
+        except asyncio.CancelledError:
+            job["status"] = "cancelled"
+            cp.log_warn(f"Job {job_id} cancelled")
+            raise
+        except Exception as e:
+            job.update({"status": "failed", "error": str(e)})
+            cp.log_error(f"❌ Job {job_id} failed: {e}")
+        finally:
+            save_job(job)
+            self._jobs.pop(job_id, None)
+
+    async def _analyze(self, job: dict, data: dict):
+        job_id = job["job_id"]
+        completed = load_file_checkpoints(job_id)
+        if completed:
+            cp.log_info(f"⏯️ Resuming job {job_id} with {len(completed)} completed files")
+
+        statuses, shas = {}, {}
+        def on_event(event: dict):
+            statuses[event["filename"]] = event["status"]
+            if event["status"] == "queued":
+                shas[event["filename"]] = event.get("sha")
+            job["progress"] = dict(Counter(statuses.values()))
+
+        results = await open_analysis(
+            data, job["run_id"],
+            on_event=on_event,
+            workflow=build_conversion_workflow(await get_checkpointer()),
+            completed=completed,
+        )
+        async with aclosing(results):
+            async for result in results:
+                if "error" in result:
+                    # failed files are retried by the next resume
+                    job["failed_files"] += 1
+                    save_job(job)
+                    continue
+                if not result.get("resumed") and shas.get(result["filename"]):
+                    save_file_checkpoint(job_id, {"filename": result["filename"], "sha": shas[result["filename"]], "result": result["result"]})
+                job["completed_files"] += 1
+                save_job(job)
+
+    async def _summarize(self, job: dict, data: dict):
+        summary_state = ConversionWorkflowState(
+            project_id="delta",
+            run_id=job["run_id"],
+            code="",
+            model1_config=data.get("model1_config"),
+        )
+        workflow = build_summarizer_workflow(await get_checkpointer())
+        # a resume that completed more files needs a new summary, an identical one is reused
+        thread_id = f"{job['run_id']}:summary:{job['completed_files']}"
+        result = await invoke_checkpointed(workflow, summary_state, thread_id, "json_spec")
+        return result.get("json_spec")
+
+job_manager = JobManager()
@@ -1,9 +1,51 @@
+import os
+import time
+import asyncio
+import inspect
+
+from collections import OrderedDict
+from contextlib import aclosing, contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
 from langchain_ollama import OllamaLLM
 
-def build_llm(provider: str, model: str, api_key: str, temperature=0.5, top_p=1.0):
+import utils.color_print as cp
+from utils.llm_cache import llm_cache, cache_key, LLM_CACHE_ENABLED
+from utils.json_stream import IncrementalJsonChecker
+
+load_dotenv()
+
+# max in-flight requests per provider, e.g. LLM_CONCURRENCY_GEMINI=4
+DEFAULT_PROVIDER_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "16"))
+LLM_POOL_IDLE_TIMEOUT = float(os.getenv("LLM_POOL_IDLE_TIMEOUT", "600"))
+
+# stream JSON completions and stop paying for them as soon as they cannot parse
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() == "true"
+
+_provider_slots: dict[str, asyncio.Semaphore] = {}
+# (provider, model, api_key, temperature, top_p) -> (client, last used)
+_llm_pool: OrderedDict[tuple, tuple[object, float]] = OrderedDict()
+# calls in flight per client (by id), and evicted clients waiting for theirs to finish before they are closed
+_in_use: dict[int, int] = {}
+_retired: dict[int, object] = {}
+_closing: set[asyncio.Task] = set()
+# api keys of the graph run in progress, kept out of its state so checkpoints never hold them
+_api_keys: ContextVar[dict] = ContextVar("api_keys", default={})
+
+def provider_slot(provider: str) -> asyncio.Semaphore:
+    """Semaphore shared by every caller of a provider, so parallel workers never exceed its cap."""
+    if provider not in _provider_slots:
+        limit = int(os.getenv(f"LLM_CONCURRENCY_{provider.upper()}", DEFAULT_PROVIDER_CONCURRENCY))
+        _provider_slots[provider] = asyncio.Semaphore(limit)
+    return _provider_slots[provider]
+
+def _create_llm(provider: str, model: str, api_key: str, temperature=0.5, top_p=1.0):
     if provider == "gemini":
         return ChatGoogleGenerativeAI(model=model, google_api_key=api_key, temperature=temperature, top_p=top_p)
 
@@ -15,3 +57,169 @@ def build_llm(provider: str, model: str, api_key: str, temperature=0.5, top_p=1.
 
     else:
         raise ValueError(f"Unsupported provider: {provider}")
+
+def _retire(llm):
+    """Close an evicted client once no call is using it any more, so its connections are not leaked."""
+    if _in_use.get(id(llm)):
+        _retired[id(llm)] = llm
+        return
+    _retired.pop(id(llm), None)
+    try:
+        task = asyncio.get_running_loop().create_task(_close_llm(llm))
+    except RuntimeError:
+        # no event loop, so no async client can be open either
+        return
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+def _release(llm):
+    _in_use[id(llm)] -= 1
+    if not _in_use[id(llm)]:
+        del _in_use[id(llm)]
+        if id(llm) in _retired:
+            _retire(llm)
+
+def _evict_idle_clients(now: float):
+    for key in [key for key, (_, last_used) in _llm_pool.items() if now - last_used > LLM_POOL_IDLE_TIMEOUT]:
+        _retire(_llm_pool.pop(key)[0])
+
+def build_llm(provider: str, model: str, api_key: str, temperature=0.5, top_p=1.0):
+    """Return a pooled client for this configuration so connection pools and TLS sessions are reused."""
+    key = (provider, model, api_key, temperature, top_p)
+    now = time.monotonic()
+    _evict_idle_clients(now)
+
+    entry = _llm_pool.pop(key, None)
+    llm = entry[0] if entry else _create_llm(provider, model, api_key, temperature, top_p)
+    _llm_pool[key] = (llm, now)
+
+    while len(_llm_pool) > LLM_POOL_SIZE:
+        _retire(_llm_pool.popitem(last=False)[1][0])
+    return llm
+
+def without_api_key(model_config: Optional[dict]) -> Optional[dict]:
+    return {k: v for k, v in model_config.items() if k != "api_key"} if model_config else model_config
+
+@contextmanager
+def api_keys_from(*model_configs: Optional[dict]):
+    """Let invoke_llm find the api keys of these configs for copies that were stripped of theirs."""
+    keys = dict(_api_keys.get())
+    for model_config in model_configs:
+        if model_config and model_config.get("api_key"):
+            keys.setdefault((model_config["provider"], model_config["model_name"]), model_config["api_key"])
+            keys.setdefault(model_config["provider"], model_config["api_key"])
+    token = _api_keys.set(keys)
+    try:
+        yield
+    finally:
+        _api_keys.reset(token)
+
+def resolve_api_key(model_config: dict) -> Optional[str]:
+    if model_config.get("api_key"):
+        return model_config["api_key"]
+    keys = _api_keys.get()
+    return keys.get((model_config["provider"], model_config["model_name"])) or keys.get(model_config["provider"])
+
+async def _close_client(client):
+    for method in ("aclose", "close"):
+        close = getattr(client, method, None)
+        if callable(close):
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+            return
+
+async def _close_llm(llm):
+    for attr in ("root_async_client", "root_client", "async_client", "_async_client", "_client", "client"):
+        client = getattr(llm, attr, None)
+        if client is None:
+            continue
+        try:
+            await _close_client(client)
+        except Exception as e:
+            cp.log_warn(f"Failed to close {type(llm).__name__}.{attr}: {e}")
+
+async def close_llm_pool():
+    """Close the HTTP clients held by every pooled or evicted LLM. Called on server shutdown."""
+    clients = [llm for llm, _ in _llm_pool.values()] + list(_retired.values())
+    _llm_pool.clear()
+    _retired.clear()
+    for llm in clients:
+        await _close_llm(llm)
+    if _closing:
+        await asyncio.gather(*_closing, return_exceptions=True)
+    cp.log_info(f"Closed {len(clients)} pooled LLM clients")
+
+def response_text(response) -> str:
+    """Plain text of a chat message or completion string."""
+    content = getattr(response, "content", response)
+    if isinstance(content, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return str(content)
+
+async def stream_json_llm(llm, prompt: str) -> tuple[str, bool]:
+    """Stream a completion through the incremental JSON checker.
+
+    Returns (text, ok). A completion with no JSON in its first characters is cancelled straight away, and one
+    whose top-level value is closed is cut there, so trailing prose is never generated. A syntax error inside
+    the JSON is not cancelled: the rest of the answer is still received, since repairing a document that was
+    cut short at the error would silently drop everything after it. A stream that ends before its JSON is
+    closed (e.g. at max tokens) is not ok either; text then holds everything received.
+    """
+    checker = IncrementalJsonChecker()
+    text = ""
+    async with aclosing(llm.astream(prompt)) as stream:
+        async for chunk in stream:
+            chunk_text = response_text(chunk)
+            text += chunk_text
+            if checker.failed:
+                continue
+            if not checker.feed(chunk_text):
+                if not checker.started:
+                    cp.log_warn(f"Aborted streamed completion after {len(text)} chars: {checker.error}")
+                    return text, False
+                cp.log_warn(f"Streamed JSON is invalid ({checker.error}), receiving the rest for repair")
+            elif checker.complete:
+                return checker.text, True
+    return text, False
+
+async def invoke_llm(model_config: dict, prompt: str, use_cache: bool = True, expect_json: bool = False) -> str:
+    """Send a prompt through the response cache, the provider's concurrency cap and the configured client.
+
+    With use_cache=False the cache is not read (e.g. a retry after an invalid answer) but is refreshed.
+    With expect_json the completion is streamed, and cancelled early when it is not JSON at all. Broken JSON is
+    returned uncached rather than regenerated, so the caller's local repair and repair prompt, which are far
+    cheaper than a new answer, get to see it first.
+    """
+    key = cache_key(model_config["provider"], model_config["model_name"], model_config["temperature"], model_config["top_p"], prompt)
+    if LLM_CACHE_ENABLED and use_cache:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            cp.log_info(f"LLM cache hit for {model_config['model_name']}")
+            return cached
+
+    llm = build_llm(model_config["provider"], model_config["model_name"], resolve_api_key(model_config), model_config["temperature"], model_config["top_p"])
+    # an evicted client is closed only after this call is done with it
+    _in_use[id(llm)] = _in_use.get(id(llm), 0) + 1
+    try:
+        if expect_json and LLM_STREAMING:
+            async with provider_slot(model_config["provider"]):
+                text, ok = await stream_json_llm(llm, prompt)
+            if not ok:
+                cp.log_warn(f"Streamed JSON from {model_config['model_name']} is broken, handing {len(text)} chars to repair")
+                return text
+        else:
+            async with provider_slot(model_config["provider"]):
+                response = await llm.ainvoke(prompt)
+            text = response_text(response)
+    finally:
+        _release(llm)
+
+    if LLM_CACHE_ENABLED:
+        llm_cache.put(key, text)
+    return text
+
+def invalidate_llm_response(model_config: dict, prompt: str):
+    """Drop a cached answer that turned out to be unusable so the next call regenerates it."""
+    if LLM_CACHE_ENABLED:
+        llm_cache.invalidate(cache_key(model_config["provider"], model_config["model_name"], model_config["temperature"], model_config["top_p"], prompt))
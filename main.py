@@ -1,20 +1,30 @@
 import json
+import asyncio
+from contextlib import aclosing
 
 import httpx
 import streamlit as st
 from dotenv import load_dotenv
-from typing import Optional, Union
+from typing import AsyncIterator, Optional, Union
 from uuid import uuid4
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
 import utils.color_print as cp
 from agent import run_engineer_pipeline  
 from conversion_pipeline import conversionWorkflow, ConversionWorkflowState
-from summarizer_pipeline import summarizerWorkflow
+from summarizer_pipeline import summarizerWorkflow, search_run_specs
+from repo_source import fetch_github_repo_code, find_repo_document, close_http_client
+from analysis_runner import open_analysis
+from jobs import job_manager, close_checkpointer
+from utils.llm_cache import llm_cache
+from utils.content_index import content_index
+from llm_provider import close_llm_pool
+from model_router import cascade_router
+from database import get_pool, close_pool, check_db_health, DB_HEALTH_TIMEOUT
 
 load_dotenv()
 app = FastAPI()
@@ -27,6 +37,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup():
+    job_manager.mark_interrupted()
+    try:
+        # warm up min_size connections so the first pipeline step does not pay the handshake
+        await asyncio.wait_for(get_pool(), DB_HEALTH_TIMEOUT)
+    except Exception as e:
+        cp.log_error(f"Database pool unavailable at startup, will retry on first use: {e}")
+
+@app.on_event("shutdown")
+async def shutdown():
+    await close_http_client()
+    await close_llm_pool()
+    await close_checkpointer()
+    await close_pool()
+
 class JsonRPCRequest(BaseModel):
     jsonrpc: str
     method: str
@@ -38,25 +64,22 @@ class ChatRequest(BaseModel):
     file_path: str
     message: str  # future prompt variations
 
-async def fetch_github_repo_code(github_config: dict):
-    cp.log_info('fetch_github_repo_code() called')
-    headers = {
-        "Authorization": f"token {github_config['token']}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    async with httpx.AsyncClient(timeout=None, verify=False) as client:
-        url = f"https://api.github.com/repos/{github_config['username']}/{github_config['repo']}/git/trees/main?recursive=1"
-        response = await client.get(url, headers=headers)
-        tree = response.json().get("tree", [])
-        # cp.log_info("Received response from GitHub API for repo code", tree)
-        documents = []
-        for file in tree:
-            if file["type"] == "blob" and file["path"].endswith((".py", ".js", ".jsx", ".html", ".java")):
-                # cp.log_info(f"Fetching file: {file['path']}")
-                raw_url = f"https://raw.githubusercontent.com/{github_config['username']}/{github_config['repo']}/main/{file['path']}"
-                file_resp = await client.get(raw_url, headers=headers)
-                documents.append({"name": file["path"], "content": file_resp.text})
-        return documents
+@app.get("/db/health")
+async def get_db_health():
+    health = await check_db_health()
+    return JSONResponse(status_code=200 if health["ok"] else 503, content={"result": health})
+
+@app.get("/llm-cache/stats")
+async def get_llm_cache_stats():
+    return {"result": llm_cache.stats()}
+
+@app.get("/content-index/stats")
+async def get_content_index_stats():
+    return {"result": content_index.stats()}
+
+@app.get("/llm-cascade/stats")
+async def get_llm_cascade_stats():
+    return {"result": cascade_router.stats()}
 
 @app.post("/top-languages")
 async def get_repo_top_languages(request: Request):
@@ -79,14 +102,18 @@ async def handle_rpc(request: Request):
     body = await request.json()
     try:
         rpc = JsonRPCRequest(**body) 
+        github_config = rpc.params.get("github_config")
+        if rpc.method in ("get_context", "list_files", "run") and not github_config:
+            return {"jsonrpc": "2.0", "id": rpc.id, "error": {"code": -32602, "message": "Missing github_config"}}
+
         if rpc.method == "get_context":
             cp.log_info('/get_context called')
-            documents = await fetch_github_repo_code()
+            documents = await fetch_github_repo_code(github_config)
             return {"jsonrpc": "2.0", "id": rpc.id, "result": {"documents": documents}}
 
         elif rpc.method == "list_files":
             cp.log_info('/list_files called')
-            documents = await fetch_github_repo_code()
+            documents = await fetch_github_repo_code(github_config)
             file_list = [doc["name"] for doc in documents]
             return {"jsonrpc": "2.0", "id": rpc.id, "result": {"files": file_list}}
 
@@ -95,7 +122,7 @@ async def handle_rpc(request: Request):
             filename = rpc.params.get("filename")
             target_lang = rpc.params.get("target_language", "Python")
 
-            documents = await fetch_github_repo_code()
+            documents = await fetch_github_repo_code(github_config)
             match = next((doc for doc in documents if doc["name"] == filename), None)
             if not match:
                 return {"jsonrpc": "2.0", "id": rpc.id, "error": {"code": 404, "message": "File not found"}}
@@ -123,13 +150,17 @@ async def analyze_file(request: Request):
     data = await request.json()
     filename = data.get("filename")
     github_config = data.get("github_config")
+    local_path = data.get("local_path")
     model1_config = data.get("model1_config")
 
-    if not github_config:
-        return JSONResponse(status_code=400, content={"error": "Missing GitHub config"})
+    if not github_config and not local_path:
+        return JSONResponse(status_code=400, content={"error": "Missing GitHub config or local path"})
+
+    try:
+        match = await find_repo_document(filename, github_config, local_path)
+    except (FileNotFoundError, PermissionError) as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
 
-    docs = await fetch_github_repo_code(github_config)
-    match = next((doc for doc in docs if doc["name"] == filename), None)
     if not match:
         cp.log_error(f"File {filename} not found in repository.")
         return JSONResponse(status_code=404, content={"error": "File not found"})
@@ -139,7 +170,8 @@ async def analyze_file(request: Request):
         run_id = str(uuid4()),
         code=match["content"],
         file_path=filename,
-        model1_config=model1_config
+        model1_config=model1_config,
+        task=data.get("task") or "code_to_json"
     )
     
     result = await conversionWorkflow.ainvoke(state)
@@ -153,49 +185,139 @@ async def analyze_file(request: Request):
         cp.log_error(f"❌ Failed to parse LLM output: {e}")
         return {"error": str(e)}
 
-    return {"result": raw_output}
+    return {"result": raw_output, "compaction": result.get("compaction")}
+
+async def start_analysis(data: dict, on_event=None) -> Union[JSONResponse, tuple[str, AsyncIterator[dict]]]:
+    """Validate an /analyze-all style request and return (run_id, result stream), or the error response."""
+    run_id = str(uuid4())
+    try:
+        results = await open_analysis(data, run_id, on_event=on_event)
+    except (ValueError, FileNotFoundError, PermissionError) as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except LookupError as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+    return run_id, results
 
 @app.post("/analyze-all")
 async def analyze_all_files(request: Request):
     data = await request.json()
-    github_config = data.get("github_config")
     model1_config = data.get("model1_config")
     model2_config = data.get("model2_config")
 
-    if not github_config:
-        return JSONResponse(status_code=400, content={"error": "Missing GitHub config"})
+    started = await start_analysis(data)
+    if isinstance(started, JSONResponse):
+        return started
+    run_id, results = started
 
-    docs = await fetch_github_repo_code(github_config)
-    results = []
+    if data.get("stream"):
+        async def stream_results():
+            async with aclosing(results):
+                async for result in results:
+                    yield json.dumps({"type": "result", **result}) + "\n"
+            summary = await summarize_run(run_id, model1_config, model2_config)
+            yield json.dumps({"type": "summary", "run_id": run_id, "summary": summary}) + "\n"
 
-    run_id = str(uuid4())
-    for doc in docs:
-        filename = doc["name"]
-        content = doc["content"]
-
-        cp.log_info(f"⚙️ Running engineer pipeline for: {filename}")
-        conversion_state = ConversionWorkflowState(
-            project_id="echo",
-            run_id=run_id,
-            code=content,
-            file_path=filename,
-            model1_config=model1_config,
-            model2_config=model2_config
-        )
+        return StreamingResponse(stream_results(), media_type="application/x-ndjson")
 
-        try:
-            result = await conversionWorkflow.ainvoke(conversion_state)
-            raw_output = result.get("json_spec", "")
-            parsed = json.loads(raw_output)
-            cp.log_debug(f"Parsed output keys for {filename}: {list(parsed.keys())}")
-
-            results.append({"filename": filename, "result": parsed.get("output", parsed) })
-        except Exception as e:
-            cp.log_error(f"❌ Error analyzing {filename}: {e}")
-            results.append({"filename": filename, "error": str(e)})
+    results = [result async for result in results]
 
     # return {"results": results}
 
+    summary = await summarize_run(run_id, model1_config, model2_config)
+    return {"run_id": run_id, "results": results, "summary": summary}
+
+def sse_event(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+@app.post("/analyze-all/events")
+async def analyze_all_events(request: Request):
+    """Server-sent events for a repository analysis: per-file progress, each result as it finishes, then the summary."""
+    data = await request.json()
+    model1_config = data.get("model1_config")
+    model2_config = data.get("model2_config")
+
+    events: asyncio.Queue = asyncio.Queue()
+    started = await start_analysis(data, on_event=events.put_nowait)
+    if isinstance(started, JSONResponse):
+        return started
+    run_id, results = started
+
+    async def run():
+        try:
+            async with aclosing(results):
+                async for result in results:
+                    events.put_nowait({"type": "result", **result})
+            summary = await summarize_run(run_id, model1_config, model2_config)
+            events.put_nowait({"type": "summary", "run_id": run_id, "summary": summary})
+        except Exception as e:
+            cp.log_error(f"❌ Error during streamed analysis {run_id}: {e}")
+            events.put_nowait({"type": "error", "run_id": run_id, "error": str(e)})
+        finally:
+            events.put_nowait(None)
+
+    async def stream_events():
+        # the analysis runs in its own task so progress events flow while results are still pending
+        task = asyncio.create_task(run())
+        try:
+            yield sse_event("start", {"type": "start", "run_id": run_id})
+            while (event := await events.get()) is not None:
+                yield sse_event(event["type"], event)
+            yield sse_event("done", {"type": "done", "run_id": run_id})
+        finally:
+            task.cancel()
+
+    return StreamingResponse(stream_events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/jobs")
+async def submit_job(request: Request):
+    """Start /analyze-all as a background job. Completed files are checkpointed, so a resumed job skips them."""
+    data = await request.json()
+    if not data.get("github_config") and not data.get("local_path"):
+        return JSONResponse(status_code=400, content={"error": "Missing GitHub config or local path"})
+    job = job_manager.submit(data)
+    return {"job_id": job["job_id"], "run_id": job["run_id"], "status": job["status"]}
+
+@app.get("/jobs")
+async def list_jobs():
+    return {"result": [{k: v for k, v in job.items() if k != "summary"} for job in job_manager.list_jobs()]}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job {job_id}"})
+    return {"result": job}
+
+@app.get("/jobs/{job_id}/results")
+async def get_job_results(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job {job_id}"})
+    return {"run_id": job["run_id"], "status": job["status"], "results": job_manager.results(job_id), "summary": job.get("summary")}
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    try:
+        job_manager.cancel(job_id)
+    except LookupError as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+    except ValueError as e:
+        return JSONResponse(status_code=409, content={"error": str(e)})
+    return {"job_id": job_id, "status": "cancelling"}
+
+@app.post("/jobs/{job_id}/resume")
+async def resume_job(job_id: str, request: Request):
+    """Restart an interrupted, failed or cancelled job. Credentials are not persisted and must be sent again."""
+    credentials = await request.json() if await request.body() else {}
+    try:
+        job = job_manager.resume(job_id, credentials)
+    except LookupError as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+    except ValueError as e:
+        return JSONResponse(status_code=409, content={"error": str(e)})
+    return {"job_id": job_id, "run_id": job["run_id"], "status": job["status"]}
+
+async def summarize_run(run_id: str, model1_config: dict, model2_config: dict = None):
     cp.log_info("Running summarizer for all validated user stories...")
 
     summary_state = ConversionWorkflowState(
@@ -206,9 +328,7 @@ async def analyze_all_files(request: Request):
         model2_config=model2_config
     )
     summarizer_result = await summarizerWorkflow.ainvoke(summary_state)
-    summary = summarizer_result.get("json_spec")
-
-    return {"results": results, "summary": summary}
+    return summarizer_result.get("json_spec")
 
 @app.post("/summarize")
 async def summarize(request: Request):
@@ -223,11 +343,16 @@ async def summarize(request: Request):
         project_id="delta",
         run_id=run_id,
         code="",
-        model1_config=model1_config or {}
+        model1_config=model1_config or {},
+        summary_topics=data.get("topics") or None
     )
 
     result = await summarizerWorkflow.ainvoke(summary_state)
-    return {"summary": result.json_spec}
+    return {"summary": result.get("json_spec"), "summary_dropped": result.get("summary_dropped") or []}
+
+@app.get("/runs/{run_id}/specs/search")
+async def search_specs(run_id: str, q: str, k: int = 10):
+    return {"run_id": run_id, "result": await search_run_specs(run_id, q, max(1, k))}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+import os
+import re
+
+from collections import Counter, defaultdict
+from typing import Optional
+
+from dotenv import load_dotenv
+
+import utils.color_print as cp
+from utils.token_budget import estimate_tokens
+
+load_dotenv()
+
+# engineer calls try this model first and escalate to model1_config when its answer does not validate
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "false").lower() == "true"
+CASCADE_PROVIDER = os.getenv("CASCADE_PROVIDER", "ollama")
+CASCADE_MODEL = os.getenv("CASCADE_MODEL", "llama3.2")
+CASCADE_API_KEY = os.getenv("CASCADE_API_KEY", "")
+
+# files above either threshold go straight to model1_config
+CASCADE_MAX_TOKENS = int(os.getenv("CASCADE_MAX_TOKENS", "2000"))
+CASCADE_MAX_COMPLEXITY = int(os.getenv("CASCADE_MAX_COMPLEXITY", "40"))
+
+BRANCH_PATTERN = re.compile(r"\b(?:if|elif|for|foreach|while|case|catch|except|and|or)\b|&&|\|\|")
+
+def complexity(code: str) -> int:
+    """Rough cyclomatic complexity: one plus the number of branch points."""
+    return 1 + len(BRANCH_PATTERN.findall(code or ""))
+
+def cheap_model_config(model1_config: dict) -> Optional[dict]:
+    """The first model of the cascade, or None when the cascade is off or would just repeat model1_config."""
+    if not CASCADE_ENABLED or (CASCADE_PROVIDER, CASCADE_MODEL) == (model1_config.get("provider"), model1_config.get("model_name")):
+        return None
+    return {
+        "provider": CASCADE_PROVIDER,
+        "model_name": CASCADE_MODEL,
+        "api_key": CASCADE_API_KEY,
+        "temperature": model1_config.get("temperature", 0.2),
+        "top_p": model1_config.get("top_p", 1.0),
+    }
+
+def model_label(model_config: dict) -> str:
+    return f"{model_config['provider']}/{model_config['model_name']}"
+
+class CascadeRouter:
+    """Picks the model tier for each file and counts how often the cheap tier had to escalate."""
+
+    def __init__(self):
+        self._outcomes: defaultdict[str, Counter] = defaultdict(Counter)
+
+    def route(self, code: str, model1_config: dict) -> str:
+        cheap = cheap_model_config(model1_config)
+        if cheap is None:
+            return "primary"
+        tokens, score = estimate_tokens(code), complexity(code)
+        if tokens > CASCADE_MAX_TOKENS or score > CASCADE_MAX_COMPLEXITY:
+            cp.log_info(f"⏫ Skipping {model_label(cheap)} ({tokens} tokens, complexity {score})")
+            self.record(cheap, "bypassed")
+            return "primary"
+        return "cheap"
+
+    def model_config(self, tier: Optional[str], model1_config: dict) -> dict:
+        cheap = cheap_model_config(model1_config) if tier == "cheap" else None
+        return cheap or model1_config
+
+    def record(self, model_config: dict, outcome: str):
+        """outcome is accepted, escalated (cheap tier failed validation), rejected (primary tier failed) or bypassed."""
+        self._outcomes[model_label(model_config)][outcome] += 1
+
+    def stats(self) -> dict:
+        models = {}
+        for label, counts in self._outcomes.items():
+            tried = counts["accepted"] + counts["escalated"]
+            models[label] = {
+                **{outcome: counts[outcome] for outcome in ("accepted", "escalated", "rejected", "bypassed")},
+                "escalation_rate": round(counts["escalated"] / tried, 4) if tried else 0.0,
+            }
+        return {
+            "enabled": CASCADE_ENABLED,
+            "cheap_model": f"{CASCADE_PROVIDER}/{CASCADE_MODEL}",
+            "max_tokens": CASCADE_MAX_TOKENS,
+            "max_complexity": CASCADE_MAX_COMPLEXITY,
+            "models": models,
+        }
+
+cascade_router = CascadeRouter()
@@ -1,155 +1,153 @@
 import json
 import yaml
-import textwrap
+import hashlib
 from pathlib import Path
 from typing import Optional, Union
 
 import utils.color_print as cp
 
+class CompiledPrompt:
+    """A parsed prompt template with its static prefix (system, instructions, rules and format) rendered once."""
+
+    def __init__(self, template: dict, mtime_ns: int):
+        self.template = template
+        self.mtime_ns = mtime_ns
+        self.id = template.get("id", "unknown")
+
+        role = template.get("role", {})
+        self.role_name = role.get("name", "unknown")
+        self.role_id = role.get("id", "")
+
+        rules = "\n- ".join(template.get("rules", []))
+        # identical for every file, so it leads the prompt and providers with prefix caching can reuse it
+        self.prefix = "\n\n".join([
+            template.get("system", "").strip(),
+            f"<instructions>\n{template.get('instructions', '').strip()}\n</instructions>",
+            f"<rules>\n- {rules}\n</rules>",
+            f"<format>\n{str(template.get('format', '')).strip()}\n</format>",
+        ])
+        # changes whenever the template text does, even if its id is kept
+        self.version = hashlib.sha1(self.prefix.encode("utf-8")).hexdigest()[:12]
+
+    def render(self, payload: str) -> str:
+        return f"{self.prefix}\n\n{payload}" if payload else self.prefix
+
+def _json_text(value: Union[str, dict, list]) -> str:
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return value
+    return json.dumps(value, indent=2, ensure_ascii=False)
+
 class PromptLibrary:
     def __init__(self, base_path: str = "./prompts"):
         self.base_path = Path(base_path)
+        self._compiled: dict[tuple[str, str], CompiledPrompt] = {}
 
-    def get_prompt_template(self, role: str, prompt_type: str = None) -> dict:
-        """Load and optionally select a specific prompt template for a given role."""
-        cp.log_debug(f"Loading prompt template for role: {role}, type: {prompt_type}")
+    def compile(self, role: str, prompt_type: str = None) -> CompiledPrompt:
+        """Compiled template for a role, re-read only when its YAML file changes on disk."""
+        yaml_path = self.base_path / role / f"{prompt_type}.yaml"
+        try:
+            mtime_ns = yaml_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Prompt file for role '{role}' and type '{prompt_type}' not found in {self.base_path / role}")
 
-        folder = self.base_path / role
-        yaml_path = folder / f"{prompt_type}.yaml"
+        compiled = self._compiled.get((role, prompt_type))
+        if compiled is not None and compiled.mtime_ns == mtime_ns:
+            return compiled
 
-        if yaml_path.exists():
-            cp.log_debug(f"Reading YAML prompt: {yaml_path}")
-            with open(yaml_path, 'r', encoding='utf-8') as f:
-                templates = yaml.safe_load(f)
-        else:
-            raise FileNotFoundError(f"Prompt file for role '{role}' and type '{prompt_type}' not found in {folder}")
+        cp.log_debug(f"Compiling YAML prompt: {yaml_path}")
+        with open(yaml_path, 'r', encoding='utf-8') as f:
+            templates = yaml.safe_load(f)
 
-        if isinstance(templates, dict):
-            return templates
-        elif isinstance(templates, list):
+        if isinstance(templates, list):
             # This is rare in YAML unless you're batching multiple prompt templates
-            for tpl in templates:
-                if tpl.get("type") == prompt_type:
-                    return tpl
-            raise ValueError(f"No prompt with type '{prompt_type}' found in list")
-        else:
+            templates = next((tpl for tpl in templates if tpl.get("type") == prompt_type), None)
+            if templates is None:
+                raise ValueError(f"No prompt with type '{prompt_type}' found in list")
+        elif not isinstance(templates, dict):
             raise ValueError(f"Invalid YAML structure in {yaml_path}")
 
-    def build_prompt(
-            self, 
-            role: str, 
-            prompt_type: str, 
-            code: Optional[str] = "", 
-            json_output: Optional[Union[str, dict]] = None, 
+        compiled = CompiledPrompt(templates, mtime_ns)
+        self._compiled[(role, prompt_type)] = compiled
+        return compiled
+
+    def get_prompt_template(self, role: str, prompt_type: str = None) -> dict:
+        """Load and optionally select a specific prompt template for a given role."""
+        return self.compile(role, prompt_type).template
+
+    def build_payload(
+            self,
+            code: Optional[str] = "",
+            json_output: Optional[Union[str, dict]] = None,
             feedback: Optional[str] = "",
-            json_list: Optional[Union[str, dict]] = None,
-        ) -> tuple[str, str]:
-        cp.log_info(f"Building prompt for role: {role}")
-
-        prompt = self.get_prompt_template(role, prompt_type)
-        prompt_id = prompt.get("id", "unknown")
-
-        system = prompt.get("system", "")
-        instructions = prompt.get("instructions", "")
-        rules = prompt.get("rules", [])
-        example_format = prompt.get("format", {}) 
-
-        code_section = ""
-        if code:
-            code_section = f"""
-            <code>
-            {code}
-            </code>
-            """
-
-        json_section = ""
-        if json_output:
-            try:
-                if isinstance(json_output, dict):
-                    json_str = json.dumps(json_output, indent=2, ensure_ascii=False)
-                elif isinstance(json_output, str):
-                    # json_str = json_output.encode("utf-8", errors="replace").decode("utf-8")
-                    try:
-                        parsed = json.loads(json_output)
-                        json_str = json.dumps(parsed, indent=2, ensure_ascii=False)
-                    except json.JSONDecodeError:
-                        json_str = json_output
-                else:
-                    raise ValueError("json_output must be a dict or str")
+            json_list: Optional[Union[str, list]] = None,
+            files: Optional[list[dict]] = None,
+            signatures: Optional[dict] = None,
+            dependencies: Optional[dict] = None,
+        ) -> str:
+        """The per-call part of a prompt: code, JSON and feedback sections."""
+        sections = []
+
+        if files:
+            file_sections = "\n".join(f'<code path="{doc["name"]}">\n{doc["content"]}\n</code>' for doc in files)
+            sections.append(f"<files>\n{file_sections}\n</files>")
+        elif code:
+            sections.append(f"<code>\n{code}\n</code>")
+
+        if signatures:
+            sections.append(f"<signatures>\n{json.dumps(signatures, indent=2, ensure_ascii=False)}\n</signatures>")
+
+        if dependencies:
+            sections.append(
+                "<dependencies>\n"
+                "Compact specs of the files this code imports, already documented. Use them as context only, do not document them again.\n"
+                f"{json.dumps(dependencies, indent=2, ensure_ascii=False)}\n"
+                "</dependencies>"
+            )
 
-                json_section = f"""
-                <json>
-                {json_str}
-                </json>
-                """
-            except Exception as e:
-                cp.log_error(f"⚠️ Error building json_section: {e}")
-                json_section = "<json>[UNABLE TO SERIALIZE OUTPUT]</json>"
-        
         if json_list:
             try:
-                if isinstance(json_list, list):
-                    json_str = json.dumps(json_list, indent=2, ensure_ascii=False)
-                elif isinstance(json_list, str):
-                    try:
-                        parsed = json.loads(json_list)
-                        json_str = json.dumps(parsed, indent=2, ensure_ascii=False)
-                    except json.JSONDecodeError:
-                        json_str = json_list
-                else:
+                if not isinstance(json_list, (list, str)):
                     raise ValueError("json_list must be a list or JSON string")
-
-                json_section = f"""
-                <json_list>
-                {json_str}
-                </json_list>
-                """
+                sections.append(f"<json_list>\n{_json_text(json_list)}\n</json_list>")
             except Exception as e:
                 cp.log_error(f"⚠️ Error building json_list section: {e}")
-                json_section = "<json_list>[UNABLE TO SERIALIZE LIST]</json_list>"
+                sections.append("<json_list>[UNABLE TO SERIALIZE LIST]</json_list>")
+        elif json_output:
+            try:
+                if not isinstance(json_output, (dict, str)):
+                    raise ValueError("json_output must be a dict or str")
+                sections.append(f"<json>\n{_json_text(json_output)}\n</json>")
+            except Exception as e:
+                cp.log_error(f"⚠️ Error building json_section: {e}")
+                sections.append("<json>[UNABLE TO SERIALIZE OUTPUT]</json>")
 
-        feedback_section = ""
         if feedback:
-            feedback_section = f"""
-            <feedback>
-            {feedback}
-            </feedback>
-            """
-
-        formatted_prompt = f"""
-            {system}
-
-            <instructions>
-            {instructions}
-            </instructions>
-
-            <rules>
-            - {'\n- '.join(rules)}
-            </rules>
+            sections.append(f"<feedback>\n{feedback}\n</feedback>")
 
-            {code_section}
+        return "\n\n".join(sections)
 
-            {json_section}
-
-            {feedback_section}
-
-            <format>
-            {example_format}
-            </format>
-        """.strip()
-
-        cp.log_debug(f"📜 Prompt for role '{role}':\n{formatted_prompt}")
-        return formatted_prompt, prompt_id
+    def build_prompt(
+            self,
+            role: str,
+            prompt_type: str,
+            code: Optional[str] = "",
+            json_output: Optional[Union[str, dict]] = None,
+            feedback: Optional[str] = "",
+            json_list: Optional[Union[str, dict]] = None,
+            files: Optional[list[dict]] = None,
+            signatures: Optional[dict] = None,
+            dependencies: Optional[dict] = None,
+        ) -> tuple[str, str]:
+        compiled = self.compile(role, prompt_type)
+        payload = self.build_payload(code, json_output, feedback, json_list, files, signatures, dependencies)
+        return compiled.render(payload), compiled.id
 
     def get_role_details(self, role: str, prompt_type: str) -> tuple[str, str]:
-        prompt = self.get_prompt_template(role, prompt_type)
-
-        role_obj = prompt.get("role", {})
-        role_name = role_obj.get("name", "unknown")
-        role_id = role_obj.get("id", "")
- 
-        cp.log_info(f"Retrieved role '{role_name}' with ID '{role_id}' for prompt type '{prompt_type}'")
-        return role_name, role_id
+        compiled = self.compile(role, prompt_type)
+        return compiled.role_name, compiled.role_id
 
     def available_roles(self) -> list:
         """List all available roles in the prompt library."""
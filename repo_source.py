@@ -0,0 +1,379 @@
+import os
+import mmap
+import asyncio
+import hashlib
+import subprocess
+
+from collections import OrderedDict, deque
+from contextlib import aclosing
+
+import httpx
+from dotenv import load_dotenv
+from typing import AsyncIterator, Optional
+
+import utils.color_print as cp
+from utils.repo_cache import blob_cache, tree_cache
+from utils.tar_stream import iter_tar_gz_members
+
+load_dotenv()
+
+SOURCE_EXTENSIONS = (".py", ".js", ".jsx", ".html", ".java")
+
+# base urls are overridable so ingestion can be pointed at a local stub server
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+GITHUB_RAW_URL = os.getenv("GITHUB_RAW_URL", "https://raw.githubusercontent.com").rstrip("/")
+
+FETCH_CONCURRENCY = int(os.getenv("GITHUB_FETCH_CONCURRENCY", "16"))
+FETCH_TIMEOUT = float(os.getenv("GITHUB_FETCH_TIMEOUT", "30"))
+FETCH_RETRIES = int(os.getenv("GITHUB_FETCH_RETRIES", "3"))
+FETCH_HTTP2 = os.getenv("GITHUB_FETCH_HTTP2", "true").lower() == "true"
+# "blobs" fetches each file from raw.githubusercontent, "tarball" streams a single archive of the ref
+INGESTION_MODE = os.getenv("GITHUB_INGESTION_MODE", "blobs")
+# local_path requests are refused unless this is set, and must point inside it
+LOCAL_REPO_ROOT = os.getenv("LOCAL_REPO_ROOT")
+LOCAL_FILE_CACHE_MAX_BYTES = int(os.getenv("LOCAL_FILE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_client: Optional[httpx.AsyncClient] = None
+# absolute path -> (mtime_ns, size, document) for files read from local checkouts, least recently used first
+_local_file_cache: OrderedDict[str, tuple[int, int, dict]] = OrderedDict()
+_local_file_cache_bytes = 0
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared, long-lived client used for all repository ingestion."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=FETCH_HTTP2,
+            verify=False,
+            timeout=httpx.Timeout(FETCH_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=FETCH_CONCURRENCY,
+                max_keepalive_connections=FETCH_CONCURRENCY,
+                keepalive_expiry=60,
+            ),
+        )
+    return _client
+
+async def close_http_client():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+def github_headers(github_config: dict) -> dict:
+    return {
+        "Authorization": f"token {github_config['token']}",
+        "Accept": "application/vnd.github.v3+json"
+    }
+
+def repo_ref(github_config: dict) -> str:
+    return github_config.get("ref") or "main"
+
+def is_source_file(path: str) -> bool:
+    return path.endswith(SOURCE_EXTENSIONS)
+
+def git_blob_sha(data: bytes) -> str:
+    """Compute the same SHA git (and the GitHub tree API) assigns to a blob."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+async def get_with_retries(url: str, headers: dict = None, retries: int = FETCH_RETRIES, timeout: float = FETCH_TIMEOUT) -> httpx.Response:
+    client = get_http_client()
+    for attempt in range(retries + 1):
+        try:
+            response = await client.get(url, headers=headers, timeout=timeout)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == retries:
+                response.raise_for_status()
+                return response
+            cp.log_warn(f"GET {url} returned {response.status_code}, retry {attempt + 1}/{retries}")
+        except httpx.HTTPStatusError:
+            raise
+        except httpx.RequestError as e:
+            if attempt == retries:
+                raise
+            cp.log_warn(f"GET {url} failed ({e!r}), retry {attempt + 1}/{retries}")
+        await asyncio.sleep(min(0.5 * 2 ** attempt, 8))
+
+async def fetch_github_tree(github_config: dict) -> dict:
+    url = f"{GITHUB_API_URL}/repos/{github_config['username']}/{github_config['repo']}/git/trees/{repo_ref(github_config)}?recursive=1"
+    response = await get_with_retries(url, headers=github_headers(github_config))
+    return response.json()
+
+async def fetch_github_blob(github_config: dict, path: str) -> str:
+    raw_url = f"{GITHUB_RAW_URL}/{github_config['username']}/{github_config['repo']}/{repo_ref(github_config)}/{path}"
+    response = await get_with_retries(raw_url, headers=github_headers(github_config))
+    return response.text
+
+async def iter_github_tarball(github_config: dict) -> AsyncIterator[dict]:
+    """Stream the ref's tarball and yield each matching source file as soon as it is extracted."""
+    cp.log_info('iter_github_tarball() called')
+    url = f"{GITHUB_API_URL}/repos/{github_config['username']}/{github_config['repo']}/tarball/{repo_ref(github_config)}"
+
+    # archive members are prefixed with a single "<owner>-<repo>-<sha>/" directory
+    def want(name: str) -> bool:
+        return "/" in name and is_source_file(name)
+
+    client = get_http_client()
+    async with client.stream("GET", url, headers=github_headers(github_config), follow_redirects=True) as response:
+        response.raise_for_status()
+        async for name, data in iter_tar_gz_members(response.aiter_raw(), want=want):
+            sha = git_blob_sha(data)
+            content = data.decode("utf-8", errors="replace")
+            blob_cache.put(sha, content)
+            yield {"name": name.split("/", 1)[1], "content": content, "sha": sha}
+
+async def iter_github_repo_code(github_config: dict, concurrency: Optional[int] = None, mode: Optional[str] = None) -> AsyncIterator[dict]:
+    """Yield source documents in tree order while at most `concurrency` downloads are in flight."""
+    cp.log_info('iter_github_repo_code() called')
+    mode = mode or github_config.get("ingestion_mode") or INGESTION_MODE
+    if mode == "tarball":
+        async for doc in iter_github_tarball(github_config):
+            yield doc
+        return
+    elif mode != "blobs":
+        raise ValueError(f"Unsupported ingestion mode: {mode}")
+
+    tree_listing = await fetch_github_tree(github_config)
+    tree_key = (github_config["username"], github_config["repo"], tree_listing.get("sha"))
+
+    # an unchanged commit resolves to the same root tree sha, so the tree call is all we pay
+    if tree_listing.get("sha"):
+        cached = tree_cache.get(tree_key)
+        if cached is not None:
+            cp.log_info(f"Tree {tree_listing['sha']} served from snapshot cache ({len(cached)} files)")
+            for doc in cached:
+                yield doc
+            return
+
+    tree = tree_listing.get("tree", [])
+    files = [file for file in tree if file["type"] == "blob" and is_source_file(file["path"])]
+    cache_hits = 0
+
+    async def fetch_one(file: dict) -> Optional[dict]:
+        nonlocal cache_hits
+        content = blob_cache.get(file.get("sha"))
+        if content is not None:
+            cache_hits += 1
+            return {"name": file["path"], "content": content, "sha": file.get("sha")}
+
+        try:
+            content = await fetch_github_blob(github_config, file["path"])
+        except httpx.HTTPError as e:
+            cp.log_error(f"❌ Failed to fetch {file['path']}: {e}")
+            return None
+        blob_cache.put(file.get("sha"), content)
+        return {"name": file["path"], "content": content, "sha": file.get("sha")}
+
+    # the snapshot is only collected while it still fits in the tree cache
+    snapshot, snapshot_bytes = [], 0
+    fetched = 0
+
+    def collect(doc: dict):
+        nonlocal snapshot, snapshot_bytes, fetched
+        fetched += 1
+        if snapshot is not None:
+            snapshot.append(doc)
+            snapshot_bytes += len(doc["content"])
+            if snapshot_bytes > tree_cache.max_bytes:
+                snapshot = None
+
+    window = deque()
+    try:
+        for file in files:
+            window.append(asyncio.create_task(fetch_one(file)))
+            if len(window) < (concurrency or FETCH_CONCURRENCY):
+                continue
+            doc = await window.popleft()
+            if doc:
+                collect(doc)
+                yield doc
+        while window:
+            doc = await window.popleft()
+            if doc:
+                collect(doc)
+                yield doc
+    finally:
+        for task in window:
+            task.cancel()
+
+    cp.log_info(f"Fetched {fetched}/{len(files)} files from {github_config['username']}/{github_config['repo']} ({cache_hits} from blob cache)")
+
+    # only complete snapshots are worth caching
+    if snapshot is not None and tree_listing.get("sha") and not tree_listing.get("truncated") and fetched == len(files):
+        tree_cache.put(tree_key, snapshot)
+
+async def fetch_github_repo_code(github_config: dict, concurrency: Optional[int] = None, mode: Optional[str] = None):
+    cp.log_info('fetch_github_repo_code() called')
+    return [doc async for doc in iter_github_repo_code(github_config, concurrency, mode)]
+
+def _run_git(args: list, cwd: str, input: bytes = None) -> bytes:
+    return subprocess.run(["git", *args], cwd=cwd, input=input, capture_output=True, check=True).stdout
+
+def _is_bare_repo(path: str) -> bool:
+    return not os.path.exists(os.path.join(path, ".git")) and os.path.isfile(os.path.join(path, "HEAD")) and os.path.isdir(os.path.join(path, "objects"))
+
+def _list_working_tree(path: str) -> list[str]:
+    if os.path.exists(os.path.join(path, ".git")):
+        try:
+            output = _run_git(["ls-files", "-z", "--cached", "--others", "--exclude-standard"], cwd=path)
+            return [name for name in output.decode("utf-8").split("\0") if name]
+        except (OSError, subprocess.CalledProcessError) as e:
+            cp.log_warn(f"git ls-files failed in {path} ({e}), falling back to directory walk")
+
+    names = []
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d != ".git")
+        for filename in sorted(files):
+            names.append(os.path.relpath(os.path.join(root, filename), path).replace(os.sep, "/"))
+    return names
+
+def _read_mmap(file_path: str, size: int) -> tuple[str, str]:
+    with open(file_path, "rb") as f:
+        if size == 0:
+            return "", git_blob_sha(b"")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            sha = hashlib.sha1(b"blob %d\0" % len(mm))
+            sha.update(mm)
+            return str(mm, "utf-8", "replace"), sha.hexdigest()
+
+def _read_working_tree_file(path: str, name: str) -> tuple[Optional[dict], bool]:
+    file_path = os.path.join(path, name)
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None, False
+
+    cached = _local_file_cache.get(file_path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        _local_file_cache.move_to_end(file_path)
+        return cached[2], True
+
+    content, sha = _read_mmap(file_path, stat.st_size)
+    doc = {"name": name, "content": content, "sha": sha}
+    _cache_local_file(file_path, (stat.st_mtime_ns, stat.st_size, doc))
+    return doc, False
+
+def _cache_local_file(file_path: str, entry: tuple[int, int, dict]):
+    global _local_file_cache_bytes
+    previous = _local_file_cache.pop(file_path, None)
+    if previous:
+        _local_file_cache_bytes -= previous[1]
+    if entry[1] > LOCAL_FILE_CACHE_MAX_BYTES:
+        return
+    _local_file_cache[file_path] = entry
+    _local_file_cache_bytes += entry[1]
+    while _local_file_cache_bytes > LOCAL_FILE_CACHE_MAX_BYTES:
+        _, evicted = _local_file_cache.popitem(last=False)
+        _local_file_cache_bytes -= evicted[1]
+
+async def _iter_working_tree(path: str) -> AsyncIterator[dict]:
+    names = [name for name in await asyncio.to_thread(_list_working_tree, path) if is_source_file(name)]
+    count = reused = 0
+    for name in names:
+        doc, unchanged = await asyncio.to_thread(_read_working_tree_file, path, name)
+        if doc:
+            count += 1
+            reused += unchanged
+            yield doc
+    cp.log_info(f"Read {count} files from {path} ({reused} unchanged since last read)")
+
+def _ls_tree(path: str, ref: str) -> list[tuple[str, str]]:
+    entries = []
+    for line in _run_git(["ls-tree", "-r", "-z", ref], cwd=path).split(b"\0"):
+        if not line:
+            continue
+        meta, name = line.split(b"\t", 1)
+        _, obj_type, sha = meta.split(b" ")
+        name = name.decode("utf-8")
+        if obj_type == b"blob" and is_source_file(name):
+            entries.append((name, sha.decode("ascii")))
+    return entries
+
+def _read_bare_repo(path: str, ref: str) -> list[dict]:
+    entries = _ls_tree(path, ref)
+
+    documents = []
+    missing = []
+    for name, sha in entries:
+        content = blob_cache.get(sha)
+        if content is None:
+            missing.append((name, sha))
+        else:
+            documents.append({"name": name, "content": content, "sha": sha})
+
+    # one cat-file process streams every uncached blob
+    if missing:
+        output = _run_git(["cat-file", "--batch"], cwd=path, input="".join(f"{sha}\n" for _, sha in missing).encode("ascii"))
+        pos = 0
+        for name, sha in missing:
+            header_end = output.index(b"\n", pos)
+            size = int(output[pos:header_end].split(b" ")[2])
+            data = output[header_end + 1:header_end + 1 + size]
+            pos = header_end + 1 + size + 1
+            content = data.decode("utf-8", errors="replace")
+            blob_cache.put(sha, content)
+            documents.append({"name": name, "content": content, "sha": sha})
+
+    order = {name: i for i, (name, _) in enumerate(entries)}
+    documents.sort(key=lambda doc: order[doc["name"]])
+    cp.log_info(f"Read {len(documents)} files from bare repo {path}@{ref} ({len(entries) - len(missing)} from blob cache)")
+    return documents
+
+def resolve_local_path(local_path: str) -> str:
+    # local_path comes from the request body, so reading the server's disk must be opted into
+    if not LOCAL_REPO_ROOT:
+        raise PermissionError("Local repositories are disabled, set LOCAL_REPO_ROOT to allow them")
+    path = os.path.realpath(os.path.expanduser(local_path))
+    root = os.path.realpath(LOCAL_REPO_ROOT)
+    if os.path.commonpath([root, path]) != root:
+        raise PermissionError(f"Local path {local_path} is outside LOCAL_REPO_ROOT")
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"Local repository {local_path} not found")
+    return path
+
+async def iter_local_repo_code(local_path: str, ref: str = "HEAD") -> AsyncIterator[dict]:
+    cp.log_info('iter_local_repo_code() called')
+    path = resolve_local_path(local_path)
+    if _is_bare_repo(path):
+        for doc in await asyncio.to_thread(_read_bare_repo, path, ref):
+            yield doc
+    else:
+        async for doc in _iter_working_tree(path):
+            yield doc
+
+async def fetch_local_repo_code(local_path: str, ref: str = "HEAD"):
+    cp.log_info('fetch_local_repo_code() called')
+    return [doc async for doc in iter_local_repo_code(local_path, ref)]
+
+def iter_repo_documents(github_config: Optional[dict] = None, local_path: Optional[str] = None) -> AsyncIterator[dict]:
+    """Stream source documents from a local checkout when given, otherwise from GitHub."""
+    if local_path:
+        return iter_local_repo_code(local_path, (github_config or {}).get("ref") or "HEAD")
+    return iter_github_repo_code(github_config)
+
+async def fetch_repo_code(github_config: Optional[dict] = None, local_path: Optional[str] = None):
+    return [doc async for doc in iter_repo_documents(github_config, local_path)]
+
+async def find_repo_document(filename: str, github_config: Optional[dict] = None, local_path: Optional[str] = None) -> Optional[dict]:
+    """Stop ingestion as soon as the requested file has been read."""
+    async with aclosing(iter_repo_documents(github_config, local_path)) as documents:
+        async for doc in documents:
+            if doc["name"] == filename:
+                return doc
+    return None
+
+async def list_repo_file_shas(ref: str, github_config: Optional[dict] = None, local_path: Optional[str] = None) -> Optional[dict]:
+    """Map each source file path at `ref` to its blob sha without downloading any content.
+
+    Returns None when a local path cannot list `ref`, e.g. because it is not a git repository.
+    """
+    if local_path:
+        path = resolve_local_path(local_path)
+        try:
+            return dict(await asyncio.to_thread(_ls_tree, path, ref))
+        except (OSError, subprocess.CalledProcessError) as e:
+            cp.log_warn(f"git ls-tree {ref} failed in {path} ({e}), running a full analysis")
+            return None
+    tree = (await fetch_github_tree({**github_config, "ref": ref})).get("tree", [])
+    return {file["path"]: file["sha"] for file in tree if file["type"] == "blob" and is_source_file(file["path"])}
@@ -1,4 +1,4 @@
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel
 class ParameterSchema(BaseModel):
@@ -19,6 +19,17 @@ class VariableSchema(BaseModel):
     access_level: str
     description: str
 
+class FunctionDescriptionSchema(BaseModel):
+    description: str = ""
+    business_logic: str = ""
+
+class VariableDescriptionSchema(BaseModel):
+    description: str = ""
+
+class SignatureDescriptionSchema(BaseModel):
+    functions: Dict[str, FunctionDescriptionSchema] = {}
+    variables: Dict[str, VariableDescriptionSchema] = {}
+
 class EngineerOutputSchema(BaseModel):
     output: Optional[Any] = None
 
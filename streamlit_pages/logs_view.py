@@ -1,10 +1,9 @@
 import json
 
 import streamlit as st
-import asyncio
 from zoneinfo import ZoneInfo
 
-from database import fetch_data
+from database import fetch_data, run_sync, DB_SYNC_TIMEOUT
 
 local_tz = ZoneInfo("Asia/Kuala_Lumpur")
 
@@ -26,7 +25,7 @@ def render_tab2(is_repo_analysis):
     # Step 1: Fetch distinct project_ids
     project_id_query = "SELECT DISTINCT project_id FROM temp_agent_step ORDER BY project_id"
     try:
-        project_id_rows = asyncio.run(fetch_data(project_id_query))
+        project_id_rows = run_sync(fetch_data(project_id_query), timeout=DB_SYNC_TIMEOUT)
         all_project_ids = [row['project_id'] for row in project_id_rows]
     except Exception as e:
         st.error(f"❌ Failed to load project IDs: {e}")
@@ -50,7 +49,7 @@ def render_tab2(is_repo_analysis):
     # Manual query
     if st.button("Run Custom Query"):
         try:
-            rows = asyncio.run(fetch_data(query))
+            rows = run_sync(fetch_data(query), timeout=DB_SYNC_TIMEOUT)
         except Exception as e:
             st.error(f"❌ Failed to load records: {e}")
             st.stop()
@@ -86,7 +85,7 @@ def render_tab2(is_repo_analysis):
 
     # Run asyncpg query
     try:
-        rows = asyncio.run(fetch_data(query))
+        rows = run_sync(fetch_data(query), timeout=DB_SYNC_TIMEOUT)
     except Exception as e:
         st.error(f"❌ Failed to load records: {e}")
         st.stop()
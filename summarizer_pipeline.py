@@ -11,11 +11,13 @@ from langchain_ollama import OllamaLLM
 from pydantic import BaseModel, TypeAdapter
 
 import utils.color_print as cp
-from llm_provider import build_llm
+from llm_provider import invoke_llm
 from conversion_pipeline import ConversionWorkflowState
 from prompts.prompt_library import PromptLibrary
 from database import log_agent_step, fetch_data
 from utils.llm_output_parser import parse_llm_response
+from utils.token_budget import estimate_tokens
+from utils.vector_index import spec_index_for_rows
 
 prompt_lib = PromptLibrary()
 DB_URL = os.getenv("SUPABASE_DB_URL")
@@ -25,48 +27,88 @@ DB_URL = os.getenv("SUPABASE_DB_URL")
 # custom port
 # llm = OllamaLLM(model="llama3.2", base_url="http://localhost:11434")
 
-async def summarizer_task(state: ConversionWorkflowState) -> ConversionWorkflowState:
-    cp.log_info("🧠 summarizer_task() called")
-
-    async def load_validated_jsons(run_id: str) -> list[dict]:
-        query = f"""
-            SELECT validated_json
-            FROM temp_agent_step
-            WHERE run_id = '{run_id}'
-              AND status = 'generated'
-              AND validated_json IS NOT NULL
-            ORDER BY file_path
-        """
-        return await fetch_data(query)
-
-    json_rows = await(load_validated_jsons(state.run_id))
-    json_list = [row["validated_json"] for row in json_rows if row.get("validated_json")]
-
-    if not json_list:
-        cp.log_warn("⚠️ No validated JSON specs found.")
-        return state
-
-    prompt_type = "json_to_user_story"
+def _per_level(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+# a comma separated list sets one value per level (map first, then each reduce), the last one repeats
+SUMMARY_FAN_OUT = _per_level(os.getenv("SUMMARY_FAN_OUT", "4"))
+SUMMARY_TOKEN_BUDGET = _per_level(os.getenv("SUMMARY_TOKEN_BUDGET", "12000"))
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "4"))
+# specs retrieved per summary topic
+SUMMARY_TOP_K = int(os.getenv("SUMMARY_TOP_K", "20"))
+
+def level_setting(values: list[int], level: int) -> int:
+    return values[min(level, len(values) - 1)]
+
+def _tokens(item) -> int:
+    return estimate_tokens(item if isinstance(item, str) else json.dumps(item))
+
+def group_by_module(rows: list[dict]) -> dict[str, list]:
+    """validated_json of each file, grouped by the directory it lives in."""
+    groups = {}
+    for row in rows:
+        if row.get("validated_json"):
+            groups.setdefault(os.path.dirname(row.get("file_path") or ""), []).append(row["validated_json"])
+    return groups
+
+def group_by_topic(index, topics: list[str], k: int = SUMMARY_TOP_K) -> dict[str, list]:
+    """Top-k retrieved specs per topic; topics nothing matched are left out."""
+    groups = {}
+    for topic in topics:
+        hits = index.search(topic, k)
+        if hits:
+            groups[topic] = [{"file_path": hit["file_path"], hit["kind"]: hit["spec"]} for hit in hits]
+    return groups
+
+async def load_validated_rows(run_id: str) -> list[dict]:
+    return await fetch_data("""
+        SELECT file_path, validated_json
+        FROM temp_agent_step
+        WHERE run_id = $1
+          AND status IN ('generated', 'reused')
+          AND validated_json IS NOT NULL
+        ORDER BY file_path
+    """, run_id)
+
+async def search_run_specs(run_id: str, query: str, k: int = 10) -> list[dict]:
+    """Specs of a run most relevant to the query, from its local vector index."""
+    index = spec_index_for_rows(run_id, await load_validated_rows(run_id))
+    return index.search(query, k)
+
+def split_by_budget(items: list, budget: int, max_items: Optional[int] = None, min_items: int = 1) -> list[list]:
+    """Consecutive batches under the token budget (and max_items). An item over budget gets a batch of its own,
+    except that every batch takes at least min_items so a reduce level always shrinks."""
+    batches, batch, tokens = [], [], 0
+    for item in items:
+        size = _tokens(item)
+        full = tokens + size > budget or (max_items and len(batch) >= max_items)
+        if batch and full and len(batch) >= min_items:
+            batches.append(batch)
+            batch, tokens = [], 0
+        batch.append(item)
+        tokens += size
+    if batch:
+        if len(batch) < min_items and batches:
+            batches[-1].extend(batch)
+        else:
+            batches.append(batch)
+    return batches
+
+async def summarize_batch(state: ConversionWorkflowState, prompt_type: str, json_list: list, level: int, file_path: Optional[str], status: str) -> dict:
     prompt, prompt_id = prompt_lib.build_prompt("architect", prompt_type, json_list=json_list)
     role, role_id = prompt_lib.get_role_details("architect", prompt_type)
 
-    model2_config = state.model1_config
-
-    # override temperature and top_p for reviewer
-    model2_config["temperature"] = 0.3
-    model2_config["top_p"] = 1.0
+    # the architect summarizes with model1_config's model under its own sampling settings
+    model2_config = {**state.model1_config, "temperature": 0.3, "top_p": 1.0}
 
-    llm = build_llm(model2_config["provider"], model2_config["model_name"], model2_config["api_key"], model2_config["temperature"], model2_config["top_p"])
-    response = await llm.ainvoke(prompt)
+    response = await invoke_llm(model2_config, prompt, expect_json=True)
     response_parsed = parse_llm_response(response)
 
-    cp.log_debug("📄 Summary User Stories:", response_parsed)
-
     await log_agent_step({
         "project_id": state.project_id,
         "run_id": state.run_id,
         "cycle_id": str(state.cycle_id),
-        "step_number": state.step_number,
+        "step_number": level,
         "agent_id": role_id,
         "agent_role": role,
         "llm_model_id": "1",
@@ -76,21 +118,93 @@ async def summarizer_task(state: ConversionWorkflowState) -> ConversionWorkflowS
         "prompt_id": prompt_id,
         "prompt_type": prompt_type,
         "raw_input": prompt,
-        "raw_output": (
-                response_parsed.json_spec if isinstance(response_parsed.json_spec, str)
-                else json.dumps(response_parsed.json_spec)
-            ),
-        "validated_json": json.dumps(response_parsed.model_dump()),
+        "raw_output": response if isinstance(response, str) else json.dumps(response_parsed),
+        "validated_json": json.dumps(response_parsed),
         "confidence": None,
-        "file_path": None,
-        "status": "summarized",
+        "file_path": file_path,
+        "status": status,
     })
 
+    return {"summary": response_parsed, "role": role, "role_id": role_id, "prompt": prompt, "prompt_id": prompt_id, "prompt_type": prompt_type, "model_config": model2_config}
+
+async def summarizer_task(state: ConversionWorkflowState) -> ConversionWorkflowState:
+    """Map-reduce over the run: every module (or, with summary_topics, the specs retrieved for every topic) is
+    summarized in parallel, then partial summaries are merged `fan_out` at a time per level until a single
+    user story document remains."""
+    cp.log_info("🧠 summarizer_task() called")
+
+    json_rows = await load_validated_rows(state.run_id)
+    if state.summary_topics and json_rows:
+        index = spec_index_for_rows(state.run_id, json_rows)
+        groups = group_by_topic(index, state.summary_topics)
+        cp.log_info(f"🔎 Retrieved specs for {len(groups)}/{len(state.summary_topics)} topics from {len(index.items)} indexed")
+    else:
+        groups = {}
+    if not groups:
+        groups = group_by_module(json_rows)
+
+    if not groups:
+        cp.log_warn("⚠️ No validated JSON specs found.")
+        return state
+
+    slots = asyncio.Semaphore(SUMMARY_WORKERS)
+    async def run(prompt_type: str, json_list: list, level: int, file_path: Optional[str], status: str) -> dict:
+        async with slots:
+            return await summarize_batch(state, prompt_type, json_list, level, file_path, status)
+
+    # map: one summary per module, split further when a module does not fit the budget
+    budget = level_setting(SUMMARY_TOKEN_BUDGET, 0)
+    batches = [(module, batch) for module, items in groups.items() for batch in split_by_budget(items, budget)]
+    single = len(batches) == 1
+    cp.log_info(f"🗂️ Summarizing {len(groups)} groups in {len(batches)} batches")
+    labels = [module or "(root)" for module, _ in batches]
+    results = await asyncio.gather(*(
+        run("json_to_user_story", batch, 0, module or None, "summarized" if single else "summarized_partial")
+        for module, batch in batches
+    ))
+
+    # reduce: merge partial summaries level by level
+    level = 1
+    dropped = []
+    while len(results) > 1:
+        failed = [label for label, r in zip(labels, results) if "error" in r["summary"]]
+        for label, r in zip(labels, results):
+            if "error" in r["summary"]:
+                cp.log_warn(f"⚠️ Dropping failed partial summary of {label}: {r['summary']['error']}")
+        if len(failed) == len(results):
+            cp.log_error(f"❌ Every partial summary failed at level {level - 1}")
+            results = results[:1]
+            break
+        dropped.extend(failed)
+        labels, results = zip(*[(label, r) for label, r in zip(labels, results) if "error" not in r["summary"]])
+        if len(results) == 1:
+            break
+
+        partials = [r["summary"] for r in results]
+        batches = split_by_budget(list(zip(labels, partials)), level_setting(SUMMARY_TOKEN_BUDGET, level), max(2, level_setting(SUMMARY_FAN_OUT, level)), min_items=2)
+        last = len(batches) == 1
+        cp.log_info(f"🔀 Reducing {len(partials)} partial summaries in {len(batches)} batches (level {level})")
+        labels = [f"level {level} merge {i + 1}/{len(batches)}" for i in range(len(batches))]
+        results = await asyncio.gather(*(
+            run("merge_user_stories", [partial for _, partial in batch], level, None, "summarized" if last else "summarized_partial")
+            for batch in batches
+        ))
+        level += 1
+    if dropped:
+        cp.log_warn(f"⚠️ Summary is missing {len(dropped)} failed partial summaries: {', '.join(dropped)}")
+
+    final = results[0]
+    response_parsed = final["summary"]
+    model2_config = final["model_config"]
+
+    cp.log_debug("📄 Summary User Stories:", response_parsed)
+
     return state.model_copy(update={
-        "agent": {"id": role_id, "role": role},
+        "agent": {"id": final["role_id"], "role": final["role"]},
         "model": {"id": "1", "name": model2_config["model_name"], "temperature": model2_config["temperature"], "top_p": model2_config["top_p"]},
-        "prompt": {"id": prompt_id, "type": prompt_type, "input": prompt},
-        "json_spec": response_parsed
+        "prompt": {"id": final["prompt_id"], "type": final["prompt_type"], "input": final["prompt"]},
+        "json_spec": response_parsed,
+        "summary_dropped": dropped
     })
 
 builder = StateGraph(ConversionWorkflowState)
@@ -98,4 +212,8 @@ builder.add_node("summarizer", summarizer_task)
 builder.set_entry_point("summarizer")
 builder.add_edge("summarizer", END)
 
-summarizerWorkflow = builder.compile()
+def build_summarizer_workflow(checkpointer=None):
+    """Compile the graph, optionally with a LangGraph checkpointer so a finished summary is not generated twice."""
+    return builder.compile(checkpointer=checkpointer)
+
+summarizerWorkflow = build_summarizer_workflow()
@@ -0,0 +1,152 @@
+import json
+import asyncio
+
+import pytest
+
+import analysis_runner as ar
+
+MODEL = {"provider": "ollama", "model_name": "test", "temperature": 0.2, "top_p": 1.0}
+
+class StubWorkflow:
+    """Stands in for conversionWorkflow: answers every file with its name, after a per-file delay."""
+    checkpointer = None
+
+    def __init__(self, delays: dict = None):
+        self.delays = delays or {}
+        self.calls = []
+        self.contexts = {}
+        self.active = 0
+        self.max_active = 0
+
+    async def ainvoke(self, state):
+        self.calls.append(state.file_path)
+        self.contexts[state.file_path] = state.dependency_context
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delays.get(state.file_path, 0))
+        finally:
+            self.active -= 1
+        return {"validated_output": {}, "json_spec": {"output": {"file": state.file_path}}, "model_tier": "primary", "engineer_variant": "engineer"}
+
+@pytest.fixture(autouse=True)
+def no_side_effects(monkeypatch):
+    saved = []
+    monkeypatch.setattr(ar, "save_run_manifest", lambda run_id, file_shas, source=None, generator=None: saved.append(file_shas))
+    monkeypatch.setattr(ar, "record_source", lambda *args, **kwargs: None)
+    monkeypatch.setattr(ar, "find_duplicate_step", lambda *args, **kwargs: None)
+    return saved
+
+def docs(count: int, consumed: list = None, fail_after: int = None):
+    async def iterate():
+        for i in range(count):
+            if fail_after is not None and i == fail_after:
+                raise OSError("connection reset")
+            if consumed is not None:
+                consumed.append(i)
+            yield {"name": f"f{i}.py", "content": f"x = {i}\n", "sha": f"sha{i}"}
+    return iterate()
+
+def collect(documents, **options) -> list:
+    async def run():
+        return [result async for result in ar.iter_analysis_results(documents, "run", MODEL, **options)]
+    return asyncio.run(run())
+
+def test_results_are_yielded_in_document_order(no_side_effects):
+    workflow = StubWorkflow({"f0.py": 0.05, "f1.py": 0.02})
+    results = collect(docs(6), workers=3, workflow=workflow)
+    assert [r["filename"] for r in results] == [f"f{i}.py" for i in range(6)]
+    assert [r["result"] for r in results] == [{"file": f"f{i}.py"} for i in range(6)]
+    assert workflow.max_active > 1
+    assert no_side_effects == [{f"f{i}.py": f"sha{i}" for i in range(6)}]
+
+def test_window_bounds_documents_read_ahead():
+    consumed = []
+
+    async def run():
+        ahead = []
+        async for result in ar.iter_analysis_results(docs(30, consumed), "run", MODEL, workers=2, queue_size=2, workflow=StubWorkflow()):
+            # a slow consumer: the producer may only run ahead by the window
+            await asyncio.sleep(0.01)
+            ahead.append(len(consumed) - int(result["filename"][1:-3]) - 1)
+        return ahead
+
+    ahead = asyncio.run(run())
+    # queue_size + workers items in the window, plus the document waiting for a free slot
+    assert 2 <= max(ahead) <= 2 + 2 + 1
+
+def test_packed_batch_falls_back_per_missing_file(monkeypatch):
+    batches = []
+
+    async def engineer_batch(documents, run_id, model1_config, project_id=""):
+        batches.append([doc["name"] for doc in documents])
+        # the batch answer misses f1.py
+        return {doc["name"]: {"output": {"batch": doc["name"]}} for doc in documents if doc["name"] != "f1.py"}
+
+    monkeypatch.setattr(ar, "engineer_batch", engineer_batch)
+    workflow = StubWorkflow()
+    results = collect(docs(3), workers=1, pack_small_files=True, workflow=workflow)
+    assert batches == [["f0.py", "f1.py", "f2.py"]]
+    assert workflow.calls == ["f1.py"]
+    assert [r["result"] for r in results] == [{"batch": "f0.py"}, {"file": "f1.py"}, {"batch": "f2.py"}]
+
+def test_dependencies_finish_first_and_are_given_as_context():
+    workflow = StubWorkflow({"f0.py": 0.05})
+    results = collect(docs(3), workers=3, workflow=workflow, dependencies={"f2.py": ["f0.py"]})
+    assert [r["filename"] for r in results] == ["f0.py", "f1.py", "f2.py"]
+    assert workflow.calls.index("f2.py") > workflow.calls.index("f0.py")
+    assert list(workflow.contexts["f2.py"]) == ["f0.py"]
+    assert workflow.contexts["f1.py"] is None
+
+def test_checkpointed_files_are_resumed():
+    workflow = StubWorkflow()
+    completed = {"f0.py": {"sha": "sha0", "result": {"from": "checkpoint"}}, "f1.py": {"sha": "stale", "result": {}}}
+    results = collect(docs(2), workers=1, workflow=workflow, completed=completed)
+    assert results[0] == {"filename": "f0.py", "result": {"from": "checkpoint"}, "resumed": True}
+    assert workflow.calls == ["f1.py"]
+
+def test_unchanged_files_reuse_the_base_run(monkeypatch):
+    async def reuse_step(row, project_id, run_id):
+        return {"filename": row["file_path"], "result": json.loads(row["validated_json"])["output"], "reused": True}
+
+    monkeypatch.setattr(ar, "reuse_step", reuse_step)
+    generator = ar.run_generator(MODEL)
+    base_manifest = {"run_id": "base", "files": {"f0.py": "sha0", "f1.py": "old"}, "generator": generator}
+    base_steps = {name: {"file_path": name, "validated_json": json.dumps({"output": {"base": name}})} for name in ("f0.py", "f1.py")}
+    workflow = StubWorkflow()
+    results = collect(docs(2), workers=1, workflow=workflow, base_manifest=base_manifest, base_steps=base_steps)
+    assert results[0] == {"filename": "f0.py", "result": {"base": "f0.py"}, "reused": True}
+    assert workflow.calls == ["f1.py"]
+
+    other_model = {**base_manifest, "generator": {**generator, "model": "ollama/other"}}
+    workflow = StubWorkflow()
+    collect(docs(2), workers=1, workflow=workflow, base_manifest=other_model, base_steps=base_steps)
+    assert workflow.calls == ["f0.py", "f1.py"]
+
+def test_duplicate_sources_reuse_the_stored_output(monkeypatch):
+    async def load_duplicate_step(duplicate):
+        return {"file_path": duplicate["file_path"], "validated_json": json.dumps({"output": {"copy_of": duplicate["file_path"]}})}
+
+    async def reuse_step(row, project_id, run_id):
+        return {"filename": row["file_path"], "result": json.loads(row["validated_json"])["output"], "reused": True}
+
+    monkeypatch.setattr(ar, "find_duplicate_step", lambda doc, *args: {"run_id": "old", "file_path": "orig.py", "key": "k"} if doc["name"] == "f1.py" else None)
+    monkeypatch.setattr(ar, "load_duplicate_step", load_duplicate_step)
+    monkeypatch.setattr(ar, "reuse_step", reuse_step)
+    workflow = StubWorkflow()
+    results = collect(docs(2), workers=1, workflow=workflow)
+    # the stored row is recorded under the new file's name
+    assert results[1] == {"filename": "f1.py", "result": {"copy_of": "orig.py"}, "reused": True}
+    assert workflow.calls == ["f0.py"]
+
+def test_ingestion_error_ends_the_stream_without_a_manifest(no_side_effects):
+    results = collect(docs(5, fail_after=2), workers=2, workflow=StubWorkflow())
+    assert [r["filename"] for r in results] == ["f0.py", "f1.py", None]
+    assert "connection reset" in results[-1]["error"]
+    assert no_side_effects == []
+
+def test_progress_events_per_file():
+    events = []
+    collect(docs(2), workers=1, workflow=StubWorkflow(), on_event=events.append)
+    for name in ("f0.py", "f1.py"):
+        assert [e["status"] for e in events if e["filename"] == name] == ["queued", "generating", "validated"]
@@ -0,0 +1,80 @@
+import ast
+
+from utils.code_chunker import line_depths, split_code
+
+def python_module(functions: int, body_lines: int = 8) -> str:
+    parts = ["import os\n\n"]
+    for i in range(functions):
+        body = "".join(f"    value_{j} = os.getenv('VAR_{i}_{j}')\n" for j in range(body_lines))
+        parts.append(f"# helper {i}\n@staticmethod\ndef function_{i}():\n{body}    return None\n\n")
+    return "".join(parts)
+
+def test_small_file_is_one_chunk():
+    code = python_module(2)
+    assert split_code(code, "a.py", max_chars=len(code)) == [code]
+
+def test_python_splits_on_function_boundaries():
+    code = python_module(12)
+    chunks = split_code(code, "a.py", max_chars=1200)
+    assert len(chunks) > 1
+    assert "".join(chunks) == code
+    for chunk in chunks:
+        assert len(chunk) <= 1200
+        ast.parse(chunk)
+
+def test_python_keeps_comments_and_decorators_with_their_function():
+    chunks = split_code(python_module(12), "a.py", max_chars=1200)
+    for chunk in chunks[1:]:
+        assert chunk.lstrip("\n").startswith("# helper ")
+        assert "\n@staticmethod\ndef function_" in chunk
+
+def test_python_trailing_body_comment_stays_with_its_function():
+    body = "".join(f"    x_{j} = {j}\n" for j in range(20))
+    code = f"def first():\n{body}    # end of first\n\n# about second\ndef second():\n{body}"
+    first, second = split_code(code, "a.py", max_chars=300)[:2]
+    assert "# end of first" in first
+    assert second.lstrip("\n").startswith("# about second\ndef second")
+
+def test_oversized_python_class_repeats_class_line():
+    methods = "".join(f"    def method_{i}(self):\n" + "".join(f"        x_{j} = {j}\n" for j in range(10)) + "        return x_0\n\n" for i in range(10))
+    code = f"class Service:\n    \"\"\"Does things.\"\"\"\n\n{methods}"
+    chunks = split_code(code, "service.py", max_chars=800)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.startswith("class Service:")
+        ast.parse(chunk)
+    assert sum(chunk.count("def method_") for chunk in chunks) == 10
+
+def test_python_syntax_error_falls_back_to_paragraphs():
+    code = "\n\n".join(f"def broken_{i}(:\n    pass" for i in range(50))
+    chunks = split_code(code, "broken.py", max_chars=300)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    assert "".join(chunks).replace("\n", "") == code.replace("\n", "")
+
+def test_line_depths_ignore_braces_in_strings_and_comments():
+    code = 'class A {\n  String s = "}{";\n  // }\n  /* { */\n  char c = \'{\';\n}\n'
+    assert line_depths(code) == [1, 1, 1, 1, 1, 0]
+
+def test_line_depths_without_trailing_newline():
+    assert line_depths("a {\nb }") == [1, 0]
+
+def test_java_class_split_along_methods_with_class_header():
+    methods = "".join(
+        f"    // method {i}\n    @Override\n    public int method{i}(int x) {{\n" + "".join(f"        x += {j};\n" for j in range(10)) + "        return x;\n    }\n\n"
+        for i in range(10)
+    )
+    code = f"package demo;\n\npublic class Service {{\n{methods}}}\n"
+    chunks = split_code(code, "Service.java", max_chars=900)
+    assert len(chunks) > 1
+    assert sum(chunk.count("public int method") for chunk in chunks) == 10
+    for chunk in chunks[1:]:
+        assert "public class Service {" in chunk
+        # a method is never separated from its annotation and comment
+        assert chunk.count("@Override") == chunk.count("public int method") == chunk.count("// method")
+
+def test_unknown_extension_splits_on_blank_lines():
+    code = "\n\n".join("paragraph line\n" * 5 for _ in range(20))
+    chunks = split_code(code, "notes.txt", max_chars=200)
+    assert len(chunks) > 1
+    assert "".join(chunks) == code
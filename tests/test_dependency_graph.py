@@ -0,0 +1,99 @@
+from utils.dependency_graph import (
+    build_dependency_graph,
+    compact_spec,
+    dependency_context,
+    dependency_levels,
+    extract_imports,
+)
+
+def graph_of(files: dict) -> dict:
+    return build_dependency_graph([{"name": name, "content": content} for name, content in files.items()])
+
+def test_python_absolute_relative_and_sibling_imports():
+    graph = graph_of({
+        "app/main.py": "import app.models\nfrom .services import billing\nimport helpers\n",
+        "app/models.py": "",
+        "app/services/__init__.py": "",
+        "app/services/billing.py": "from ..models import User\n",
+        "app/helpers.py": "",
+    })
+    # importing a module from a package also runs the package's __init__
+    assert graph["app/main.py"] == ["app/models.py", "app/services/billing.py", "app/services/__init__.py", "app/helpers.py"]
+    assert graph["app/services/billing.py"] == ["app/models.py"]
+
+def test_bare_stdlib_name_is_not_matched_to_nested_file():
+    graph = graph_of({"tools/run.py": "import os\n", "vendor/os.py": ""})
+    assert graph["tools/run.py"] == []
+
+def test_ambiguous_suffix_is_rejected():
+    graph = graph_of({
+        "main.py": "from core import utils\n",
+        "a/core/utils.py": "",
+        "b/core/utils.py": "",
+    })
+    assert graph["main.py"] == []
+
+def test_sources_nested_under_src_are_resolved():
+    graph = graph_of({"src/shop/cart.py": "from shop.pricing import total\n", "src/shop/pricing.py": ""})
+    assert graph["src/shop/cart.py"] == ["src/shop/pricing.py"]
+
+def test_js_relative_imports_with_extensions_and_index():
+    graph = graph_of({
+        "web/app.js": "import React from 'react';\nimport { api } from './api';\nconst ui = require('../ui');\nexport * from './types';\n",
+        "web/api.ts": "",
+        "ui/index.jsx": "",
+        "web/types.js": "",
+    })
+    assert graph["web/app.js"] == ["web/api.ts", "ui/index.jsx", "web/types.js"]
+
+def test_java_wildcard_and_static_imports():
+    graph = graph_of({
+        "src/com/shop/Cart.java": "import com.shop.model.*;\nimport static com.shop.util.Money.round;\nimport java.util.List;\n",
+        "src/com/shop/model/Item.java": "",
+        "src/com/shop/model/Order.java": "",
+        "src/com/shop/util/Money.java": "",
+    })
+    assert graph["src/com/shop/Cart.java"] == [
+        "src/com/shop/model/Item.java",
+        "src/com/shop/model/Order.java",
+        "src/com/shop/util/Money.java",
+    ]
+
+def test_unknown_language_and_syntax_errors_have_no_imports():
+    assert extract_imports("import x", "notes.txt") == []
+    assert extract_imports("def broken(:\n", "a.py") == []
+
+def test_dependency_levels_put_leaves_first():
+    graph = {"a.py": ["b.py", "c.py"], "b.py": ["c.py"], "c.py": [], "d.py": ["external.py"]}
+    assert dependency_levels(graph) == [["c.py", "d.py"], ["b.py"], ["a.py"]]
+
+def test_dependency_levels_break_cycles():
+    graph = {"a.py": ["b.py"], "b.py": ["a.py"], "c.py": ["a.py"]}
+    assert dependency_levels(graph) == [["a.py"], ["b.py", "c.py"]]
+
+def test_compact_spec_of_functions_and_variables():
+    output = {
+        "functions": [{"name": "total", "parameters": [{"name": "items"}, {"name": "tax"}], "return_type": "float", "description": "Sums  the\nitems."}],
+        "variables": [{"name": "RATE", "data_type": "float"}],
+    }
+    assert compact_spec(output) == {"functions": ["total(items, tax) -> float: Sums the items."], "variables": ["RATE: float"]}
+
+def test_compact_spec_of_user_stories():
+    stories = [{
+        "user_story_name": "Checkout",
+        "fields": [{"field_name": "amount"}],
+        "business_rules": [{"business_rule_name": "No negative totals"}],
+    }]
+    assert compact_spec(stories) == [{"user_story": "Checkout", "fields": ["amount"], "business_rules": ["No negative totals"]}]
+
+def test_compact_spec_falls_back_to_short_json():
+    spec = compact_spec({"something": "x" * 500})
+    assert isinstance(spec, str) and len(spec) <= 160 and spec.endswith("…")
+
+def test_dependency_context_skips_missing_and_respects_budget():
+    small = {"variables": [{"name": "A", "data_type": "int"}]}
+    large = {"variables": [{"name": f"V{i}", "data_type": "str"} for i in range(200)]}
+    specs = {"small.py": small, "large.py": large, "other.py": small}
+    context = dependency_context(["missing.py", "large.py", "small.py", "other.py"], specs, budget=50)
+    assert list(context) == ["small.py", "other.py"]
+    assert dependency_context(["missing.py"], specs) is None
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+from utils.json_repair import repair_json
+from utils.llm_output_parser import parse_llm_response
+
+def test_valid_json_is_returned_as_is():
+    assert repair_json('{"a": [1, 2]}') == {"a": [1, 2]}
+
+def test_code_fence_is_stripped():
+    assert repair_json('```json\n{"a": 1}\n```') == {"a": 1}
+
+def test_prose_around_json_is_ignored():
+    assert repair_json('Here you go:\n{"a": 1}\nLet me know if you need more.') == {"a": 1}
+
+def test_trailing_commas_are_removed():
+    assert repair_json('{"a": [1, 2,], "b": {"c": 3,},}') == {"a": [1, 2], "b": {"c": 3}}
+
+def test_commas_inside_strings_are_kept():
+    assert repair_json('{"a": "x,}", "b": [1,],}') == {"a": "x,}", "b": [1]}
+
+def test_raw_control_characters_in_strings():
+    assert repair_json('{"a": "line one\nline\ttwo"}') == {"a": "line one\nline\ttwo"}
+
+def test_truncated_output_is_closed():
+    assert repair_json('{"a": [1, 2, {"b": "unfinished') == {"a": [1, 2, {"b": "unfinished"}]}
+
+def test_truncated_after_comma_is_closed():
+    assert repair_json('{"a": [1, 2,') == {"a": [1, 2]}
+
+def test_dangling_key_is_dropped():
+    assert repair_json('{"a": 1, "b":') == {"a": 1}
+    assert repair_json('{"a": 1, "b"') == {"a": 1}
+    assert repair_json('{"b":') == {}
+
+def test_garbage_returns_none():
+    assert repair_json("no json here") is None
+    assert repair_json('{"a" 1}') is None
+    assert repair_json(None) is None
+
+def test_parse_llm_response_repairs_message_content():
+    message = SimpleNamespace(content='```json\n{"a": 1,}\n```')
+    assert parse_llm_response(message) == {"a": 1}
+
+def test_parse_llm_response_passes_dicts_through():
+    value = {"a": 1}
+    assert parse_llm_response(value) is value
+
+def test_parse_llm_response_reports_unrepairable_output():
+    result = parse_llm_response("not json")
+    assert result["error"].startswith("Invalid JSON from LLM")
+    assert result["raw"] == "not json"
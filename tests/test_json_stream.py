@@ -0,0 +1,72 @@
+import json
+
+from utils.json_stream import IncrementalJsonChecker, MAX_PREAMBLE_CHARS
+
+def check(text: str, chunk_size: int = 0) -> IncrementalJsonChecker:
+    checker = IncrementalJsonChecker()
+    step = chunk_size or len(text) or 1
+    for i in range(0, len(text), step):
+        checker.feed(text[i:i + step])
+    return checker
+
+def test_valid_object_completes():
+    text = '{"name": "svc", "items": [1, -2.5e3, true, false, null, {"k": "v"}], "empty": {}, "none": []}'
+    checker = check(text)
+    assert checker.complete and not checker.failed
+    assert json.loads(checker.text) == json.loads(text)
+
+def test_chunk_by_chunk_matches_whole_feed():
+    text = '{"a": [1, 2, {"b": "x\\"y"}], "c": false}'
+    for size in (1, 2, 5):
+        checker = check(text, size)
+        assert checker.complete and checker.text == text
+
+def test_text_after_completion_is_ignored():
+    checker = check('{"a": 1}\n```\nDone.')
+    assert checker.complete and checker.text == '{"a": 1}'
+
+def test_preamble_and_fence_are_skipped():
+    checker = check('Here is the JSON:\n```json\n{"a": 1}\n```')
+    assert checker.complete and checker.text == '{"a": 1}'
+
+def test_started_flips_at_first_bracket():
+    checker = IncrementalJsonChecker()
+    checker.feed("Sure, here it is: ")
+    assert not checker.started and not checker.failed
+    checker.feed("[")
+    assert checker.started
+
+def test_prose_only_fails_after_preamble_limit():
+    checker = check("x" * MAX_PREAMBLE_CHARS)
+    assert not checker.failed
+    checker.feed("x")
+    assert checker.failed and not checker.started
+    assert "No JSON object" in checker.error
+
+def test_trailing_commas_are_let_through():
+    assert check('{"a": [1, 2,], "b": 3,}').complete
+
+def test_raw_newline_in_string_is_let_through():
+    assert check('{"a": "line one\nline two"}').complete
+
+def test_missing_value_fails():
+    checker = check('{"a": }')
+    assert checker.failed and "Expected a value" in checker.error
+
+def test_double_comma_fails():
+    assert check("[1,,2]").failed
+
+def test_missing_colon_fails():
+    checker = check('{"a" 1}')
+    assert checker.failed and "Expected ':'" in checker.error
+
+def test_mismatched_bracket_fails():
+    assert check('{"a": [1}').failed
+
+def test_invalid_literal_fails():
+    checker = check('{"a": tru3}')
+    assert checker.failed and "Invalid literal" in checker.error
+
+def test_truncated_text_is_neither_failed_nor_complete():
+    checker = check('{"a": [1, 2')
+    assert not checker.failed and not checker.complete
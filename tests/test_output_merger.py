@@ -0,0 +1,43 @@
+from utils.output_merger import merge_engineer_outputs
+
+def story(story_id: str, name: str, field: str) -> dict:
+    return {
+        "filename": "app.py",
+        "output": {
+            "user_story_id": story_id,
+            "user_story_name": name,
+            "fields": [{"field_id": "fl_1", "field_name": field, "validation": [{"rule_id": "rl_1", "rule_description": "Required"}]}],
+            "business_rules": [],
+        },
+    }
+
+def test_single_output_is_unchanged():
+    output = story("uc_1", "Login", "User")
+    assert merge_engineer_outputs([output]) == output
+
+def test_each_chunk_keeps_its_story_with_prefixed_ids():
+    merged = merge_engineer_outputs([story("uc_1", "Login", "User"), story("uc_1", "Logout", "Session")])
+    assert merged["filename"] == "app.py"
+    assert [(s["user_story_id"], s["user_story_name"]) for s in merged["output"]] == [("p1_uc_1", "Login"), ("p2_uc_1", "Logout")]
+    assert merged["output"][1]["fields"][0]["field_id"] == "p2_fl_1"
+    assert merged["output"][1]["fields"][0]["validation"][0]["rule_id"] == "p2_rl_1"
+
+def test_stories_of_the_same_name_are_merged():
+    merged = merge_engineer_outputs([story("uc_1", "Login", "User"), story("uc_1", "Login", "Password")])
+    login = merged["output"]
+    assert login["user_story_id"] == "p1_uc_1"
+    assert [(f["field_id"], f["field_name"]) for f in login["fields"]] == [("p1_fl_1", "User"), ("p2_fl_1", "Password")]
+
+def test_story_lists_are_flattened():
+    first = {"output": [story("uc_1", "Login", "User")["output"], story("uc_2", "Signup", "Email")["output"]]}
+    merged = merge_engineer_outputs([first, story("uc_1", "Signup", "Name")])
+    assert [s["user_story_name"] for s in merged["output"]] == ["Login", "Signup"]
+    assert [f["field_name"] for f in merged["output"][1]["fields"]] == ["Email", "Name"]
+
+def test_function_outputs_are_concatenated_without_duplicates():
+    shared = {"name": "Cart.total()", "parameters": [], "return_type": "int", "description": "", "business_logic": "", "access_level": "public"}
+    first = {"output": {"functions": [shared], "variables": [{"name": "Cart.items", "data_type": "list", "access_level": "private", "description": ""}]}}
+    second = {"output": {"functions": [shared, {**shared, "name": "Cart.add()"}], "variables": []}}
+    merged = merge_engineer_outputs([first, second])
+    assert [f["name"] for f in merged["output"]["functions"]] == ["Cart.total()", "Cart.add()"]
+    assert [v["name"] for v in merged["output"]["variables"]] == ["Cart.items"]
@@ -0,0 +1,22 @@
+from utils.repo_cache import BlobCache, TreeCache
+
+def test_blob_round_trip_keeps_line_endings(tmp_path):
+    cache = BlobCache(tmp_path)
+    content = "line one\r\nline two\rline three\n"
+    cache.put("ab" * 20, content)
+    assert cache.get("ab" * 20) == content
+
+def test_blob_miss_and_missing_sha(tmp_path):
+    cache = BlobCache(tmp_path)
+    assert cache.get("cd" * 20) is None
+    assert cache.get(None) is None
+
+def test_tree_cache_evicts_least_recently_used():
+    cache = TreeCache(max_bytes=20)
+    cache.put("a", [{"name": "a", "content": "x" * 8}])
+    cache.put("b", [{"name": "b", "content": "x" * 8}])
+    cache.get("a")
+    cache.put("c", [{"name": "c", "content": "x" * 8}])
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.total_bytes == 18
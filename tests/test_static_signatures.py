@@ -0,0 +1,119 @@
+from utils.static_signatures import extract_signatures
+
+def names(signatures: dict, kind: str = "functions") -> list[str]:
+    return [entry["name"] for entry in signatures[kind]]
+
+def test_python_functions_methods_and_variables():
+    code = (
+        "LIMIT: int = 10\n"
+        "_cache = {}\n\n"
+        "async def fetch(url: str, *args, timeout=5, **kwargs) -> bytes:\n"
+        "    pass\n\n"
+        "class Client:\n"
+        "    retries = 3\n\n"
+        "    def __init__(self, base):\n"
+        "        self.base = base\n\n"
+        "    def __send(self, payload: dict) -> None:\n"
+        "        pass\n"
+    )
+    signatures = extract_signatures(code, "client.py")
+    assert names(signatures) == ["fetch()", "Client.__init__()", "Client.__send()"]
+    fetch = signatures["functions"][0]
+    assert [(p["name"], p["data_type"]) for p in fetch["parameters"]] == [("url", "str"), ("*args", "Any"), ("timeout", "Any"), ("**kwargs", "Any")]
+    assert fetch["return_type"] == "bytes"
+    assert signatures["functions"][2]["access_level"] == "private"
+    assert [(v["name"], v["data_type"], v["access_level"]) for v in signatures["variables"]] == [
+        ("LIMIT", "int", "public"),
+        ("_cache", "dict", "protected"),
+        ("Client.retries", "int", "public"),
+    ]
+
+def test_python_property_pair_gets_distinct_names():
+    code = (
+        "class C:\n"
+        "    @property\n"
+        "    def v(self) -> int:\n"
+        "        return self._v\n\n"
+        "    @v.setter\n"
+        "    def v(self, value):\n"
+        "        self._v = value\n"
+    )
+    assert names(extract_signatures(code, "c.py")) == ["C.v()", "C.v(value)"]
+
+def test_python_syntax_error_returns_none():
+    assert extract_signatures("def broken(:\n", "a.py") is None
+
+def test_unsupported_language_returns_none():
+    assert extract_signatures("fn main() {}", "main.rs") is None
+
+def test_java_methods_fields_and_overloads():
+    code = (
+        "package shop;\n\n"
+        "public class Cart {\n"
+        "    private final List<Item> items = new ArrayList<>();\n"
+        "    static int count;\n\n"
+        "    public Cart() {\n"
+        "        int local = 0;\n"
+        "    }\n\n"
+        "    // void commented(int a) {\n"
+        "    public void add(Item item) {\n"
+        "        if (item != null) {\n"
+        "            items.add(item);\n"
+        "        }\n"
+        "    }\n\n"
+        "    protected void add(Item item, int quantity) throws IOException {\n"
+        "        String text = \"void fake(int a) {\";\n"
+        "    }\n\n"
+        "    static class Line {\n"
+        "        private int quantity;\n\n"
+        "        int total() {\n"
+        "            return quantity;\n"
+        "        }\n"
+        "    }\n"
+        "}\n"
+    )
+    signatures = extract_signatures(code, "Cart.java")
+    assert names(signatures) == ["Cart.Cart()", "Cart.add(Item)", "Cart.add(Item, int)", "Cart.Line.total()"]
+    assert [f["access_level"] for f in signatures["functions"]] == ["public", "public", "protected", "package-private"]
+    assert [(v["name"], v["data_type"], v["access_level"]) for v in signatures["variables"]] == [
+        ("Cart.items", "List<Item>", "private"),
+        ("Cart.count", "int", "package-private"),
+        ("Cart.Line.quantity", "int", "private"),
+    ]
+
+def test_java_class_on_one_line():
+    code = "public class A { private int y; public void go(int a) { int z = a; } }"
+    signatures = extract_signatures(code, "A.java")
+    assert names(signatures) == ["A.go()"]
+    assert names(signatures, "variables") == ["A.y"]
+
+def test_js_functions_classes_and_variables():
+    code = (
+        "const API = 'https://example.com';\n"
+        "let retries = 3;\n"
+        "function load(url, options = {}) {\n"
+        "    const inner = 1;\n"
+        "}\n"
+        "const parse = async (text) => JSON.parse(text);\n"
+        "const double = x => x * 2;\n"
+        "class Store {\n"
+        "    constructor(items) {\n"
+        "        this.items = items;\n"
+        "    }\n"
+        "    static create() {\n"
+        "        if (true) {\n"
+        "        }\n"
+        "    }\n"
+        "    #reset() {\n"
+        "    }\n"
+        "}\n"
+    )
+    signatures = extract_signatures(code, "store.js")
+    assert names(signatures) == ["load()", "parse()", "double()", "Store.constructor()", "Store.create()", "Store.#reset()"]
+    assert [p["name"] for p in signatures["functions"][0]["parameters"]] == ["url", "options"]
+    assert signatures["functions"][-1]["access_level"] == "private"
+    assert [(v["name"], v["data_type"]) for v in signatures["variables"]] == [("API", "string"), ("retries", "number")]
+
+def test_js_redefined_function_is_disambiguated():
+    code = "function get(id) {}\nfunction get(id) {}\nclass A { get(key, fallback) { } }\n"
+    assert names(extract_signatures(code, "a.js")) == ["get(id)", "get(id)#2"]
@@ -0,0 +1,85 @@
+import io
+import gzip
+import asyncio
+import tarfile
+
+from utils.tar_stream import TarStreamParser, iter_tar_gz_members
+
+def make_tar(files: dict, format=tarfile.PAX_FORMAT, directories=()) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w", format=format) as tar:
+        for name in directories:
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.DIRTYPE
+            tar.addfile(info)
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+def feed_in_chunks(data: bytes, size: int, want=lambda name: True) -> list:
+    parser = TarStreamParser(want)
+    members = []
+    for i in range(0, len(data), size):
+        members.extend(parser.feed(data[i:i + size]))
+    assert parser.finished
+    return members
+
+def test_plain_members_in_order():
+    files = {"repo/a.py": b"print('a')\n", "repo/b.py": b"", "repo/c.js": b"x" * 1500}
+    assert feed_in_chunks(make_tar(files, tarfile.USTAR_FORMAT), 4096) == list(files.items())
+
+def test_any_chunk_boundary():
+    files = {"repo/a.py": b"a" * 511, "repo/b.py": b"b" * 512, "repo/c.py": b"c" * 513}
+    data = make_tar(files)
+    for size in (1, 7, 511, 512, 513, 10000):
+        assert feed_in_chunks(data, size) == list(files.items())
+
+def test_gnu_long_name():
+    name = "repo/" + "deep/" * 40 + "module.py"
+    assert feed_in_chunks(make_tar({name: b"x = 1\n"}, tarfile.GNU_FORMAT), 100) == [(name, b"x = 1\n")]
+
+def test_pax_long_and_unicode_names():
+    long_name = "repo/" + "nested/" * 30 + "file.py"
+    unicode_name = "repo/módulo_ü.py"
+    files = {long_name: b"1", unicode_name: b"2"}
+    assert feed_in_chunks(make_tar(files, tarfile.PAX_FORMAT), 64) == list(files.items())
+
+def test_ustar_prefix_is_joined():
+    # 130 chars does not fit the 100 byte name field, ustar splits it into prefix and name
+    name = "repo/" + "d" * 60 + "/" + "e" * 50 + "/file.py"
+    assert feed_in_chunks(make_tar({name: b"ok"}, tarfile.USTAR_FORMAT), 512) == [(name, b"ok")]
+
+def test_directories_and_unwanted_files_are_skipped():
+    files = {"repo/a.py": b"keep", "repo/logo.png": b"\x89PNG" * 300, "repo/b.py": b"keep too"}
+    data = make_tar(files, directories=["repo/", "repo/sub/"])
+    members = feed_in_chunks(data, 300, want=lambda name: name.endswith(".py"))
+    assert members == [("repo/a.py", b"keep"), ("repo/b.py", b"keep too")]
+
+def test_skipped_member_is_not_buffered():
+    parser = TarStreamParser(want=lambda name: False)
+    data = make_tar({"repo/big.bin": b"z" * 100_000})
+    for i in range(0, len(data), 4096):
+        parser.feed(data[i:i + 4096])
+        assert len(parser.buffer) < 4096 + 512
+    assert parser.finished
+
+def test_end_of_archive_stops_parsing():
+    parser = TarStreamParser()
+    data = make_tar({"repo/a.py": b"a"})
+    assert parser.feed(data + b"trailing garbage") == [("repo/a.py", b"a")]
+    assert parser.finished
+
+def test_iter_tar_gz_members_decompresses_stream():
+    files = {"repo/a.py": b"a" * 3000, "repo/b.txt": b"b", "repo/c.py": b"c"}
+    compressed = gzip.compress(make_tar(files))
+
+    async def chunks():
+        for i in range(0, len(compressed), 100):
+            yield compressed[i:i + 100]
+
+    async def collect():
+        return [member async for member in iter_tar_gz_members(chunks(), want=lambda name: name.endswith(".py"))]
+
+    assert asyncio.run(collect()) == [("repo/a.py", b"a" * 3000), ("repo/c.py", b"c")]
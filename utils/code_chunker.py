@@ -0,0 +1,180 @@
+import os
+import ast
+
+from typing import Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# files longer than this are split before being sent to the engineer prompt
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "24000"))
+
+BRACE_EXTENSIONS = (".js", ".jsx", ".java")
+COMMENT_PREFIXES = ("@", "//", "/*", "*", "#")
+
+def _pack(pieces: list[tuple[str, str]], max_chars: int) -> list[str]:
+    """Greedily join consecutive (text, header) pieces into chunks, repeating the shared header in each chunk."""
+    chunks, current, header = [], "", None
+    for text, piece_header in pieces:
+        if current and (piece_header != header or len(header) + len(current) + len(text) > max_chars):
+            chunks.append(header + current)
+            current = ""
+        header = piece_header
+        current += text
+    if current:
+        chunks.append(header + current)
+    return chunks
+
+def _split_lines(code: str, max_chars: int, header: str = "") -> list[tuple[str, str]]:
+    """Last resort: cut on blank lines, and line by line inside paragraphs that are still too long."""
+    pieces, paragraph = [], ""
+    for line in code.splitlines(keepends=True):
+        paragraph += line
+        if not line.strip():
+            pieces.append(paragraph)
+            paragraph = ""
+    if paragraph:
+        pieces.append(paragraph)
+
+    result = []
+    for piece in pieces:
+        if len(header) + len(piece) > max_chars:
+            result.extend((line, header) for line in piece.splitlines(keepends=True))
+        else:
+            result.append((piece, header))
+    return result
+
+def _node_start(node) -> int:
+    """0-based first line of a statement, including its decorators."""
+    decorators = getattr(node, "decorator_list", None)
+    return min([node.lineno] + [d.lineno for d in decorators or []]) - 1
+
+def _owned_start(lines: list[str], node, previous_end: int) -> int:
+    """First line of a statement together with the comments and blank lines right above it.
+    A comment indented deeper than the statement still belongs to the previous one's body."""
+    start = _node_start(node)
+    while start > previous_end:
+        line = lines[start - 1]
+        stripped = line.lstrip()
+        if stripped and not (stripped.startswith("#") and len(line) - len(stripped) <= node.col_offset):
+            break
+        start -= 1
+    return start
+
+def _python_pieces(lines: list[str], nodes: list, first: int, last: int, max_chars: int, header: str = "") -> list[tuple[str, str]]:
+    # each statement owns the comments and blank lines that precede it
+    starts = [first] + [_owned_start(lines, node, previous.end_lineno) for previous, node in zip(nodes, nodes[1:])]
+    pieces = []
+    for i, node in enumerate(nodes):
+        start = starts[i]
+        end = starts[i + 1] if i + 1 < len(nodes) else last
+        text = "".join(lines[start:end])
+        if len(header) + len(text) <= max_chars:
+            pieces.append((text, header))
+        elif isinstance(node, ast.ClassDef) and len(node.body) > 1:
+            # oversized class: split along its members and repeat the class line in every part
+            body_start = _node_start(node.body[0])
+            class_header = header + "".join(lines[start:body_start])
+            pieces.extend(_python_pieces(lines, node.body, body_start, end, max_chars, class_header))
+        else:
+            pieces.extend(_split_lines(text, max_chars, header))
+    return pieces
+
+def split_python(code: str, max_chars: int) -> list[str]:
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return _pack(_split_lines(code, max_chars), max_chars)
+    if not tree.body:
+        return [code]
+    lines = code.splitlines(keepends=True)
+    return _pack(_python_pieces(lines, tree.body, 0, len(lines), max_chars), max_chars)
+
+def line_depths(code: str) -> list[int]:
+    """Brace depth at the end of every line, ignoring braces inside strings and comments."""
+    depths, depth = [], 0
+    i, n = 0, len(code)
+    in_string: Optional[str] = None
+    in_block_comment = False
+    while i < n:
+        ch = code[i]
+        nxt = code[i + 1] if i + 1 < n else ""
+        if ch == "\n":
+            depths.append(depth)
+            if in_string in ("'", '"'):
+                in_string = None
+        elif in_block_comment:
+            if ch == "*" and nxt == "/":
+                in_block_comment = False
+                i += 1
+        elif in_string:
+            if ch == "\\":
+                i += 1
+            elif ch == in_string:
+                in_string = None
+        elif ch == "/" and nxt == "/":
+            while i + 1 < n and code[i + 1] != "\n":
+                i += 1
+        elif ch == "/" and nxt == "*":
+            in_block_comment = True
+            i += 1
+        elif ch in ("'", '"', "`"):
+            in_string = ch
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth = max(depth - 1, 0)
+        i += 1
+    if not code.endswith("\n"):
+        depths.append(depth)
+    return depths
+
+def _brace_blocks(lines: list[str], depths: list[int], start: int, end: int, level: int) -> list[tuple[int, int]]:
+    """Cut [start, end) after every line that returns to `level`, keeping leading comments/annotations with the next block."""
+    blocks, block_start = [], start
+    for i in range(start, end):
+        if depths[i] > level:
+            continue
+        stripped = lines[i].strip()
+        if not stripped or stripped.startswith(COMMENT_PREFIXES):
+            continue
+        blocks.append((block_start, i + 1))
+        block_start = i + 1
+    if block_start < end:
+        blocks.append((block_start, end))
+    return blocks
+
+def _brace_pieces(lines: list[str], depths: list[int], start: int, end: int, level: int, max_chars: int, header: str = "") -> list[tuple[str, str]]:
+    pieces = []
+    for block_start, block_end in _brace_blocks(lines, depths, start, end, level):
+        text = "".join(lines[block_start:block_end])
+        if len(header) + len(text) <= max_chars:
+            pieces.append((text, header))
+            continue
+
+        # oversized block (e.g. a Java class): split its members, repeating the opening line(s) in every part
+        opening = next((i for i in range(block_start, block_end) if depths[i] > level), None)
+        if opening is None or level >= 2 or block_end - opening < 3:
+            pieces.extend(_split_lines(text, max_chars, header))
+            continue
+        block_header = header + "".join(lines[block_start:opening + 1])
+        pieces.extend(_brace_pieces(lines, depths, opening + 1, block_end, level + 1, max_chars, block_header))
+    return pieces
+
+def split_braces(code: str, max_chars: int) -> list[str]:
+    lines = code.splitlines(keepends=True)
+    depths = line_depths(code)
+    return _pack(_brace_pieces(lines, depths, 0, len(lines), 0, max_chars), max_chars)
+
+def split_code(code: str, file_path: Optional[str] = None, max_chars: int = CHUNK_MAX_CHARS) -> list[str]:
+    """Split source along class and function boundaries into chunks of roughly max_chars."""
+    if len(code) <= max_chars:
+        return [code]
+    path = (file_path or "").lower()
+    if path.endswith(".py"):
+        chunks = split_python(code, max_chars)
+    elif path.endswith(BRACE_EXTENSIONS):
+        chunks = split_braces(code, max_chars)
+    else:
+        chunks = _pack(_split_lines(code, max_chars), max_chars)
+    return [chunk for chunk in chunks if chunk.strip()]
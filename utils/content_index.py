@@ -0,0 +1,92 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+
+from typing import Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from utils.repo_cache import CACHE_DIR
+
+CONTENT_INDEX_ENABLED = os.getenv("CONTENT_INDEX_ENABLED", "true").lower() == "true"
+
+_BLANK_RUN_PATTERN = re.compile(r"\n{2,}")
+
+def normalize_source(code: str) -> str:
+    """Source with line endings, trailing whitespace and blank runs normalized, so trivially different copies match."""
+    lines = (line.rstrip() for line in code.replace("\r\n", "\n").replace("\r", "\n").split("\n"))
+    return _BLANK_RUN_PATTERN.sub("\n", "\n".join(lines)).strip("\n")
+
+def content_key(code: str, prompt_id: str, model_config: dict) -> str:
+    payload = f"{model_config.get('provider')}/{model_config.get('model_name')}\0{prompt_id}\0{normalize_source(code)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ContentIndex:
+    """SQLite index from a content key to the run and file whose validated output answered it first."""
+
+    def __init__(self, path=CACHE_DIR / "content_index.sqlite3"):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS sources (
+                    key TEXT PRIMARY KEY,
+                    run_id TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+        return self._conn
+
+    def get(self, key: str) -> Optional[dict]:
+        """The entry for a key. A found entry only counts as a hit once the caller could load its output (count)."""
+        with self._lock:
+            row = self._db().execute("SELECT run_id, file_path FROM sources WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        return {"run_id": row[0], "file_path": row[1]}
+
+    def count(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def put(self, key: str, run_id: str, file_path: str):
+        # the first validated copy stays the reference, later copies are reuses of it
+        with self._lock:
+            self._db().execute(
+                "INSERT OR IGNORE INTO sources (key, run_id, file_path, created_at) VALUES (?, ?, ?, ?)",
+                (key, run_id, file_path, time.time()),
+            )
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._db().execute("DELETE FROM sources WHERE key = ?", (key,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db().execute("SELECT COUNT(*) FROM sources").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "enabled": CONTENT_INDEX_ENABLED,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+        }
+
+content_index = ContentIndex()
@@ -0,0 +1,185 @@
+import os
+import re
+import ast
+import json
+import posixpath
+
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from utils.token_budget import estimate_tokens
+
+# total size of the dependency specs given to one engineer prompt
+DEPENDENCY_CONTEXT_TOKENS = int(os.getenv("DEPENDENCY_CONTEXT_TOKENS", "1500"))
+DEPENDENCY_DESCRIPTION_CHARS = 160
+
+JS_EXTENSIONS = (".js", ".jsx", ".ts", ".tsx")
+JS_IMPORT_PATTERN = re.compile(
+    r"""(?:\bimport\s+(?:[\w*{}\s,]+\s+from\s+)?|\bexport\s+[\w*{}\s,]+\s+from\s+|\brequire\s*\(\s*|\bimport\s*\(\s*)["']([^"']+)["']"""
+)
+JAVA_IMPORT_PATTERN = re.compile(r"^\s*import\s+(?:static\s+)?([\w.]+(?:\.\*)?)\s*;", re.MULTILINE)
+
+def _python_imports(code: str, file_path: str) -> list[list[str]]:
+    """Candidate repo paths per import statement, most specific first."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+
+    package = posixpath.dirname(file_path)
+    candidates = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [alias.name.replace(".", "/") for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            base = (node.module or "").replace(".", "/")
+            if node.level:
+                parent = package
+                for _ in range(node.level - 1):
+                    parent = posixpath.dirname(parent)
+                base = posixpath.join(parent, base) if base else parent
+            # `from a import b` may import the module a/b or the name b from a
+            modules = [posixpath.join(base, alias.name) for alias in node.names if alias.name != "*"] + [base]
+        else:
+            continue
+        for module in modules:
+            if module:
+                # scripts run from their own directory import siblings by bare name
+                sibling = posixpath.join(package, module) if not getattr(node, "level", 0) and package else None
+                candidates.append([f"{module}.py", f"{module}/__init__.py"] + ([f"{sibling}.py", f"{sibling}/__init__.py"] if sibling else []))
+    return candidates
+
+def _js_imports(code: str, file_path: str) -> list[list[str]]:
+    candidates = []
+    for specifier in JS_IMPORT_PATTERN.findall(code):
+        # bare specifiers are packages, only relative imports point into the repo
+        if not specifier.startswith("."):
+            continue
+        base = posixpath.normpath(posixpath.join(posixpath.dirname(file_path), specifier))
+        candidates.append([base] + [base + ext for ext in JS_EXTENSIONS] + [f"{base}/index{ext}" for ext in JS_EXTENSIONS])
+    return candidates
+
+def _java_imports(code: str, file_path: str) -> list[list[str]]:
+    candidates = []
+    for name in JAVA_IMPORT_PATTERN.findall(code):
+        parts = name.split(".")
+        if parts[-1] == "*":
+            candidates.append(["/".join(parts[:-1]) + "/*"])
+        else:
+            # a static import names a member, so its class is one level up
+            candidates.append(["/".join(parts) + ".java", "/".join(parts[:-1]) + ".java"])
+    return candidates
+
+def extract_imports(code: str, file_path: str) -> list[list[str]]:
+    """Repo-relative candidate paths for each import of a Python, JS or Java file."""
+    if file_path.endswith(".py"):
+        return _python_imports(code, file_path)
+    if file_path.endswith(JS_EXTENSIONS):
+        return _js_imports(code, file_path)
+    if file_path.endswith(".java"):
+        return _java_imports(code, file_path)
+    return []
+
+class _PathIndex:
+    """Resolves a candidate path against the repo, also when the repo nests sources under a root like src/."""
+
+    def __init__(self, filenames):
+        self.files = set(filenames)
+        self.by_suffix: dict[str, list[str]] = {}
+        for filename in self.files:
+            parts = filename.split("/")
+            for i in range(len(parts)):
+                self.by_suffix.setdefault("/".join(parts[i:]), []).append(filename)
+
+    def resolve(self, candidate: str) -> list[str]:
+        if candidate.endswith("/*"):
+            directory = candidate[:-2]
+            return sorted(f for f in self.files if f.endswith(".java") and (posixpath.dirname(f) == directory or posixpath.dirname(f).endswith("/" + directory)))
+        if candidate in self.files:
+            return [candidate]
+        if "/" not in candidate:
+            # a bare name like os.py is far more likely the standard library than some nested repo file
+            return []
+        matches = self.by_suffix.get(candidate, [])
+        # an ambiguous suffix (two utils.py in different packages) is not a dependency we can trust
+        return matches if len(matches) == 1 else []
+
+def build_dependency_graph(documents: list[dict]) -> dict[str, list[str]]:
+    """Map each filename to the repo files it imports."""
+    index = _PathIndex(doc["name"] for doc in documents)
+    graph = {}
+    for doc in documents:
+        dependencies = []
+        for candidates in extract_imports(doc["content"], doc["name"]):
+            for candidate in candidates:
+                resolved = index.resolve(candidate)
+                if resolved:
+                    dependencies.extend(f for f in resolved if f != doc["name"] and f not in dependencies)
+                    break
+        graph[doc["name"]] = dependencies
+    return graph
+
+def dependency_levels(graph: dict[str, list[str]]) -> list[list[str]]:
+    """Group files so that every file comes after the files it imports, leaves first.
+
+    Files in one level do not depend on each other and can run in parallel. An import cycle is broken by
+    scheduling its first file (in graph order) on its own, ignoring its imports that are still pending.
+    """
+    pending = {name: set(deps) & graph.keys() for name, deps in graph.items()}
+    levels = []
+    while pending:
+        level = [name for name, deps in pending.items() if not deps]
+        if not level:
+            level = [next(iter(pending))]
+        levels.append(level)
+        for name in level:
+            del pending[name]
+        for deps in pending.values():
+            deps.difference_update(level)
+    return levels
+
+def _short(text: Any) -> str:
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= DEPENDENCY_DESCRIPTION_CHARS else text[:DEPENDENCY_DESCRIPTION_CHARS - 1] + "…"
+
+def compact_spec(output: Any) -> Any:
+    """A few-line digest of a validated engineer output: names, signatures and one-line descriptions only."""
+    if isinstance(output, dict) and ("functions" in output or "variables" in output):
+        return {
+            "functions": [
+                f"{fn.get('name')}({', '.join(str(p.get('name')) for p in fn.get('parameters') or [] if isinstance(p, dict))}) -> {fn.get('return_type')}: {_short(fn.get('description'))}"
+                for fn in output.get("functions") or [] if isinstance(fn, dict)
+            ],
+            "variables": [f"{var.get('name')}: {var.get('data_type')}" for var in output.get("variables") or [] if isinstance(var, dict)],
+        }
+
+    stories = output if isinstance(output, list) else [output]
+    if all(isinstance(story, dict) for story in stories):
+        digest = []
+        for story in stories:
+            name = story.get("user_story_name") or story.get("use_case_name")
+            if name is None:
+                return _short(json.dumps(output, ensure_ascii=False))
+            digest.append({
+                "user_story": name,
+                "fields": [field.get("field_name") for field in story.get("fields") or [] if isinstance(field, dict)],
+                "business_rules": [rule.get("business_rule_name") for rule in story.get("business_rules") or [] if isinstance(rule, dict)],
+            })
+        return digest
+    return _short(json.dumps(output, ensure_ascii=False))
+
+def dependency_context(dependencies: list[str], specs: dict[str, Any], budget: int = DEPENDENCY_CONTEXT_TOKENS) -> Optional[dict]:
+    """Compact specs of the already validated dependencies, nearest imports first, within the token budget."""
+    context, tokens = {}, 0
+    for name in dependencies:
+        if name not in specs:
+            continue
+        spec = compact_spec(specs[name])
+        size = estimate_tokens(json.dumps(spec, ensure_ascii=False))
+        if tokens + size > budget:
+            continue
+        context[name] = spec
+        tokens += size
+    return context or None
@@ -0,0 +1,68 @@
+import re
+import json
+
+from typing import Any, Optional
+
+FENCE_PATTERN = re.compile(r"^\s*```[\w-]*\s*\n?|\n?\s*```\s*$")
+TRAILING_COMMA_PATTERN = re.compile(r",(\s*[}\]])")
+
+def _strip_to_json(text: str) -> str:
+    text = FENCE_PATTERN.sub("", text.strip())
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    return text[min(starts):] if starts else text
+
+def _scan(text: str) -> tuple[list[str], bool]:
+    """Open brackets still unclosed at the end of text, and whether it ends inside a string."""
+    stack, in_string, escape = [], False, False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]" and stack:
+            stack.pop()
+    return stack, in_string
+
+def _remove_trailing_commas(text: str) -> str:
+    # only outside strings: split on string literals and patch the code parts
+    parts = re.split(r'("(?:\\.|[^"\\])*")', text)
+    return "".join(part if i % 2 else TRAILING_COMMA_PATTERN.sub(r"\1", part) for i, part in enumerate(parts))
+
+def _close_truncated(text: str) -> str:
+    stack, in_string = _scan(text)
+    if in_string:
+        text += '"'
+    text = text.rstrip()
+    # a dangling `,` or object `"key":` cannot be completed, drop it
+    if stack and stack[-1] == "{":
+        text = re.sub(r'(?:,|(?<=\{))\s*"(?:\\.|[^"\\])*"\s*:?\s*$', "", text)
+    text = re.sub(r'[,:]\s*$', "", text)
+    return text + "".join("}" if opener == "{" else "]" for opener in reversed(stack))
+
+def repair_json(text: str) -> Optional[Any]:
+    """Fix the common ways LLM JSON breaks: code fences and prose around it, trailing commas, control characters
+    in strings and truncated output.
+
+    Returns the parsed value, or None when the text is still not valid JSON.
+    """
+    if not isinstance(text, str):
+        return None
+    candidate = _strip_to_json(text)
+    # strict=False accepts raw newlines and tabs inside strings, which models often emit in long descriptions
+    decoder = json.JSONDecoder(strict=False)
+    for fix in (lambda t: t, _remove_trailing_commas, _close_truncated):
+        candidate = fix(candidate)
+        try:
+            # raw_decode keeps the first complete value and ignores prose after it
+            value, _ = decoder.raw_decode(candidate)
+            return value
+        except json.JSONDecodeError:
+            pass
+    return None
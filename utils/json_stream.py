@@ -0,0 +1,144 @@
+WHITESPACE = " \t\r\n"
+LITERALS = ("true", "false", "null")
+NUMBER_CHARS = set("0123456789+-.eE")
+# prose or a ```json fence before the first bracket is skipped, but a response that is all prose still fails early
+MAX_PREAMBLE_CHARS = 500
+
+class IncrementalJsonChecker:
+    """Feed a streamed completion chunk by chunk and find out as early as possible whether it can still be valid JSON.
+
+    Only syntax is tracked (a stack of open containers and what may come next), so every character is seen once.
+    `failed` flips as soon as no continuation could make the text valid, `complete` once the top-level object or
+    array has been closed; `text` holds the JSON up to that point, without any preamble. `started` tells whether
+    the first bracket was seen.
+    Breakage that repair_json fixes locally is let through: text before the first bracket, trailing commas and
+    raw newlines in strings.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.failed = False
+        self.complete = False
+        self.error = None
+        self._stack = []           # "{" / "["
+        self._expect = "value"     # value | colon | comma | key_or_end | value_or_end
+        self._in_string = False
+        self._escape = False
+        self._token = ""           # partial literal or number
+        self.started = False
+        self._preamble = 0
+
+    def feed(self, chunk: str) -> bool:
+        """Consume a chunk. Returns False once the text can no longer become valid JSON."""
+        for ch in chunk:
+            if self.failed or self.complete:
+                break
+            if self._skip_preamble(ch):
+                continue
+            self._step(ch)
+            if not self.failed:
+                self.text += ch
+        return not self.failed
+
+    def _skip_preamble(self, ch: str) -> bool:
+        """Swallow whatever comes before the first { or [, e.g. a ```json line or a sentence of prose."""
+        if self.started or ch in "{[":
+            return False
+        self._preamble += 1
+        if self._preamble > MAX_PREAMBLE_CHARS:
+            self._fail(f"No JSON object in the first {MAX_PREAMBLE_CHARS} characters")
+        return True
+
+    def _fail(self, message: str):
+        self.failed = True
+        self.error = f"{message} at offset {len(self.text)}"
+
+    def _step(self, ch: str):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                self._after_value(is_key=self._expect == "colon")
+            # a raw newline in a string is invalid JSON too, but repair_json parses it non-strictly
+            return
+
+        if self._token:
+            if self._token[0] in "tfn":
+                literal = next(lit for lit in LITERALS if lit.startswith(self._token))
+                if len(self._token) < len(literal):
+                    if literal[len(self._token)] != ch:
+                        self._fail(f"Invalid literal '{self._token}{ch}'")
+                    else:
+                        self._token += ch
+                        if self._token == literal:
+                            self._token = ""
+                            self._after_value()
+                    return
+            elif ch in NUMBER_CHARS:
+                self._token += ch
+                return
+            else:
+                self._token = ""
+                self._after_value()
+
+        if ch in WHITESPACE:
+            return
+
+        # the preamble was skipped, so the first character reaching here is { or [
+        self.started = True
+
+        expect = self._expect
+        if expect in ("value", "value_or_end"):
+            if ch == "]" and expect == "value_or_end":
+                self._close("[")
+            elif ch == "{":
+                self._stack.append("{")
+                self._expect = "key_or_end"
+            elif ch == "[":
+                self._stack.append("[")
+                self._expect = "value_or_end"
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "tfn" or ch == "-" or ch.isdigit():
+                self._token = ch
+            else:
+                self._fail(f"Expected a value, got {ch!r}")
+        elif expect == "key_or_end":
+            if ch == '"':
+                self._in_string = True
+                self._expect = "colon"
+            elif ch == "}":
+                self._close("{")
+            else:
+                self._fail(f"Expected a key, got {ch!r}")
+        elif expect == "colon":
+            if ch == ":":
+                self._expect = "value"
+            else:
+                self._fail(f"Expected ':', got {ch!r}")
+        elif expect == "comma":
+            if ch == ",":
+                # a closing bracket may follow: a trailing comma is repaired after parsing
+                self._expect = "key_or_end" if self._stack[-1] == "{" else "value_or_end"
+            elif ch in "}]":
+                self._close("{" if ch == "}" else "[")
+            else:
+                self._fail(f"Expected ',' or a closing bracket, got {ch!r}")
+
+    def _close(self, opener: str):
+        if not self._stack or self._stack[-1] != opener:
+            self._fail("Mismatched closing bracket")
+            return
+        self._stack.pop()
+        self._after_value()
+
+    def _after_value(self, is_key: bool = False):
+        if is_key:
+            return
+        if not self._stack:
+            self.complete = True
+        else:
+            self._expect = "comma"
@@ -1,7 +1,9 @@
 import json
 
+from utils.json_repair import repair_json
+
 def parse_llm_response(raw_response) -> dict:
-    """Safely parses LLM string response into a Python dict."""
+    """Safely parses LLM string response into a Python dict, repairing common JSON breakage locally first."""
     if isinstance(raw_response, dict):
         return raw_response
     if hasattr(raw_response, "content"):
@@ -9,4 +11,7 @@ def parse_llm_response(raw_response) -> dict:
     try:
         return json.loads(raw_response)
     except json.JSONDecodeError as e:
+        repaired = repair_json(raw_response)
+        if repaired is not None:
+            return repaired
         return {"error": f"Invalid JSON from LLM: {e}", "raw": str(raw_response)}
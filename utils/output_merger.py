@@ -0,0 +1,70 @@
+import json
+
+from typing import Any
+
+def _merge_values(left: Any, right: Any) -> Any:
+    if left in (None, "", [], {}):
+        return right
+    if isinstance(left, dict) and isinstance(right, dict):
+        merged = dict(left)
+        for key, value in right.items():
+            merged[key] = _merge_values(merged.get(key), value)
+        return merged
+    if isinstance(left, list) and isinstance(right, list):
+        seen = {json.dumps(item, sort_keys=True, default=str) for item in left}
+        merged = list(left)
+        for item in right:
+            marker = json.dumps(item, sort_keys=True, default=str)
+            if marker not in seen:
+                seen.add(marker)
+                merged.append(item)
+        return merged
+    # scalars: the first chunk wins (filename, the ids of stories merged by name)
+    return left
+
+def _prefix_ids(value: Any, prefix: str) -> Any:
+    """Prefix every generated id (user_story_id, field_id, rule_id, ...), the model numbers them from 1 in every chunk."""
+    if isinstance(value, dict):
+        return {key: f"{prefix}{item}" if key.endswith("_id") and isinstance(item, str) and item else _prefix_ids(item, prefix) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_prefix_ids(item, prefix) for item in value]
+    return value
+
+def _story_name(part: Any) -> Any:
+    return part.get("user_story_name") or part.get("use_case_name") if isinstance(part, dict) else None
+
+def merge_engineer_outputs(outputs: list[dict]) -> dict:
+    """Merge partial EngineerOutputSchema dicts produced for chunks of the same file into one result.
+
+    Ids are prefixed with the chunk number (p1_, p2_, ...). Every chunk's user story is kept, stories of the same
+    name are merged and more than one story becomes a list. Other outputs are merged key by key: lists (functions,
+    variables, ...) are concatenated without duplicates and scalar values keep the first non-empty value.
+    """
+    merged: dict = {}
+    parts = []
+    for i, output in enumerate(outputs, start=1):
+        output = dict(output)
+        part = output.pop("output", None)
+        merged = _merge_values(merged, output)
+        if part is not None:
+            parts.append(_prefix_ids(part, f"p{i}_") if len(outputs) > 1 else part)
+
+    items = [item for part in parts for item in (part if isinstance(part, list) else [part])]
+    if any(_story_name(item) for item in items):
+        stories = []
+        for item in items:
+            same = next((j for j, story in enumerate(stories) if _story_name(item) and _story_name(story) == _story_name(item)), None)
+            if same is None:
+                stories.append(item)
+            else:
+                stories[same] = _merge_values(stories[same], item)
+        merged["output"] = stories if len(stories) > 1 else stories[0]
+        return merged
+
+    for part in parts:
+        if isinstance(part, dict) and isinstance(merged.get("output"), list):
+            part = [part]
+        elif isinstance(part, list) and isinstance(merged.get("output"), dict):
+            merged["output"] = [merged["output"]]
+        merged["output"] = _merge_values(merged.get("output"), part)
+    return merged
@@ -0,0 +1,80 @@
+import os
+import threading
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+CACHE_DIR = Path(os.getenv("ORION_CACHE_DIR", ".orion_cache"))
+TREE_CACHE_MAX_BYTES = int(os.getenv("TREE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+class BlobCache:
+    """On-disk, content-addressed store of file contents keyed by git blob SHA."""
+
+    def __init__(self, root: Path = CACHE_DIR / "blobs"):
+        self.root = Path(root)
+
+    def _path(self, sha: str) -> Path:
+        return self.root / sha[:2] / sha
+
+    def get(self, sha: Optional[str]) -> Optional[str]:
+        if not sha:
+            return None
+        path = self._path(sha)
+        # bytes on both sides: text mode would turn CRLF sources into LF and change their content hash
+        try:
+            return path.read_bytes().decode("utf-8")
+        except (FileNotFoundError, UnicodeDecodeError):
+            return None
+
+    def put(self, sha: Optional[str], content: str):
+        if not sha:
+            return
+        path = self._path(sha)
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temp file first so readers never see a partial blob
+        tmp_path = path.with_name(f"{sha}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(content.encode("utf-8"))
+        os.replace(tmp_path, path)
+
+class TreeCache:
+    """In-memory LRU of resolved tree snapshots, evicted by total content size."""
+
+    def __init__(self, max_bytes: int = TREE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: OrderedDict[tuple, tuple[list, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size_of(documents: list) -> int:
+        return sum(len(doc["name"]) + len(doc["content"]) for doc in documents)
+
+    def get(self, key: tuple) -> Optional[list]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return list(entry[0])
+
+    def put(self, key: tuple, documents: list):
+        size = self._size_of(documents)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (list(documents), size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+blob_cache = BlobCache()
+tree_cache = TreeCache()
@@ -0,0 +1,51 @@
+import json
+import hashlib
+import time
+
+from pathlib import Path
+from typing import Optional
+
+from utils.repo_cache import CACHE_DIR
+
+MANIFEST_DIR = CACHE_DIR / "runs"
+
+def snapshot_id(file_shas: dict) -> str:
+    """Stable id of a set of (path, blob sha) pairs, identical for every ingestion mode."""
+    digest = hashlib.sha1()
+    for path in sorted(file_shas):
+        digest.update(f"{path}\0{file_shas[path]}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+def save_run_manifest(run_id: str, file_shas: dict, source: Optional[dict] = None, generator: Optional[dict] = None) -> dict:
+    manifest = {
+        "run_id": run_id,
+        "created_at": time.time(),
+        "source": source or {},
+        # model and engineer prompt the outputs were generated with
+        "generator": generator or {},
+        "snapshot_id": snapshot_id(file_shas),
+        "files": file_shas,
+    }
+    MANIFEST_DIR.mkdir(parents=True, exist_ok=True)
+    (MANIFEST_DIR / f"{run_id}.json").write_text(json.dumps(manifest), encoding="utf-8")
+    return manifest
+
+def load_run_manifest(run_id: str) -> Optional[dict]:
+    path = MANIFEST_DIR / f"{Path(run_id).name}.json"
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+def find_run_manifest(file_shas: dict) -> Optional[dict]:
+    """Return the most recent run whose files match the given snapshot exactly."""
+    wanted = snapshot_id(file_shas)
+    matches = []
+    for path in MANIFEST_DIR.glob("*.json"):
+        try:
+            manifest = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            continue
+        if manifest.get("snapshot_id") == wanted:
+            matches.append(manifest)
+    return max(matches, key=lambda m: m.get("created_at", 0), default=None)
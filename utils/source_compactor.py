@@ -0,0 +1,94 @@
+import os
+import re
+
+from typing import Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from utils.token_budget import estimate_tokens
+
+SOURCE_COMPACTION = os.getenv("SOURCE_COMPACTION", "true").lower() == "true"
+# longer lines are minified bundles or inlined assets, only their start is kept
+COMPACT_MAX_LINE_CHARS = int(os.getenv("COMPACT_MAX_LINE_CHARS", "1000"))
+
+HASH_COMMENTS = ((r"#",), ())
+C_COMMENTS = ((r"//",), ((r"/\*", r"\*/"),))
+COMMENT_STYLES = {
+    ".py": ((r"#",), ((r'"""', r'"""'), (r"'''", r"'''"))),
+    ".sh": HASH_COMMENTS, ".rb": HASH_COMMENTS, ".yaml": HASH_COMMENTS, ".yml": HASH_COMMENTS,
+    ".js": C_COMMENTS, ".jsx": C_COMMENTS, ".ts": C_COMMENTS, ".tsx": C_COMMENTS, ".java": C_COMMENTS,
+    ".c": C_COMMENTS, ".cpp": C_COMMENTS, ".cs": C_COMMENTS, ".go": C_COMMENTS, ".kt": C_COMMENTS, ".scss": C_COMMENTS,
+    ".css": ((), ((r"/\*", r"\*/"),)),
+    ".html": ((), ((r"<!--", r"-->"),)), ".xml": ((), ((r"<!--", r"-->"),)), ".vue": ((), ((r"<!--", r"-->"),)),
+}
+
+# headers repeated across a code base that say nothing about what the file does
+BOILERPLATE_PATTERN = re.compile(
+    r"copyright|\(c\)\s*\d{4}|licen[sc]ed? under|spdx-license-identifier|all rights reserved|permission is hereby granted"
+    r"|auto-?generated|generated by|do not (?:edit|modify)",
+    re.IGNORECASE,
+)
+DATA_URI_PATTERN = re.compile(r"(data:[\w/+.-]+;base64,)[A-Za-z0-9+/]{64,}={0,2}")
+BASE64_STRING_PATTERN = re.compile(r"""(["'`])[A-Za-z0-9+/]{200,}={0,2}\1""")
+BLANK_RUN_PATTERN = re.compile(r"\n{3,}")
+
+def _leading_block(code: str, line_prefixes: tuple, block_pairs: tuple) -> Optional[re.Match]:
+    """The first comment block of the file (after blank lines), if any."""
+    patterns = [rf"(?:[ \t]*(?:{'|'.join(line_prefixes)})[^\n]*\n)+"] if line_prefixes else []
+    patterns += [rf"[ \t]*{start}.*?{end}[ \t]*\n?" for start, end in block_pairs]
+    for pattern in patterns:
+        match = re.compile(r"\s*" + pattern, re.DOTALL).match(code)
+        if match:
+            return match
+    return None
+
+def strip_boilerplate_headers(code: str, file_path: Optional[str]) -> str:
+    """Drop leading license, copyright and generated-code banners, keeping a shebang line."""
+    line_prefixes, block_pairs = COMMENT_STYLES.get(os.path.splitext(file_path or "")[1].lower(), ((), ()))
+    shebang = ""
+    if code.startswith("#!"):
+        shebang, _, code = code.partition("\n")
+        shebang += "\n"
+    while (match := _leading_block(code, line_prefixes, block_pairs)) and BOILERPLATE_PATTERN.search(match.group(0)):
+        code = code[match.end():]
+    return shebang + code
+
+def _banner_pattern(line_prefixes: tuple, block_pairs: tuple) -> Optional[re.Pattern]:
+    # a comment made only of one repeated separator character, e.g. `// ==========` or `/* ******** */`
+    openers = list(line_prefixes) + [start for start, _ in block_pairs] + [r"\*"]
+    closers = [end for _, end in block_pairs]
+    if not line_prefixes and not block_pairs:
+        return None
+    close = rf"(?:{'|'.join(closers)})?" if closers else ""
+    return re.compile(rf"^[ \t]*(?:{'|'.join(openers)})[ \t]*([=\-*#/~_+])\1{{7,}}[ \t]*{close}[ \t]*\n", re.MULTILINE)
+
+def _shorten_line(line: str, max_chars: int) -> str:
+    if len(line) <= max_chars:
+        return line
+    return f"{line[:max_chars]} …[{len(line) - max_chars} chars omitted]"
+
+def compact_source(code: str, file_path: Optional[str] = None, max_line_chars: int = COMPACT_MAX_LINE_CHARS) -> tuple[str, dict]:
+    """Remove content that costs prompt tokens without describing behaviour.
+
+    Ordinary comments and docstrings are kept since they often carry business rules; only boilerplate headers,
+    separator banners, embedded base64 assets, minified line tails, trailing whitespace and blank runs go.
+    Returns (compacted code, {"tokens_before", "tokens_after", "tokens_saved"}).
+    """
+    tokens_before = estimate_tokens(code)
+    if not code:
+        return code, {"tokens_before": 0, "tokens_after": 0, "tokens_saved": 0}
+    compacted = code.replace("\r\n", "\n")
+    compacted = strip_boilerplate_headers(compacted, file_path)
+
+    banner = _banner_pattern(*COMMENT_STYLES.get(os.path.splitext(file_path or "")[1].lower(), ((), ())))
+    if banner is not None:
+        compacted = banner.sub("", compacted)
+
+    compacted = DATA_URI_PATTERN.sub(lambda m: f"{m.group(1)}<{len(m.group(0)) - len(m.group(1))} base64 chars omitted>", compacted)
+    compacted = BASE64_STRING_PATTERN.sub(lambda m: f"{m.group(1)}<{len(m.group(0)) - 2} base64 chars omitted>{m.group(1)}", compacted)
+    compacted = "\n".join(_shorten_line(line.rstrip(), max_line_chars) for line in compacted.split("\n"))
+    compacted = BLANK_RUN_PATTERN.sub("\n\n", compacted).strip("\n") + "\n"
+
+    tokens_after = estimate_tokens(compacted)
+    return compacted, {"tokens_before": tokens_before, "tokens_after": tokens_after, "tokens_saved": tokens_before - tokens_after}
@@ -0,0 +1,248 @@
+import re
+import ast
+
+from bisect import bisect_left
+from typing import Callable, Optional
+
+JAVA_MODIFIERS = {"public", "protected", "private", "static", "final", "abstract", "synchronized", "native", "default", "transient", "volatile", "strictfp"}
+CONTROL_KEYWORDS = {"if", "for", "while", "switch", "catch", "return", "new", "else", "do", "try", "throw", "super", "this", "function"}
+
+def _split_params(params: str) -> list[str]:
+    """Split a parameter list on top-level commas."""
+    parts, depth, current = [], 0, ""
+    for ch in params:
+        if ch in "<([{":
+            depth += 1
+        elif ch in ">)]}":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += ch
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+def _python_access(name: str) -> str:
+    if name.startswith("__") and not name.endswith("__"):
+        return "private"
+    if name.startswith("_") and not name.endswith("__"):
+        return "protected"
+    return "public"
+
+def _python_literal_type(value) -> str:
+    if isinstance(value, ast.Constant) and value.value is not None:
+        return type(value.value).__name__
+    return {ast.List: "list", ast.Dict: "dict", ast.Set: "set", ast.Tuple: "tuple", ast.ListComp: "list", ast.DictComp: "dict"}.get(type(value), "unknown")
+
+def _python_function(node, prefix: str) -> dict:
+    args = node.args
+    positional = args.posonlyargs + args.args
+    params = []
+    for arg in positional + ([args.vararg] if args.vararg else []) + args.kwonlyargs + ([args.kwarg] if args.kwarg else []):
+        if arg.arg in ("self", "cls") and prefix and arg is positional[0]:
+            continue
+        name = arg.arg
+        if arg is args.vararg:
+            name = f"*{name}"
+        elif arg is args.kwarg:
+            name = f"**{name}"
+        params.append({"name": name, "data_type": ast.unparse(arg.annotation) if arg.annotation else "Any"})
+    return {
+        "name": f"{prefix}{node.name}()",
+        "parameters": params,
+        "return_type": ast.unparse(node.returns) if node.returns else "unknown",
+        "access_level": _python_access(node.name),
+    }
+
+def _python_variables(nodes: list, prefix: str) -> list[dict]:
+    variables = []
+    for node in nodes:
+        if isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+            variables.append({"name": f"{prefix}{node.target.id}", "data_type": ast.unparse(node.annotation), "access_level": _python_access(node.target.id)})
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    variables.append({"name": f"{prefix}{target.id}", "data_type": _python_literal_type(node.value), "access_level": _python_access(target.id)})
+    return variables
+
+def extract_python(code: str) -> Optional[dict]:
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+
+    functions = []
+    variables = _python_variables(tree.body, "")
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions.append(_python_function(node, ""))
+        elif isinstance(node, ast.ClassDef):
+            variables.extend(_python_variables(node.body, f"{node.name}."))
+            for member in node.body:
+                if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    functions.append(_python_function(member, f"{node.name}."))
+    # a property getter and setter, or a redefined method, share one name
+    return {"functions": _disambiguate(functions), "variables": variables}
+
+def _strip_comments_and_strings(code: str) -> str:
+    """Blank out comments and string contents (keeping line breaks) so regexes only see code."""
+    pattern = re.compile(r"//[^\n]*|/\*.*?\*/|\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`", re.DOTALL)
+
+    def blank(match):
+        text = match.group(0)
+        if text[0] in "\"'`":
+            return text[0] + re.sub(r"[^\n]", " ", text[1:-1]) + text[-1]
+        return re.sub(r"[^\n]", " ", text)
+
+    return pattern.sub(blank, code)
+
+def _brace_depth(clean: str) -> Callable[[int], int]:
+    """Brace depth at any offset of comment- and string-free code, also inside a class written on one line."""
+    opens = [i for i, ch in enumerate(clean) if ch == "{"]
+    closes = [i for i, ch in enumerate(clean) if ch == "}"]
+    return lambda pos: bisect_left(opens, pos) - bisect_left(closes, pos)
+
+def _class_spans(clean: str, pattern: re.Pattern) -> list[tuple[int, int, str]]:
+    """(body start, body end, dotted name) of every class, nested classes qualified by their outer class."""
+    spans = []
+    for match in pattern.finditer(clean):
+        start = clean.find("{", match.end())
+        if start < 0:
+            continue
+        depth, end = 0, len(clean)
+        for i in range(start, len(clean)):
+            if clean[i] == "{":
+                depth += 1
+            elif clean[i] == "}":
+                depth -= 1
+                if depth == 0:
+                    end = i
+                    break
+        spans.append((start, end, match.group(1)))
+    # spans come in source order, so an enclosing class is always qualified before its members
+    qualified = []
+    for start, end, name in spans:
+        outer = next((q for s, e, q in reversed(qualified) if s < start < e), None)
+        qualified.append((start, end, f"{outer}.{name}" if outer else name))
+    return qualified
+
+def _enclosing_class(spans: list[tuple[int, int, str]], pos: int) -> Optional[str]:
+    inner = [(start, name) for start, end, name in spans if start < pos < end]
+    return max(inner)[1] if inner else None
+
+def _qualified(spans: list[tuple[int, int, str]], pos: int, name: str) -> str:
+    owner = _enclosing_class(spans, pos)
+    return f"{owner}.{name}" if owner else name
+
+def _disambiguate(functions: list[dict]) -> list[dict]:
+    """Give overloads (and same-named nested functions) distinct names by their parameters, then by position."""
+    counts = {}
+    for function in functions:
+        counts[function["name"]] = counts.get(function["name"], 0) + 1
+    seen = {}
+    for function in functions:
+        if counts[function["name"]] > 1:
+            base = function["name"][:-2]
+            params = ", ".join(param["data_type"] if param["data_type"].lower() not in ("any", "unknown") else param["name"] for param in function["parameters"])
+            function["name"] = f"{base}({params})"
+        seen[function["name"]] = seen.get(function["name"], 0) + 1
+        if seen[function["name"]] > 1:
+            function["name"] = f"{function['name']}#{seen[function['name']]}"
+    return functions
+
+# a declaration starts a line or follows a brace or semicolon, e.g. in a class written on one line
+STATEMENT_START = r"(?:^|(?<=[{};]))"
+JAVA_METHOD = re.compile(STATEMENT_START + r"[ \t]*(?:@\w+(?:\([^)]*\))?\s+)*(?P<mods>(?:(?:" + "|".join(JAVA_MODIFIERS) + r")\s+)*)(?:<[^>]*>\s+)?(?P<type>[\w.<>\[\]?, ]+?\s+)?(?P<name>\w+)\s*\((?P<params>[^)]*)\)\s*(?:throws\s+[\w.,\s]+)?\{", re.MULTILINE)
+JAVA_FIELD = re.compile(STATEMENT_START + r"\s*(?P<mods>(?:(?:" + "|".join(JAVA_MODIFIERS) + r")\s+)*)(?P<type>[\w.<>\[\]?, ]+?)\s+(?P<name>\w+)\s*(?:=[^;]*)?;", re.MULTILINE)
+JAVA_CLASS = re.compile(r"\b(?:class|interface|enum|record)\s+(\w+)")
+
+def _java_access(mods: str) -> str:
+    for level in ("public", "protected", "private"):
+        if level in mods.split():
+            return level
+    return "package-private"
+
+def extract_java(code: str) -> dict:
+    clean = _strip_comments_and_strings(code)
+    depth_at = _brace_depth(clean)
+    classes = set(JAVA_CLASS.findall(clean))
+    spans = _class_spans(clean, JAVA_CLASS)
+
+    functions = []
+    for match in JAVA_METHOD.finditer(clean):
+        name, return_type = match.group("name"), (match.group("type") or "").strip()
+        if name in CONTROL_KEYWORDS or return_type in CONTROL_KEYWORDS or "=" in match.group(0):
+            continue
+        if not return_type and name not in classes:
+            continue
+        params = []
+        for param in _split_params(match.group("params")):
+            tokens = [token for token in param.replace("final ", "").split() if not token.startswith("@")]
+            if len(tokens) >= 2:
+                params.append({"name": tokens[-1], "data_type": " ".join(tokens[:-1])})
+        functions.append({
+            "name": f"{_qualified(spans, match.start('name'), name)}()",
+            "parameters": params,
+            "return_type": return_type or name,
+            "access_level": _java_access(match.group("mods")),
+        })
+
+    variables = []
+    for match in JAVA_FIELD.finditer(clean):
+        # fields live directly in a (possibly nested) class body, locals are nested deeper
+        nesting = sum(1 for start, end, _ in spans if start < match.start("name") < end)
+        if not nesting or depth_at(match.start("name")) != nesting or match.group("type").strip() in CONTROL_KEYWORDS | {"return", "package", "import"}:
+            continue
+        variables.append({"name": _qualified(spans, match.start("name"), match.group("name")), "data_type": match.group("type").strip(), "access_level": _java_access(match.group("mods"))})
+    return {"functions": _disambiguate(functions), "variables": variables}
+
+JS_FUNCTION = re.compile(r"\b(?:async\s+)?function\s*\*?\s*(?P<name>[\w$]+)\s*\((?P<params>[^)]*)\)")
+JS_ARROW = re.compile(r"\b(?:const|let|var)\s+(?P<name>[\w$]+)\s*=\s*(?:async\s+)?(?:function\s*\*?\s*[\w$]*\s*\((?P<fparams>[^)]*)\)|\((?P<params>[^)]*)\)\s*=>|(?P<single>[\w$]+)\s*=>)")
+JS_METHOD = re.compile(STATEMENT_START + r"\s*(?:static\s+)?(?:async\s+)?(?P<name>#?[\w$]+)\s*\((?P<params>[^)]*)\)\s*\{", re.MULTILINE)
+JS_CLASS = re.compile(r"\bclass\s+([\w$]+)")
+JS_VARIABLE = re.compile(r"^\s*(?:export\s+)?(?P<kind>const|let|var)\s+(?P<name>[\w$]+)\s*=\s*(?P<value>[^\n;]*)", re.MULTILINE)
+
+def _js_params(params: str) -> list[dict]:
+    return [{"name": param.split("=")[0].strip(), "data_type": "any"} for param in _split_params(params)]
+
+def extract_js(code: str) -> dict:
+    clean = _strip_comments_and_strings(code)
+    depth_at = _brace_depth(clean)
+    spans = _class_spans(clean, JS_CLASS)
+
+    functions, seen = [], set()
+    for match in JS_FUNCTION.finditer(clean):
+        functions.append({"name": f"{match.group('name')}()", "parameters": _js_params(match.group("params")), "return_type": "unknown", "access_level": "public"})
+        seen.add(match.group("name"))
+    for match in JS_ARROW.finditer(clean):
+        params = match.group("params") if match.group("params") is not None else match.group("fparams") or match.group("single") or ""
+        functions.append({"name": f"{match.group('name')}()", "parameters": _js_params(params), "return_type": "unknown", "access_level": "public"})
+        seen.add(match.group("name"))
+    for match in JS_METHOD.finditer(clean):
+        name = match.group("name")
+        # class methods sit one level inside the class body
+        if name in CONTROL_KEYWORDS or name in seen or depth_at(match.start("name")) != 1:
+            continue
+        functions.append({"name": f"{_qualified(spans, match.start('name'), name)}()", "parameters": _js_params(match.group("params")), "return_type": "unknown", "access_level": "private" if name.startswith("#") else "public"})
+
+    variables = []
+    for match in JS_VARIABLE.finditer(clean):
+        if match.group("name") in seen or depth_at(match.start("name")) != 0:
+            continue
+        value = match.group("value").strip()
+        data_type = "string" if value[:1] in "\"'`" else "number" if re.match(r"-?\d", value) else "boolean" if value in ("true", "false") else "array" if value.startswith("[") else "object" if value.startswith("{") else "any"
+        variables.append({"name": match.group("name"), "data_type": data_type, "access_level": "public"})
+    return {"functions": _disambiguate(functions), "variables": variables}
+
+def extract_signatures(code: str, file_path: Optional[str] = None) -> Optional[dict]:
+    """Statically extract function and variable signatures, or None when the language is not supported."""
+    path = (file_path or "").lower()
+    if path.endswith(".py"):
+        return extract_python(code)
+    if path.endswith(".java"):
+        return extract_java(code)
+    if path.endswith((".js", ".jsx")):
+        return extract_js(code)
+    return None
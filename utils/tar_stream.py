@@ -0,0 +1,127 @@
+import zlib
+
+from typing import AsyncIterator, Callable, Optional
+
+BLOCK_SIZE = 512
+
+def _parse_number(field: bytes) -> int:
+    # GNU base-256 encoding is flagged by the high bit of the first byte
+    if field and field[0] & 0x80:
+        return int.from_bytes(bytes([field[0] & 0x7F]) + field[1:], "big")
+    field = field.split(b"\0", 1)[0].strip()
+    return int(field, 8) if field else 0
+
+def _parse_string(field: bytes) -> str:
+    return field.split(b"\0", 1)[0].decode("utf-8", errors="replace")
+
+def _parse_pax(data: bytes) -> dict:
+    records = {}
+    pos = 0
+    while pos < len(data):
+        space = data.find(b" ", pos)
+        if space == -1:
+            break
+        length = int(data[pos:space])
+        key, _, value = data[space + 1:pos + length - 1].partition(b"=")
+        records[key.decode("utf-8")] = value.decode("utf-8", errors="replace")
+        pos += length
+    return records
+
+class TarStreamParser:
+    """Incremental ustar/pax/GNU tar reader that emits regular file members as soon as they are complete.
+
+    Members rejected by `want` are skipped without being buffered. tarfile's stream mode (r|gz) is not used
+    because it pulls from a blocking file object: bytes arriving from an async HTTP response would need a
+    thread and a pipe to reach it, whereas this parser is pushed each chunk on the event loop.
+    """
+
+    def __init__(self, want: Callable[[str], bool] = lambda name: True):
+        self.want = want
+        self.buffer = bytearray()
+        self.finished = False
+        self.global_headers: dict = {}
+
+        self._member: Optional[dict] = None
+        self._pending_name: Optional[str] = None
+
+    def feed(self, data: bytes) -> list[tuple[str, bytes]]:
+        self.buffer.extend(data)
+        members = []
+        while not self.finished:
+            if self._member is None:
+                if len(self.buffer) < BLOCK_SIZE:
+                    break
+                header = bytes(self.buffer[:BLOCK_SIZE])
+                del self.buffer[:BLOCK_SIZE]
+                self._start_member(header)
+                continue
+
+            member = self._member
+            if member["remaining"] > 0:
+                take = min(member["remaining"], len(self.buffer))
+                if take == 0:
+                    break
+                if member["keep"]:
+                    member["data"].extend(self.buffer[:take])
+                del self.buffer[:take]
+                member["remaining"] -= take
+                if member["remaining"] > 0:
+                    break
+
+            padding = -member["size"] % BLOCK_SIZE
+            if len(self.buffer) < padding:
+                break
+            del self.buffer[:padding]
+            self._member = None
+
+            completed = self._finish_member(member)
+            if completed:
+                members.append(completed)
+        return members
+
+    def _start_member(self, header: bytes):
+        if header == b"\0" * BLOCK_SIZE:
+            self.finished = True
+            return
+
+        size = _parse_number(header[124:136])
+        typeflag = header[156:157]
+        name = _parse_string(header[0:100])
+        prefix = _parse_string(header[345:500]) if header[257:262] == b"ustar" else ""
+        if prefix:
+            name = f"{prefix}/{name}"
+        if self._pending_name:
+            name, self._pending_name = self._pending_name, None
+
+        # metadata members are always buffered so they can be applied to the next header
+        is_meta = typeflag in (b"x", b"g", b"L")
+        is_file = typeflag in (b"0", b"\0", b"7")
+        keep = is_meta or (is_file and self.want(name))
+        self._member = {"name": name, "type": typeflag, "size": size, "remaining": size, "keep": keep, "data": bytearray()}
+
+    def _finish_member(self, member: dict) -> Optional[tuple[str, bytes]]:
+        data = bytes(member["data"])
+        if member["type"] == b"x":
+            self._pending_name = _parse_pax(data).get("path") or self._pending_name
+        elif member["type"] == b"g":
+            self.global_headers.update(_parse_pax(data))
+        elif member["type"] == b"L":
+            self._pending_name = data.rstrip(b"\0").decode("utf-8", errors="replace")
+        elif member["keep"]:
+            return member["name"], data
+        return None
+
+async def iter_tar_gz_members(
+        chunks: AsyncIterator[bytes],
+        want: Callable[[str], bool] = lambda name: True,
+    ) -> AsyncIterator[tuple[str, bytes]]:
+    """Decompress a .tar.gz byte stream on the fly and yield (name, data) for each wanted file."""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    parser = TarStreamParser(want)
+    async for chunk in chunks:
+        for member in parser.feed(decompressor.decompress(chunk)):
+            yield member
+        if parser.finished:
+            return
+    for member in parser.feed(decompressor.flush()):
+        yield member
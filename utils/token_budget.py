@@ -0,0 +1,41 @@
+import os
+import re
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# small files are packed together into one engineer prompt up to this many estimated tokens
+PACK_TOKEN_BUDGET = int(os.getenv("PACK_TOKEN_BUDGET", "6000"))
+PACK_MAX_FILE_TOKENS = int(os.getenv("PACK_MAX_FILE_TOKENS", "800"))
+PACK_MAX_FILES = int(os.getenv("PACK_MAX_FILES", "20"))
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(text: str) -> int:
+    """Cheap, tokenizer-free estimate: identifiers and punctuation count once, long identifiers roughly every 4 chars."""
+    if not text:
+        return 0
+    return sum(max(1, len(token) // 4) for token in _TOKEN_PATTERN.findall(text))
+
+def is_packable(doc: dict, max_file_tokens: int = PACK_MAX_FILE_TOKENS) -> bool:
+    return estimate_tokens(doc["content"]) <= max_file_tokens
+
+class DocumentPacker:
+    """Accumulates small documents until the next one would exceed the token or file budget."""
+
+    def __init__(self, budget: int = PACK_TOKEN_BUDGET, max_files: int = PACK_MAX_FILES):
+        self.budget = budget
+        self.max_files = max_files
+        self.items: list = []
+        self.tokens = 0
+
+    def fits(self, doc: dict) -> bool:
+        return len(self.items) < self.max_files and self.tokens + estimate_tokens(doc["content"]) <= self.budget
+
+    def add(self, item, doc: dict):
+        self.items.append(item)
+        self.tokens += estimate_tokens(doc["content"])
+
+    def flush(self) -> list:
+        items, self.items, self.tokens = self.items, [], 0
+        return items
@@ -0,0 +1,149 @@
+import os
+import re
+import json
+import hashlib
+
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+load_dotenv()
+
+from utils.repo_cache import CACHE_DIR
+
+VECTOR_DIR = CACHE_DIR / "vectors"
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "2048"))
+# character trigrams let "auth" match "authentication", at a lower weight than whole words
+TRIGRAM_WEIGHT = 0.3
+# hashed features of unrelated texts still share buckets, which scores a few hundredths; real matches score well above
+VECTOR_MIN_SCORE = float(os.getenv("VECTOR_MIN_SCORE", "0.08"))
+
+_WORD_PATTERN = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+STOPWORDS = {"a", "an", "and", "are", "as", "be", "by", "for", "from", "in", "is", "it", "of", "on", "or", "that", "the", "this", "to", "with"}
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased words, split on camelCase and snake_case, plus adjacent word pairs."""
+    words = [word.lower() for word in _WORD_PATTERN.findall(text or "")]
+    words = [word for word in words if word not in STOPWORDS]
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+@lru_cache(maxsize=65536)
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+def _features(text: str) -> list[tuple[str, float]]:
+    tokens = tokenize(text)
+    trigrams = [f"#{word[i:i + 3]}" for word in tokens if "_" not in word and len(word) > 3 for i in range(len(word) - 2)]
+    return [(token, 1.0) for token in tokens] + [(trigram, TRIGRAM_WEIGHT) for trigram in trigrams]
+
+def embed(texts: list[str], dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Signed feature hashing of words, word pairs and trigrams with sublinear term frequency, L2-normalized.
+    No model, no service."""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for feature, weight in _features(text):
+            h = _token_hash(feature)
+            vectors[row, h % dim] += weight if h >> 63 else -weight
+    vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+def _text(*parts: Any) -> str:
+    return " ".join(str(part) for part in parts if part)
+
+def spec_units(file_path: str, output: Any) -> list[dict]:
+    """Split a validated engineer output into retrievable units: one per function, user story or variable set."""
+    if isinstance(output, dict) and ("functions" in output or "variables" in output):
+        units = [
+            {"file_path": file_path, "kind": "function", "name": fn.get("name"), "spec": fn,
+             "text": _text(file_path, fn.get("name"), fn.get("description"), fn.get("business_logic"), *(p.get("name") for p in fn.get("parameters") or [] if isinstance(p, dict)))}
+            for fn in output.get("functions") or [] if isinstance(fn, dict)
+        ]
+        variables = [var for var in output.get("variables") or [] if isinstance(var, dict)]
+        if variables:
+            units.append({"file_path": file_path, "kind": "variables", "name": file_path, "spec": {"variables": variables},
+                          "text": _text(file_path, *(_text(var.get("name"), var.get("description")) for var in variables))})
+        return units
+
+    stories = output if isinstance(output, list) else [output]
+    if stories and all(isinstance(story, dict) and (story.get("user_story_name") or story.get("use_case_name")) for story in stories):
+        return [
+            {"file_path": file_path, "kind": "user_story", "name": story.get("user_story_name") or story.get("use_case_name"), "spec": story,
+             "text": _text(
+                 file_path,
+                 story.get("user_story_name") or story.get("use_case_name"),
+                 *(_text(field.get("field_name"), field.get("description")) for field in story.get("fields") or [] if isinstance(field, dict)),
+                 *(_text(rule.get("business_rule_name"), rule.get("rules")) for rule in story.get("business_rules") or [] if isinstance(rule, dict)),
+             )}
+            for story in stories
+        ]
+    return [{"file_path": file_path, "kind": "output", "name": file_path, "spec": output, "text": _text(file_path, json.dumps(output, ensure_ascii=False))}]
+
+def _index_path(name: str, suffix: str) -> Path:
+    # names come from request bodies (run ids), so they are hashed rather than trusted as file names
+    return VECTOR_DIR / f"{hashlib.sha256(name.encode('utf-8')).hexdigest()[:32]}{suffix}"
+
+class VectorIndex:
+    """In-memory matrix of unit embeddings with cosine top-k search, saved as .npy plus a JSON sidecar."""
+
+    def __init__(self, vectors: np.ndarray, items: list[dict], fingerprint: str = ""):
+        self.vectors = vectors
+        self.items = items
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, units: list[dict], fingerprint: str = "") -> "VectorIndex":
+        vectors = embed([unit["text"] for unit in units]) if units else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        return cls(vectors, [{k: v for k, v in unit.items() if k != "text"} for unit in units], fingerprint)
+
+    def search(self, query: str, k: int = 10, min_score: float = VECTOR_MIN_SCORE) -> list[dict]:
+        if not self.items or k < 1:
+            return []
+        scores = self.vectors @ embed([query], self.vectors.shape[1])[0]
+        top = np.argsort(-scores)[:k]
+        return [{**self.items[i], "score": round(float(scores[i]), 4)} for i in top if scores[i] >= min_score and scores[i] > 0]
+
+    def save(self, name: str):
+        VECTOR_DIR.mkdir(parents=True, exist_ok=True)
+        np.save(_index_path(name, ".npy"), self.vectors, allow_pickle=False)
+        _index_path(name, ".json").write_text(json.dumps({"fingerprint": self.fingerprint, "items": self.items}, default=str), encoding="utf-8")
+
+    @classmethod
+    def load(cls, name: str) -> Optional["VectorIndex"]:
+        try:
+            meta = json.loads(_index_path(name, ".json").read_text(encoding="utf-8"))
+            vectors = np.load(_index_path(name, ".npy"), allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+        if len(vectors) != len(meta["items"]):
+            return None
+        return cls(vectors, meta["items"], meta.get("fingerprint", ""))
+
+def rows_fingerprint(rows: list[dict]) -> str:
+    # an index embedded with other settings cannot be searched with the current ones
+    digest = hashlib.sha1(f"{EMBEDDING_DIM}:{TRIGRAM_WEIGHT}\n".encode("utf-8"))
+    for row in sorted(rows, key=lambda row: row.get("file_path") or ""):
+        digest.update(f"{row.get('file_path')}\0{row.get('validated_json')}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+def spec_index_for_rows(name: str, rows: list[dict]) -> VectorIndex:
+    """The persisted index for these validated rows, rebuilt only when the rows changed."""
+    fingerprint = rows_fingerprint(rows)
+    index = VectorIndex.load(name)
+    if index is not None and index.fingerprint == fingerprint:
+        return index
+
+    units = []
+    for row in rows:
+        validated = row.get("validated_json")
+        try:
+            parsed = json.loads(validated) if isinstance(validated, str) else validated
+        except json.JSONDecodeError:
+            continue
+        if isinstance(parsed, dict):
+            units.extend(spec_units(row.get("file_path") or "", parsed.get("output", parsed)))
+    index = VectorIndex.build(units, fingerprint)
+    index.save(name)
+    return index